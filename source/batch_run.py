@@ -2,17 +2,18 @@
 import os 
 
 from visuals.graph_metrics import graph_all_metrics
-from utility.pickle import read_object_from_file
+from transit_network.network_store import read_network_from_file
 from genetic_algorithm.initial_population_generator import initiate_population_from_network
 from genetic_algorithm.params import overwrite_lambdas
 from utility.root_logger import RootLogger
 from utility.args_parser import batch_run_args
 from main import examine_best_performer
+from genetic_algorithm.population_store import summarize_snapshots
 
 def try_different_lambdas(args):
     RootLogger.log_info(f'Running batch with different lambda with {args.population_size} size and {args.num_generations} generations.')
 
-    Network = read_object_from_file(args.initial_network)
+    Network = read_network_from_file(args.initial_network)
 
     batches = [(2, 2, 1), (2, 4, 1), (4, 2, 1), 
                (3, 3, 1), (6, 3, 1), (3, 6, 1),
@@ -24,7 +25,7 @@ def try_different_lambdas(args):
     for index, batch in enumerate(batches):
         RootLogger.log_info(f'On batch {index + 1} of {len(batches)}')
         ridership_density_lambda, zone_lambda, extreme_trip_lambda = batch 
-        InitialPopulation = initiate_population_from_network(Network, args.population_size)
+        InitialPopulation = initiate_population_from_network(Network, args.population_size, num_workers=args.num_workers)
         res = InitialPopulation.run(args.num_generations)
         valid_params = overwrite_lambdas(coverage_lambda=0, ridership_density_lambda=ridership_density_lambda, 
                         zone_lambda=zone_lambda, extreme_trip_lambda=-1*extreme_trip_lambda)
@@ -48,6 +49,10 @@ def try_different_lambdas(args):
             except ValueError:
                 RootLogger.log_error(f'Failed to generate diagram for batch run to {cur_output}')
 
+    summary_path = os.path.join(args.output, 'summary.csv')
+    summarize_snapshots(args.output).to_csv(summary_path, index=False)
+    RootLogger.log_info(f'Wrote summary of batch runs to {summary_path}.')
+
 if __name__ == '__main__':
     args = batch_run_args()
     
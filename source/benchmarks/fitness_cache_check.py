@@ -0,0 +1,101 @@
+"""Check that a fitness cache hit gives the same score as evaluating the network afresh.
+
+Runs a small population and, after each generation, rebuilds every scored member from copies of its trips. The copies
+are made after the generation's children were bred, so the stops they share with other networks have been touched by
+breeding since the member was scored. Rebuilding recomputes the copies' transfers, so a copy whose stops carried
+other transfers, such as one of the initial network, gets another fitness_key and must miss the cache. The rest hit
+it under the same zone sample, and each hit is compared against a fresh evaluation of the copy. Run from source/ with:
+    python -m benchmarks.fitness_cache_check -p 20 -g 6
+"""
+from typing import List, Tuple
+import argparse
+import math
+import random
+import tempfile
+import numpy as np
+
+from utility.root_logger import RootLogger
+from transit_network.transit_network import TransitNetwork, create_network_from_trips
+from transit_network.network_store import read_network_from_file
+from genetic_algorithm.chromosome import Chromosome
+from genetic_algorithm.population import Population
+from genetic_algorithm.initial_population_generator import initiate_population_from_network
+from benchmarks.synthetic_network import generate_network
+from benchmarks.run_benchmarks import clear_zone_caches
+
+# Rebuilt networks group their trips into routes in another order, so sums can differ in the last bits.
+REL_TOLERANCE = 1e-9
+
+def rebuild(network: TransitNetwork) -> TransitNetwork:
+    return create_network_from_trips([trip.copy() for trip in network.trips], f'{network.id}~')
+
+def check_cache_hits(population: Population) -> Tuple[int, int, List[Tuple[str, str, float, float]]]:
+    """Score rebuilt copies of the members scored under the current zone sample.
+
+    Returns:
+        Tuple[int, int, List[Tuple[str, str, float, float]]]: number of cache hits checked, number of misses, and
+            (network id, metric, cached value, fresh value) of every mismatch.
+    """
+    # Elites carried over keep a score from an earlier sample, only members cached under this one are checked.
+    sample_key = population.ZoneEvaluator.stop_sample_key
+    scored = [member for member in population.population if (member.obj.fitness_key, sample_key) in population.fitness_cache]
+    copies = [Chromosome(rebuild(member.obj)) for member in scored]
+    for member, copy in zip(scored, copies):
+        if copy.obj.content_hash != member.obj.content_hash:
+            raise ValueError(f'Rebuilt copy of network {member.obj.id} has a different content hash.')
+
+    # Only hits are checked, a copy that misses the cache is scored afresh anyway.
+    hits = [copy for copy in copies if (copy.obj.fitness_key, sample_key) in population.fitness_cache]
+    num_scored, cache_hits = population.score_members(copies)
+    if cache_hits != len(hits):
+        raise ValueError(f'Expected {len(hits)} cache hits, got {cache_hits}.')
+
+    mismatches = []
+    for copy in hits:
+        clear_zone_caches(population.ZoneEvaluator)
+        fresh = population.fitness_function(copy.obj, population.initial_metrics, population.ZoneEvaluator).to_dict()
+        for metric, cached_value in copy.FitnessObj.to_dict().items():
+            if not math.isclose(cached_value, fresh[metric], rel_tol=REL_TOLERANCE):
+                mismatches.append((copy.obj.id, metric, cached_value, fresh[metric]))
+    return len(hits), len(copies) - len(hits), mismatches
+
+def run_check(network: TransitNetwork, population_size: int, num_generations: int, seed: int) -> Tuple[int, int, int]:
+    """Returns:
+        Tuple[int, int, int]: number of cache hits checked, number of them that didn't match a fresh evaluation and
+            number of copies that missed the cache.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    Pop = initiate_population_from_network(network, population_size)
+    checked, failed, missed = 0, 0, 0
+
+    def on_iteration(population: Population):
+        nonlocal checked, failed, missed
+        num_checked, num_missed, mismatches = check_cache_hits(population)
+        checked += num_checked
+        missed += num_missed
+        failed += len(set([network_id for network_id, _, _, _ in mismatches]))
+        for network_id, metric, cached_value, fresh_value in mismatches:
+            print(f'iteration {population.iteration_number - 1}: network {network_id} {metric} cached {cached_value} fresh {fresh_value}')
+
+    Pop.run(num_generations, on_iteration=on_iteration)
+    return checked, failed, missed
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-in", "--initial_network", type=str, default=None,
+                   help="network to start from, a seeded synthetic network if not given")
+    p.add_argument("-p", "--population_size", type=int, default=20)
+    p.add_argument("-g", "--num_generations", type=int, default=6)
+    p.add_argument("-s", "--seed", type=int, default=1)
+    args = p.parse_args()
+
+    RootLogger.initialize(tempfile.mkdtemp(), 0, 0)
+    if args.initial_network is not None:
+        network = read_network_from_file(args.initial_network)
+    else:
+        network = generate_network(num_routes=30, stops_per_route=20, seed=args.seed)
+    checked, failed, missed = run_check(network, args.population_size, args.num_generations, args.seed)
+    print(f'{checked} cache hits checked, {failed} differed from a fresh evaluation, {missed} copies missed the cache.')
+    if failed > 0 or checked == 0:
+        raise SystemExit(1)
@@ -0,0 +1,59 @@
+"""Measure how much of a generation goes to logging when nothing is logged. 
+
+Runs a small population with console and file verbosity at 0, timing each generation and profiling the calls made 
+into RootLogger. Run from source/ with: python -m benchmarks.logging_overhead
+"""
+import argparse
+import cProfile
+import pstats
+import random
+import tempfile
+import time
+import numpy as np
+
+from utility.root_logger import RootLogger
+from utility.pickle import read_object_from_file
+from genetic_algorithm.initial_population_generator import initiate_population_from_network
+
+def logging_stats(profile: cProfile.Profile):
+    # (calls, total seconds) of everything defined in root_logger.py or the logging package. 
+    calls, seconds = 0, 0.0
+    for (filename, _, _), (_, num_calls, total_time, _, _) in pstats.Stats(profile).stats.items():
+        if filename.endswith('root_logger.py') or '/logging/' in filename:
+            calls += num_calls
+            seconds += total_time
+    return calls, seconds
+
+def run_benchmark(network_path: str, population_size: int, num_generations: int, seed: int):
+    network = read_object_from_file(network_path)
+
+    random.seed(seed)
+    np.random.seed(seed)
+    Pop = initiate_population_from_network(network, population_size)
+    start = time.perf_counter()
+    Pop.run(num_generations)
+    per_generation = (time.perf_counter() - start) / num_generations
+
+    random.seed(seed)
+    np.random.seed(seed)
+    Pop = initiate_population_from_network(network, population_size)
+    profile = cProfile.Profile()
+    profile.enable()
+    Pop.run(num_generations)
+    profile.disable()
+    calls, seconds = logging_stats(profile)
+    return per_generation, calls / num_generations, seconds / num_generations
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-in", "--initial_network", type=str, default='../data/new_initial_net.pkl')
+    p.add_argument("-p", "--population_size", type=int, default=20)
+    p.add_argument("-g", "--num_generations", type=int, default=5)
+    p.add_argument("-s", "--seed", type=int, default=1)
+    args = p.parse_args()
+
+    RootLogger.initialize(tempfile.mkdtemp(), 0, 0)
+    per_generation, calls, seconds = run_benchmark(args.initial_network, args.population_size, args.num_generations, args.seed)
+    print(f'generation time: {per_generation:.4f}s')
+    print(f'logging calls per generation: {calls:.0f}')
+    print(f'logging time per generation (profiled): {seconds:.4f}s')
@@ -0,0 +1,135 @@
+"""Check that partition_shape_points gives the same partitions as the geodesic search it replaced.
+
+geodesic_partition_shape_points below is partition_shape_points as it was before the haversine prefilter: every
+remaining point is measured with sphere_distance, and ties go to the earliest point. Both are run on every trip of a
+network, once with the trip's full stop list and once with a random half of its stops, and the partitions are compared.
+
+Shapes of real trips rarely have two points near the same distance from a stop, so a second pass compares
+closest_shape_point_index_in with closest_shape_point_index on points placed around each stop to stress the prefilter:
+ - rings of points whose distances from the stop differ by less than HAVERSINE_ERROR, so several points pass the
+   haversine bound and the haversine order can differ from the geodesic one.
+ - copies of points already in the list, which tie exactly.
+
+Run from source/ with:
+    python -m benchmarks.partition_check
+"""
+from typing import List, Tuple
+import argparse
+import math
+import random
+import tempfile
+import time
+import numpy as np
+
+from utility.root_logger import RootLogger
+from transit_network.transit_network import TransitNetwork
+from transit_network.network_store import read_network_from_file
+from transit_network.shapes import ShapePoint
+from transit_network.stops import Stop, haversine_distances
+from preprocessing.partition_shape_points import (HAVERSINE_ERROR, closest_shape_point_index,
+                                                  closest_shape_point_index_in, partition_shape_points)
+from benchmarks.synthetic_network import meters_to_degrees
+
+# Distances of the ring points from their stop, in meters.
+RING_RADII = [5.0, 40.0, 250.0]
+POINTS_PER_RING = 24
+
+def geodesic_partition_shape_points(shape_points: List[ShapePoint], stops: List[Stop]) -> List[List[ShapePoint]]:
+    partition = []
+    cur_shape_points = [pt for pt in shape_points]
+    for stop in stops:
+        closest_index = closest_shape_point_index(stop, cur_shape_points)
+        partition.append(cur_shape_points[:closest_index])
+        cur_shape_points = cur_shape_points[closest_index:]
+    partition[-1] += cur_shape_points
+    return partition
+
+def partition_lengths(partition: List[List[ShapePoint]]) -> List[int]:
+    return [len(points) for points in partition]
+
+def check_trip_partitions(network: TransitNetwork, rng: random.Random) -> Tuple[int, List[str], float, float]:
+    """Partition every trip's shape with both implementations.
+
+    Returns:
+        Tuple[int, List[str], float, float]: number of partitionings compared, the ones that differ, and seconds taken
+            by the geodesic and the current implementation.
+    """
+    compared, mismatches = 0, []
+    geodesic_time, current_time = 0.0, 0.0
+    for trip in network.trips:
+        shape_points = [pt for points in trip.shape_points for pt in points]
+        half = sorted(rng.sample(range(len(trip.stops)), max(1, len(trip.stops) // 2)))
+        for label, stops in [('all stops', trip.stops), ('half the stops', [trip.stops[i] for i in half])]:
+            start = time.perf_counter()
+            expected = geodesic_partition_shape_points(shape_points, stops)
+            geodesic_time += time.perf_counter() - start
+            start = time.perf_counter()
+            result = partition_shape_points(shape_points, stops)
+            current_time += time.perf_counter() - start
+
+            compared += 1
+            if partition_lengths(result) != partition_lengths(expected):
+                mismatches.append(f'trip {trip.id} with {label}')
+    return compared, mismatches, geodesic_time, current_time
+
+def ring_points(stop: Stop, radius: float, rng: random.Random) -> List[ShapePoint]:
+    # Points around stop at radius, each off by a random fraction of HAVERSINE_ERROR, in shuffled order.
+    points = []
+    for k in range(POINTS_PER_RING):
+        bearing = 2 * math.pi * k / POINTS_PER_RING
+        distance = radius * (1.0 + rng.uniform(-HAVERSINE_ERROR, HAVERSINE_ERROR) / 2.0)
+        dlat, dlon = meters_to_degrees(distance, stop.location_lat)
+        points.append(ShapePoint(shape_id='ring', lat=stop.location_lat + dlat * math.sin(bearing),
+                                 lon=stop.location_lon + dlon * math.cos(bearing), sequence_num=k))
+    rng.shuffle(points)
+    return points
+
+def check_closest_points(network: TransitNetwork, num_stops: int, rng: random.Random) -> Tuple[int, int, int, List[str]]:
+    """Compare the closest point found by both implementations on rings of points around stops of network.
+
+    Returns:
+        Tuple[int, int, int, List[str]]: number of searches, number of those where the haversine distance alone would
+            pick another point, number with exact ties, and the searches that differ.
+    """
+    searches, haversine_disagreements, ties, mismatches = 0, 0, 0, []
+    for stop in rng.sample(network.stops, min(num_stops, len(network.stops))):
+        for radius in RING_RADII:
+            points = ring_points(stop, radius, rng)
+            # Copies of the nearest point and of a random one, after the originals so ties have to go to the earlier one.
+            nearest = points[closest_shape_point_index(stop, points)]
+            points += [ShapePoint(shape_id='ring', lat=pt.lat, lon=pt.lon, sequence_num=len(points) + i)
+                       for i, pt in enumerate([nearest, rng.choice(points)])]
+            ties += 1
+
+            lats = np.array([pt.lat for pt in points], dtype=np.float64)
+            lons = np.array([pt.lon for pt in points], dtype=np.float64)
+            expected = closest_shape_point_index(stop, points)
+            result = closest_shape_point_index_in(stop.location_lat, stop.location_lon, lats, lons)
+            searches += 1
+            if int(np.argmin(haversine_distances(stop.location_lat, stop.location_lon, lats, lons))) != expected:
+                haversine_disagreements += 1
+            if result != expected:
+                mismatches.append(f'stop {stop.id} at {radius}m: got point {result}, expected {expected}')
+    return searches, haversine_disagreements, ties, mismatches
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-in", "--initial_network", type=str, default='../data/new_initial_net.pkl')
+    p.add_argument("-ns", "--num_stops", type=int, default=200, help="stops to place rings of points around")
+    p.add_argument("-s", "--seed", type=int, default=0)
+    args = p.parse_args()
+
+    RootLogger.initialize(tempfile.mkdtemp(), 0, 0)
+    network = read_network_from_file(args.initial_network)
+    rng = random.Random(args.seed)
+
+    compared, partition_mismatches, geodesic_time, current_time = check_trip_partitions(network, rng)
+    print(f'{compared} trip partitionings compared, {len(partition_mismatches)} differ. '
+          f'geodesic {geodesic_time:.2f}s, current {current_time:.2f}s')
+    searches, disagreements, ties, point_mismatches = check_closest_points(network, args.num_stops, rng)
+    print(f'{searches} closest point searches compared, {len(point_mismatches)} differ. '
+          f'Haversine alone would have picked another point in {disagreements}, {ties} had exact ties.')
+    for mismatch in partition_mismatches + point_mismatches:
+        print(mismatch)
+    if partition_mismatches != [] or point_mismatches != []:
+        raise SystemExit(1)
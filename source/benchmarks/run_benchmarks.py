@@ -0,0 +1,177 @@
+"""Micro-benchmarks of the hot paths of a run, on seeded synthetic networks.
+
+Times breed_networks, evaluate_network_new, ZoneEvaluator.evaluate_total_zone_distance, write_to_gtfs and merge_stops,
+and writes the results as JSON so runs on different commits can be compared. Run from source/ with:
+    python -m benchmarks.run_benchmarks -o before.json
+    python -m benchmarks.run_benchmarks -o after.json
+    python -m benchmarks.run_benchmarks --compare before.json after.json
+"""
+from typing import Callable, Dict, List
+import argparse
+import datetime
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import numpy as np
+
+from utility.root_logger import RootLogger
+from transit_network.transit_network import TransitNetwork
+from genetic_algorithm.breeder import breed_networks
+from genetic_algorithm.fitness_function import evaluate_network_new
+from genetic_algorithm.network_metrics import NetworkMetrics
+from genetic_algorithm.zone_evaluator import ZoneEvaluator
+from genetic_algorithm.initial_population_generator import generate_population
+from preprocessing.determine_transfers import merge_stops
+from benchmarks.synthetic_network import LAYOUTS, generate_network, generate_raw_stops
+
+BENCHMARKS = ['breed_networks', 'evaluate_network_new', 'evaluate_total_zone_distance', 'write_to_gtfs', 'merge_stops']
+ZONE_CACHES = ['known_route_distances', 'known_all_route_distances', 'known_trip_distances']
+
+def measure(func: Callable, repeat: int, setup: Callable = None) -> Dict[str, float]:
+    """Seconds taken by func over repeat runs, setup is run before each of them and not timed.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times), 'repeat': repeat}
+
+def clear_zone_caches(evaluator: ZoneEvaluator) -> None:
+    # Every run starts cold, otherwise all but the first only measure cache lookups.
+    for cache_name in ZONE_CACHES:
+        getattr(evaluator, cache_name).clear()
+
+def network_size(network: TransitNetwork) -> Dict[str, int]:
+    return {'routes': network.num_routes,
+            'trips': network.num_trips,
+            'stops': network.num_stops,
+            'shape_points': sum([len(p) for t in network.trips for p in t.shape_points])}
+
+def git_commit() -> str or None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(config: Dict, benchmarks: List[str] = BENCHMARKS) -> Dict:
+    """Run benchmarks on a network generated from config.
+
+    Args:
+        config (Dict): generate_network arguments, plus population (networks bred from it), breeds (children bred
+            per run) and repeat (runs per benchmark).
+        benchmarks (List[str], optional): benchmarks to run. Defaults to BENCHMARKS.
+
+    Returns:
+        Dict: commit, config, network size and results of each benchmark.
+    """
+    random.seed(config['seed'])
+    np.random.seed(config['seed'])
+    network = generate_network(layout=config['layout'],
+                               num_routes=config['num_routes'],
+                               stops_per_route=config['stops_per_route'],
+                               trips_per_route=config['trips_per_route'],
+                               shape_points_per_stop=config['shape_points_per_stop'],
+                               spacing=config['spacing'],
+                               seed=config['seed'])
+    repeat = config['repeat']
+    results = {}
+
+    if 'breed_networks' in benchmarks:
+        population = generate_population(network, config['population'], do_print_metrics=False)
+        rng = random.Random(config['seed'])
+        pairs = [rng.sample(population, 2) for _ in range(config['breeds'])]
+        results['breed_networks'] = measure(lambda: [breed_networks(a, b, str(i)) for i, (a, b) in enumerate(pairs)], repeat)
+
+    if 'evaluate_network_new' in benchmarks or 'evaluate_total_zone_distance' in benchmarks:
+        evaluator = ZoneEvaluator(network)
+        metrics = NetworkMetrics(network)
+        if 'evaluate_network_new' in benchmarks:
+            results['evaluate_network_new'] = measure(lambda: evaluate_network_new(network, metrics, evaluator), repeat,
+                                                      setup=lambda: clear_zone_caches(evaluator))
+        if 'evaluate_total_zone_distance' in benchmarks:
+            results['evaluate_total_zone_distance'] = measure(lambda: evaluator.evaluate_total_zone_distance(network), repeat,
+                                                              setup=lambda: clear_zone_caches(evaluator))
+
+    if 'write_to_gtfs' in benchmarks:
+        output_dir = tempfile.mkdtemp()
+        try:
+            results['write_to_gtfs'] = measure(lambda: network.write_to_gtfs(output_dir), repeat)
+        finally:
+            shutil.rmtree(output_dir)
+
+    if 'merge_stops' in benchmarks:
+        # merge_stops moves the stops it merges, so each run gets fresh ones.
+        raw_stops = []
+        def make_raw_stops():
+            raw_stops[:] = generate_raw_stops(network, seed=config['seed'])
+        results['merge_stops'] = measure(lambda: merge_stops(raw_stops), repeat, setup=make_raw_stops)
+        results['merge_stops']['num_stops'] = len(raw_stops)
+
+    return {'commit': git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': config,
+            'network': network_size(network),
+            'results': results}
+
+def compare_results(before: Dict, after: Dict) -> List[str]:
+    """Lines comparing the median times of two result files, ratios below 1 mean after is faster.
+    """
+    lines = [f'before: {before["commit"]}', f'after:  {after["commit"]}']
+    if before['config'] != after['config']:
+        lines.append('warning: the runs used different configs.')
+    lines.append(f'{"benchmark":<30}{"before (s)":>12}{"after (s)":>12}{"ratio":>8}')
+    for name in BENCHMARKS:
+        if name in before['results'] and name in after['results']:
+            old, new = before['results'][name]['median'], after['results'][name]['median']
+            lines.append(f'{name:<30}{old:>12.4f}{new:>12.4f}{new / old:>8.2f}')
+    return lines
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-l", "--layout", type=str, choices=LAYOUTS, default='grid')
+    p.add_argument("-r", "--num_routes", type=int, default=60)
+    p.add_argument("-sr", "--stops_per_route", type=int, default=30)
+    p.add_argument("-tr", "--trips_per_route", type=int, default=2)
+    p.add_argument("-sp", "--shape_points_per_stop", type=int, default=4)
+    p.add_argument("-sd", "--spacing", type=float, default=400.0, help="meters between neighbouring stops")
+    p.add_argument("--scale", type=float, default=1.0, help="multiplies the number of routes and breeds")
+    p.add_argument("-p", "--population", type=int, default=10)
+    p.add_argument("-b", "--breeds", type=int, default=20, help="children bred per run of breed_networks")
+    p.add_argument("-n", "--repeat", type=int, default=5)
+    p.add_argument("-s", "--seed", type=int, default=0)
+    p.add_argument("-bm", "--benchmarks", type=str, nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    p.add_argument("-o", "--output", type=str, default=None, help="path of the results JSON")
+    p.add_argument("--compare", type=str, nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two results files and exit")
+    args = p.parse_args()
+
+    if args.compare is not None:
+        with open(args.compare[0]) as before_file, open(args.compare[1]) as after_file:
+            print('\n'.join(compare_results(json.load(before_file), json.load(after_file))))
+    else:
+        RootLogger.initialize(tempfile.mkdtemp(), 0, 0)
+        config = {'layout': args.layout,
+                  'num_routes': int(args.num_routes * args.scale),
+                  'stops_per_route': args.stops_per_route,
+                  'trips_per_route': args.trips_per_route,
+                  'shape_points_per_stop': args.shape_points_per_stop,
+                  'spacing': args.spacing,
+                  'population': args.population,
+                  'breeds': int(args.breeds * args.scale),
+                  'repeat': args.repeat,
+                  'seed': args.seed}
+        report = run_benchmarks(config, args.benchmarks)
+        for name, result in report['results'].items():
+            print(f'{name:<30} median {result["median"]:.4f}s  min {result["min"]:.4f}s')
+        if args.output is not None:
+            with open(args.output, 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+            print(f'Wrote results to {args.output}')
@@ -0,0 +1,201 @@
+"""Seeded synthetic networks for benchmarking at sizes the SFMTA network can't reach.
+
+Stops sit on a lattice laid over San Francisco, either a square grid or rings and spokes around its center, so the
+zones of the ZoneEvaluator all have stops near them. Routes are walks along the lattice that tend to keep going
+straight, which makes them cross each other at shared stops the way real routes do.
+"""
+from typing import List, Dict, Tuple
+import math
+import random
+
+from transit_network.transit_network import TransitNetwork
+from transit_network.routes import SimpleRoute
+from transit_network.trips import SimpleTrip
+from transit_network.stops import Stop
+from transit_network.shapes import ShapePoint
+from genetic_algorithm.zone_evaluator import ZONES
+
+LAYOUTS = ['grid', 'radial']
+# Bounds of the lattice, a margin around the zones.
+MIN_LAT, MAX_LAT = 37.725, 37.810
+MIN_LON, MAX_LON = -122.510, -122.380
+CENTER = ((MIN_LAT + MAX_LAT) / 2.0, (MIN_LON + MAX_LON) / 2.0)
+METERS_PER_DEGREE_LAT = 111320.0
+# Chance a route keeps its direction at each stop, when it can.
+STRAIGHT_PROB = 0.75
+STOP_RIDERSHIP_RANGE = (100.0, 5000.0)
+# Route lengths are spread evenly over stops_per_route * (1 +- LENGTH_SPREAD), so a few routes fall under MIN_NUM_STOPS
+# as in the real network, otherwise the extreme trip term of the fitness divides by zero.
+LENGTH_SPREAD = 0.75
+
+Node = Tuple[int, int]
+
+def meters_to_degrees(meters: float, lat: float) -> Tuple[float, float]:
+    return meters / METERS_PER_DEGREE_LAT, meters / (METERS_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+
+class Lattice:
+    """Stop positions and their neighbours for one layout.
+    """
+
+    def __init__(self, layout: str, spacing: float):
+        if layout not in LAYOUTS:
+            raise ValueError(f'Unknown layout {layout}, expected one of {LAYOUTS}.')
+        self.layout = layout
+        self.locations: Dict[Node, Tuple[float, float]] = {}
+        dlat, dlon = meters_to_degrees(spacing, CENTER[0])
+        if layout == 'grid':
+            self.rows = int((MAX_LAT - MIN_LAT) / dlat) + 1
+            self.cols = int((MAX_LON - MIN_LON) / dlon) + 1
+            for row in range(self.rows):
+                for col in range(self.cols):
+                    self.locations[(row, col)] = (MIN_LAT + row * dlat, MIN_LON + col * dlon)
+        else:
+            # Rings every spacing meters, with enough spokes that the outer ring's stops are about spacing apart.
+            max_radius = max(MAX_LAT - CENTER[0], (MAX_LON - CENTER[1]) * dlat / dlon)
+            self.rings = int(max_radius / dlat) + 1
+            self.spokes = max(4, int(2 * math.pi * self.rings))
+            for ring in range(1, self.rings + 1):
+                for spoke in range(self.spokes):
+                    angle = 2 * math.pi * spoke / self.spokes
+                    self.locations[(ring, spoke)] = (CENTER[0] + ring * dlat * math.sin(angle), CENTER[1] + ring * dlon * math.cos(angle))
+
+    def neighbours(self, node: Node) -> List[Node]:
+        a, b = node
+        if self.layout == 'grid':
+            candidates = [(a - 1, b), (a + 1, b), (a, b - 1), (a, b + 1)]
+        else:
+            candidates = [(a - 1, b), (a + 1, b), (a, (b - 1) % self.spokes), (a, (b + 1) % self.spokes)]
+        return [n for n in candidates if n in self.locations]
+
+    def step(self, source: Node, target: Node) -> Node:
+        # Direction of a move, with spokes wrapping around.
+        d_a, d_b = target[0] - source[0], target[1] - source[1]
+        if self.layout == 'radial' and abs(d_b) > 1:
+            d_b = -int(math.copysign(1, d_b))
+        return (d_a, d_b)
+
+    def nearest(self, lat: float, lon: float) -> Node:
+        return min(self.locations, key=lambda n: (self.locations[n][0] - lat)**2 + (self.locations[n][1] - lon)**2)
+
+def walk(lattice: Lattice, start: Node, length: int, rng: random.Random) -> List[Node]:
+    """Walk of up to length nodes from start, never revisiting a node and preferring to go straight.
+    """
+    path = [start]
+    visited = set(path)
+    direction = None
+    while len(path) < length:
+        options = [n for n in lattice.neighbours(path[-1]) if n not in visited]
+        if options == []:
+            break
+        straight = [n for n in options if lattice.step(path[-1], n) == direction]
+        if straight != [] and rng.random() < STRAIGHT_PROB:
+            next_node = straight[0]
+        else:
+            next_node = rng.choice(options)
+        direction = lattice.step(path[-1], next_node)
+        path.append(next_node)
+        visited.add(next_node)
+    return path
+
+def build_shape_points(shape_id: str, stops: List[Stop], points_per_stop: int) -> List[List[ShapePoint]]:
+    # One partition per stop, running from the stop towards the next one. The last stop only gets itself.
+    partitions = []
+    sequence_num = 1
+    for index, stop in enumerate(stops):
+        next_stop = stops[index + 1] if index + 1 < len(stops) else stop
+        num_points = points_per_stop if index + 1 < len(stops) else 1
+        partition = []
+        for k in range(num_points):
+            t = k / num_points
+            partition.append(ShapePoint(shape_id=shape_id,
+                                        lat=stop.location_lat + t * (next_stop.location_lat - stop.location_lat),
+                                        lon=stop.location_lon + t * (next_stop.location_lon - stop.location_lon),
+                                        sequence_num=sequence_num))
+            sequence_num += 1
+        partitions.append(partition)
+    return partitions
+
+def generate_network(layout: str = 'grid',
+                     num_routes: int = 60,
+                     stops_per_route: int = 30,
+                     trips_per_route: int = 2,
+                     shape_points_per_stop: int = 4,
+                     spacing: float = 400.0,
+                     seed: int = 0,
+                     network_id: str = 'synthetic') -> TransitNetwork:
+    """Generate a network the way the preprocessed one looks: one shared Stop object per stop across trips,
+    shape points partitioned by stop, and transfers set from the routes.
+
+    Args:
+        layout (str, optional): 'grid' or 'radial'. Defaults to 'grid'.
+        num_routes (int, optional): number of routes. Defaults to 60.
+        stops_per_route (int, optional): average length of the routes, see LENGTH_SPREAD. Routes whose walk gets stuck
+            are shorter. Defaults to 30.
+        trips_per_route (int, optional): trips per route, alternating direction. Trips after the first two of a route
+            skip a stop at each end per extra pair. Defaults to 2.
+        shape_points_per_stop (int, optional): shape points between consecutive stops. Defaults to 4.
+        spacing (float, optional): distance between neighbouring stops in meters. Defaults to 400.0.
+        seed (int, optional): seed of the generator. Defaults to 0.
+        network_id (str, optional): id of the network. Defaults to 'synthetic'.
+
+    Returns:
+        TransitNetwork: the generated network.
+    """
+    rng = random.Random(seed)
+    lattice = Lattice(layout, spacing)
+    stop_objs: Dict[Node, Stop] = {}
+
+    def get_stop(node: Node) -> Stop:
+        if node not in stop_objs:
+            lat, lon = lattice.locations[node]
+            new_stop = Stop(id=f'{layout[0]}{node[0]}_{node[1]}', name=f'{layout} stop {node[0]} {node[1]}',
+                            location=(lat, lon), parent_id=None, routes=[])
+            new_stop.ridership = rng.uniform(*STOP_RIDERSHIP_RANGE)
+            stop_objs[node] = new_stop
+        return stop_objs[node]
+
+    # The first routes start next to each zone, so every zone has stops to sample.
+    zone_starts = [lattice.nearest(float(z.lat), float(z.lon)) for z in ZONES]
+    all_nodes = sorted(lattice.locations)
+
+    lengths = [max(2, round(stops_per_route * (1.0 - LENGTH_SPREAD + 2 * LENGTH_SPREAD * (i + 0.5) / num_routes)))
+               for i in range(num_routes)]
+    rng.shuffle(lengths)
+
+    routes = []
+    for route_index, length in enumerate(lengths):
+        start = zone_starts[route_index] if route_index < len(zone_starts) else rng.choice(all_nodes)
+        path = [get_stop(node) for node in walk(lattice, start, length, rng)]
+        route_id = f'R{route_index}'
+        route = SimpleRoute(route_id, f'Synthetic {route_index}')
+
+        trips = []
+        for trip_index in range(trips_per_route):
+            direction = trip_index % 2
+            trim = trip_index // 2
+            stops = path[trim:len(path) - trim] if len(path) - 2 * trim >= 2 else path
+            if direction == 1:
+                stops = stops[::-1]
+            trip_id = f'{route_id}T{trip_index}'
+            trips.append(SimpleTrip(trip_id=trip_id, route_id=route_id, message=f'Synthetic {route_index} {trip_index}',
+                                    direction=direction, stops=stops,
+                                    shape_points=build_shape_points(trip_id + '00', stops, shape_points_per_stop)))
+        route.add_trips(trips)
+        routes.append(route)
+
+    return TransitNetwork(routes, network_id)
+
+def generate_raw_stops(network: TransitNetwork, jitter: float = 20.0, seed: int = 0) -> List[Stop]:
+    """Unmerged stops of network, as parsed from a GTFS feed: every trip has its own copy of each stop it visits,
+    offset by up to jitter meters. This is the input merge_stops works on.
+    """
+    rng = random.Random(seed)
+    raw_stops = []
+    for trip in network.trips:
+        for index, stop in enumerate(trip.stops):
+            dlat, dlon = meters_to_degrees(jitter, stop.location_lat)
+            raw_stop = Stop(id=f'{stop.id}_{trip.id}_{index}', name=stop.name,
+                            location=(stop.location_lat + rng.uniform(-dlat, dlat), stop.location_lon + rng.uniform(-dlon, dlon)),
+                            parent_id=None, routes=[trip.route_id])
+            raw_stops.append(raw_stop)
+    return raw_stops
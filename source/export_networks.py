@@ -0,0 +1,14 @@
+import os
+
+from genetic_algorithm.population_export import export_population
+from utility.args_parser import export_networks_args
+from utility.root_logger import RootLogger
+
+if __name__ == '__main__':
+    args = export_networks_args()
+    output_dir = args.output
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(args.input), 'networks')
+    
+    RootLogger.initialize(output_dir, args.verbosity, args.file_verbosity)
+    export_population(args.input, output_dir, top_k=args.top_k, num_workers=args.num_workers)
@@ -1,10 +1,11 @@
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 import uuid
 import random 
 from copy import deepcopy
+from collections import Counter
 
 from transit_network.transit_network import TransitNetwork, create_network_from_trips
-from transit_network.trips import common_transfer_point, SimpleTrip
+from transit_network.trips import SimpleTrip, build_stop_trip_index
 from utility.root_logger import RootLogger
 import genetic_algorithm.params as params
 from genetic_algorithm.family import Family
@@ -39,12 +40,12 @@ def determine_parent_order(Net_A: TransitNetwork, Net_B: TransitNetwork):
         return Net_B, Net_A
 
 def produce_child_trip(first_trip: SimpleTrip, second_trip: SimpleTrip, shared_stop: str) -> SimpleTrip:
-    RootLogger.log_debug(f'Producing child trip for trip {first_trip.id} and {second_trip.id}.')
+    RootLogger.log_debug('Producing child trip for trip %s and %s.', first_trip.id, second_trip.id)
     first_index = first_trip.get_index_of_stop_id(shared_stop)
     second_index = second_trip.get_index_of_stop_id(shared_stop)
 
     # We deepcopy because we don't want to be modifying the same stop objects for all of them. 
-    RootLogger.log_debug(f'Crafting parameters for new child trip...')
+    RootLogger.log_debug('Crafting parameters for new child trip...')
     new_stops = deepcopy(first_trip.stops[:first_index] + second_trip.stops[second_index:])
 
     # Remove the old routes from the trips.     
@@ -59,44 +60,61 @@ def produce_child_trip(first_trip: SimpleTrip, second_trip: SimpleTrip, shared_s
     new_route = str(uuid.uuid4())
     new_id = str(uuid.uuid4())
     new_message = '' # Remove the message for performance reasons. 
-    RootLogger.log_debug(f'Parameters complete, new id is {new_id}')
+    RootLogger.log_debug('Parameters complete, new id is %s', new_id)
 
     new_trip = SimpleTrip(trip_id=new_id, route_id=new_route, message=new_message, 
                           direction=first_trip.direction, stops=new_stops, shape_points=new_shapes)
 
-    RootLogger.log_debug(f'Successfuly created child trip {new_id} on new route {new_route}')
+    RootLogger.log_debug('Successfuly created child trip %s on new route %s', new_id, new_route)
     return new_trip
 
-def sample_parent_trips(parent_A_trips: List[SimpleTrip], parent_B_trips: List[SimpleTrip]) -> Tuple[SimpleTrip, SimpleTrip, str]:
-    RootLogger.log_debug('Attempting to randomly sample overlapping trips...')
-    times_tried = 0
-    parent_trip_A = None 
-    parent_trip_B = None
-    while times_tried < params.MAX_RETRY_COUNT:
-        rand_A = random.choice(parent_A_trips)
-        rand_B = random.choice(parent_B_trips)
-        if rand_A != rand_B:
-            shared_stop_id = common_transfer_point(rand_A, rand_B)
-            if shared_stop_id is not None:
-                RootLogger.log_debug(f'Attempt {times_tried + 1} succeeded to sample overlap!')
-                # with open('retry_counts.txt', 'a') as output:
-                #     output.write(str(times_tried)+ '\n')
-                parent_trip_A = rand_A
-                parent_trip_B = rand_B
-                break 
-        RootLogger.log_debug(f'Attempt {times_tried + 1} failed to sample overlaps.')
-        times_tried += 1
-
-    if parent_trip_A is None: 
-        RootLogger.log_warning(f'Failed in finding overlap between parents, returning None.')
+def count_crossover_pairs(entries_A: List[Tuple[SimpleTrip, int, int]], entries_B: List[Tuple[SimpleTrip, int, int]]) -> int:
+    # Pairs of trips that can cross over at a single stop: same direction and not the same trip. 
+    directions_B = Counter([direction for _, _, direction in entries_B])
+    trips_B = Counter([(trip.id, direction) for trip, _, direction in entries_B])
+    count = 0
+    for trip_A, _, direction_A in entries_A:
+        count += directions_B[direction_A] - trips_B[(trip_A.id, direction_A)]
+    return count
+
+def sample_parent_trips(index_A: Dict[str, List[Tuple[SimpleTrip, int, int]]], 
+                        index_B: Dict[str, List[Tuple[SimpleTrip, int, int]]]) -> Tuple[SimpleTrip, SimpleTrip, str]:
+    """Sample a crossover point (trip_A, trip_B, shared stop) uniformly among all valid ones, using stop -> trip indices of both parents. 
+
+    Args:
+        index_A (Dict[str, List[Tuple[SimpleTrip, int, int]]]): stop -> trip index of first parent. 
+        index_B (Dict[str, List[Tuple[SimpleTrip, int, int]]]): stop -> trip index of second parent. 
+
+    Returns:
+        Tuple[SimpleTrip, SimpleTrip, str]: trip from each parent and their shared stop id, all None if the parents share no stop.
+    """
+    RootLogger.log_debug('Sampling crossover point from shared stops...')
+    shared_stops = []
+    weights = []
+    for stop_id, entries_A in index_A.items():
+        if stop_id not in index_B:
+            continue
+        num_pairs = count_crossover_pairs(entries_A, index_B[stop_id])
+        if num_pairs > 0:
+            shared_stops.append(stop_id)
+            weights.append(num_pairs)
+
+    if shared_stops == []: 
+        RootLogger.log_warning('Failed in finding overlap between parents, returning None.')
         return None, None, None
-    
-    return parent_trip_A, parent_trip_B, shared_stop_id
 
-def get_family(parent_A_trips: List[SimpleTrip], parent_B_trips: List[SimpleTrip]) -> Family or None:
-    parent_trip_A, parent_trip_B, shared_stop_id = sample_parent_trips(parent_A_trips, parent_B_trips)
+    # Weighting each stop by its number of pairs makes every (trip_A, trip_B, stop) equally likely. 
+    shared_stop_id = random.choices(shared_stops, weights=weights, k=1)[0]
+    pairs = [(trip_A, trip_B) for trip_A, _, direction_A in index_A[shared_stop_id]
+                              for trip_B, _, direction_B in index_B[shared_stop_id]
+                              if direction_A == direction_B and trip_A.id != trip_B.id]
+    parent_trip_A, parent_trip_B = random.choice(pairs)
+    RootLogger.log_debug('Sampled crossover at stop %s out of %d options.', shared_stop_id, sum(weights))
 
-    RootLogger.log_debug(f'Producing child trip for trips {parent_trip_A.id} and {parent_trip_B.id}.')
+    return parent_trip_A, parent_trip_B, shared_stop_id
+
+def make_family(parent_trip_A: SimpleTrip, parent_trip_B: SimpleTrip, shared_stop_id: str) -> Family:
+    RootLogger.log_debug('Producing child trip for trips %s and %s.', parent_trip_A.id, parent_trip_B.id)
     child_trip_A = produce_child_trip(parent_trip_A, parent_trip_B, shared_stop_id) 
     child_trip_B = produce_child_trip(parent_trip_B, parent_trip_A, shared_stop_id)
 
@@ -107,64 +125,85 @@ def get_family(parent_A_trips: List[SimpleTrip], parent_B_trips: List[SimpleTrip
 
     return fam
 
-def get_child_trips(parent_A_trips: List[SimpleTrip], parent_B_trips: List[SimpleTrip]) -> Tuple[SimpleTrip, SimpleTrip, SimpleTrip, SimpleTrip] or None:
-    
-    all_shared_stops = [] # [(A_trip.id, B_trip.id, stop.id)]
-    for A_trip in parent_A_trips:
-        for B_trip in parent_B_trips:
-            if A_trip != B_trip: # Don't want to breed the same trip with eachother. 
-                shared_stop_id = common_transfer_point(A_trip, B_trip)
-                if shared_stop_id is not None:
-                    all_shared_stops.append((A_trip.id, B_trip.id, shared_stop_id))
-
-    if all_shared_stops == []:
+def get_family(Net_A: TransitNetwork, Net_B: TransitNetwork) -> Family or None:
+    parent_trip_A, parent_trip_B, shared_stop_id = sample_parent_trips(Net_A.stop_trip_index, Net_B.stop_trip_index)
+    if parent_trip_A is None:
         return None
-    #Randomly select one of the shared stops and breed off that one. 
-    trip_A_id, trip_B_id, stop_id = random.choices(all_shared_stops, k=1)[0]
-    
-    RootLogger.log_info((f'Found {len(all_shared_stops)} shared stops for trips {trip_A_id} and {trip_B_id} at stop {stop_id}'))
 
-    #Go from ids -> trip obj so that we can mark which trips to remove. 
-    parent_trip_A = get_trip_by_id(parent_A_trips, trip_A_id)
-    parent_trip_B = get_trip_by_id(parent_B_trips, trip_B_id)
+    return make_family(parent_trip_A, parent_trip_B, shared_stop_id)
 
-    # Children Stops
-    child_trip_A = produce_child_trip(parent_trip_A, parent_trip_B, shared_stop_id) 
-    child_trip_B = produce_child_trip(parent_trip_B, parent_trip_A, shared_stop_id)
+def get_child_trips(parent_A_trips: List[SimpleTrip], parent_B_trips: List[SimpleTrip]) -> Tuple[SimpleTrip, SimpleTrip] or None:
+    parent_trip_A, parent_trip_B, shared_stop_id = sample_parent_trips(build_stop_trip_index(parent_A_trips), 
+                                                                       build_stop_trip_index(parent_B_trips))
+    if parent_trip_A is None:
+        return None
 
-    return child_trip_A, child_trip_B
+    family = make_family(parent_trip_A, parent_trip_B, shared_stop_id)
+    return family.child_A, family.child_B
+
+def share_trip(trip: SimpleTrip) -> SimpleTrip:
+    """Reuse a parent's trip in a child network. 
+    In a child every stop only transfers to its own trip's route, so the trip is returned as is when that already holds. 
+    Otherwise a new trip is returned which copies only the stops whose transfer lists change, sharing the rest. 
+    """
+    own_routes = [trip.route_id]
+    changed = [stop.routes != own_routes for stop in trip.stops]
+    if not any(changed):
+        return trip
+
+    new_stops = []
+    for stop, stop_changed in zip(trip.stops, changed):
+        if stop_changed:
+            stop = stop.copy()
+            stop.routes = [trip.route_id]
+        new_stops.append(stop)
+
+    return SimpleTrip(trip_id=trip.id, 
+                      route_id=trip.route_id, 
+                      message=trip.message, 
+                      direction=trip.direction, 
+                      shape_points=trip.shape_points, 
+                      stops=new_stops)
 
 def breed_networks(Net_A: TransitNetwork, Net_B: TransitNetwork, 
                    new_id: str = None) -> TransitNetwork:
     
-    RootLogger.log_debug(f'Breeding networks {Net_A.id} and {Net_B.id}')
+    RootLogger.log_debug('Breeding networks %s and %s', Net_A.id, Net_B.id)
 
     # Randomly choose one them to be the first parent. (i.e. which route starts in the crossover)
 
-    net_A_trips = [t.copy() for t in Net_A.trips]
-    net_B_trips = [t.copy() for t in Net_B.trips]
+    if params.COPY_ON_WRITE:
+        # Parent trips are only read, the child trips copy what they take from them. 
+        net_A_trips = Net_A.trips
+    else:
+        net_A_trips = [t.copy() for t in Net_A.trips]
 
-    family = get_family(net_A_trips, net_B_trips)
+    # Crossover points are found on the parents, child trips are matched back to them by id. 
+    family = get_family(Net_A, Net_B)
     
     if family is None:
-        RootLogger.log_warning((f'Failed to breed networks {Net_A.id} and {Net_B.id}, no common stops found among trips.'
-                              f' Returning first parent.'))
+        RootLogger.log_warning('Failed to breed networks %s and %s, no common stops found among trips. Returning first parent.', Net_A.id, Net_B.id)
         return Net_A
 
     else: 
-        RootLogger.log_debug(f'Crafting new trips for children networks...')
+        RootLogger.log_debug('Crafting new trips for children networks...')
 
         child_trips = [t for t in net_A_trips if t not in family.parents] + [family.child_A, family.child_B]
+        if params.COPY_ON_WRITE:
+            for child_trip in family.children:
+                for stop in child_trip.stops:
+                    stop.routes = [child_trip.route_id]
+            child_trips = [share_trip(t) for t in child_trips]
         
 
-        RootLogger.log_debug(f'Done crafting new trips for children networks...')
+        RootLogger.log_debug('Done crafting new trips for children networks...')
 
         # Generate 'breeded' ids if none provided. 
         if new_id is None:
             new_id = ':'.join([Net_A.id, Net_B.id])
             
-        RootLogger.log_debug(f'Successfully breeded networks {Net_A.id} and {Net_B.id}')
-        child_network = create_network_from_trips(child_trips, new_id)
+        RootLogger.log_debug('Successfully breeded networks %s and %s', Net_A.id, Net_B.id)
+        child_network = create_network_from_trips(child_trips, new_id, reset_transfers=not params.COPY_ON_WRITE)
         return child_network
 
 
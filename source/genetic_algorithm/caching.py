@@ -1,18 +1,35 @@
-from typing import List
+from typing import List, Hashable, Tuple, Callable
+from collections import OrderedDict
+import sys
+import numpy as np
+
+def estimate_size(obj: object) -> int:
+    """Approximate memory footprint of obj in bytes, following tuples and lists. 
+    """
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (0 if obj.flags.owndata else obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size += sum([estimate_size(item) for item in obj])
+    return size
 
 class RouteDistanceToZoneKey:
-    """An instance of solving the problem of the distance from stop_id to target_zone_name via route_id.
+    """An instance of solving the problem of the distance from stop_id to target_zone_name via a route. 
+    Routes are identified by their signature (route id and trip ids), since the same route id can lose a trip in a child network.
     """
-    def __init__(self, route_id: str, stop_id: str, target_zone_name: str):
-        self.route_id = route_id 
+    def __init__(self, route_signature: str, stop_id: str, target_zone_name: str):
+        self.route_signature = route_signature 
         self.stop_id = stop_id
         self.target_zone_name = target_zone_name
      
     def __str__(self):
-        return f'r{self.route_id}s{self.stop_id}tz{self.target_zone_name}'
+        return f'r{self.route_signature}s{self.stop_id}tz{self.target_zone_name}'
+    
+    def as_tuple(self) -> Tuple[str, str, str]:
+        return (self.stop_id, self.route_signature, self.target_zone_name)
 
 class AllRouteDistancesToZoneKey:
-    """An instance of solving the problem of the distance from a stop_id to some zone via any of route_options.
+    """An instance of solving the problem of the distance from a stop_id to some zone via any of route_options (as route signatures).
     """
 
     def __init__(self, route_options: List[str], stop_id: str, target_zone_name: str):
@@ -21,4 +38,74 @@ class AllRouteDistancesToZoneKey:
         self.target_zone_name = target_zone_name
     
     def __str__(self):
-        return f'ro{" ".join(self.route_options)}s{self.stop_id}tz{self.target_zone_name}'
\ No newline at end of file
+        return f'ro{" ".join(self.route_options)}s{self.stop_id}tz{self.target_zone_name}'
+    
+    def as_tuple(self) -> Tuple[str, Tuple[str], str]:
+        return (self.stop_id, tuple(self.route_options), self.target_zone_name)
+
+class LRUCache:
+    """Bounded mapping which evicts the least recently used entry once full, and counts hits and misses. 
+    If max_bytes is given, entries are also evicted once their estimated size passes it. 
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = None, sizeof: Callable[[object], int] = estimate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.entry_sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: object = None) -> object:
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+    
+    def put(self, key: Hashable, value: object) -> None:
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = value
+        if self.max_bytes is not None:
+            self.entry_sizes[key] = self.sizeof(key) + self.sizeof(value)
+            self.nbytes += self.entry_sizes[key]
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.nbytes > self.max_bytes and len(self.entries) > 1):
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+    
+    def remove(self, key: Hashable) -> None:
+        del self.entries[key]
+        self.nbytes -= self.entry_sizes.pop(key, 0)
+    
+    def invalidate(self, is_stale: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key is_stale, returning how many were dropped. 
+        """
+        stale_keys = [key for key in self.entries if is_stale(key)]
+        for key in stale_keys:
+            self.remove(key)
+        return len(stale_keys)
+    
+    def clear(self) -> None:
+        self.entries.clear()
+        self.entry_sizes.clear()
+        self.nbytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+    
+    def stats(self) -> dict:
+        return {'entries': len(self.entries), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses, 
+                'evictions': self.evictions, 'hit_rate': self.hit_rate}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,54 @@
+from typing import Dict
+import pickle
+import random
+import os
+import numpy as np
+
+from utility.root_logger import RootLogger
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_FILENAME = 'checkpoint.pkl'
+
+def write_checkpoint(population: object, checkpoint_path: str) -> None:
+    """Atomically write population along with the random states needed to continue its run. 
+    Networks share most of their trips, pickling them in one dump stores each shared object once. 
+    """
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'population': population,
+        'random_state': random.getstate(),
+        'np_random_state': np.random.get_state(),
+        'stop_sample': population.ZoneEvaluator.get_stop_sample()
+    }
+    # Write next to the old checkpoint and swap, so a crash mid-write leaves the previous one intact. 
+    temp_path = checkpoint_path + '.tmp'
+    with open(temp_path, 'wb') as output:
+        pickle.dump(state, output, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, checkpoint_path)
+    RootLogger.log_info(f'Wrote checkpoint of iteration {population.iteration_number - 1} to {checkpoint_path}.')
+
+def read_checkpoint(checkpoint_path: str) -> Dict:
+    with open(checkpoint_path, 'rb') as input_file:
+        state = pickle.load(input_file)
+    if state.get('version') != CHECKPOINT_VERSION:
+        error_msg = f'Checkpoint {checkpoint_path} has version {state.get("version")}, expected {CHECKPOINT_VERSION}.'
+        RootLogger.log_error(error_msg)
+        raise ValueError(error_msg)
+    return state
+
+def resume_from_checkpoint(checkpoint_path: str) -> object:
+    """Load a checkpointed population and restore the random states it was saved with. 
+
+    Args:
+        checkpoint_path (str): path to file written by write_checkpoint. 
+
+    Returns:
+        Population: population ready to continue with run. 
+    """
+    state = read_checkpoint(checkpoint_path)
+    population = state['population']
+    population.ZoneEvaluator.set_stop_sample(state['stop_sample'])
+    random.setstate(state['random_state'])
+    np.random.set_state(state['np_random_state'])
+    RootLogger.log_info(f'Resuming from checkpoint {checkpoint_path} at iteration {population.iteration_number}.')
+    return population
@@ -28,6 +28,16 @@ class Fitness:
     def get_metrics_list(self):
         return list(self.to_dict().keys())
 
+def fitness_from_dict(values: dict) -> Fitness:
+    # Values from Fitness.to_dict are already divided by the coefficients, so __init__ is skipped. 
+    FitnessObj = Fitness.__new__(Fitness)
+    FitnessObj.coverage_val = values['coverage_val']
+    FitnessObj.ridership_density_val = values['ridership_density_val']
+    FitnessObj.extreme_trips = values['extreme_trips_val']
+    FitnessObj.zone_val = values['zone_val']
+    FitnessObj.fitness = values['fitness']
+    return FitnessObj
+
 def evaluate_network_new(net: TransitNetwork, initial_metrics: NetworkMetrics, ZoneEvaluator: ZoneEvaluator):
     coverage_val = (net.coverage / initial_metrics.coverage) * params.COVERAGE_LAMBDA
     ridership_density_val = (net.ridership_density_score / initial_metrics.ridership_density_score) * params.RIDERSHIP_DENSITY_LAMBDA
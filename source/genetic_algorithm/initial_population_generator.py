@@ -7,12 +7,13 @@ from math import ceil
 from transit_network.transit_network import TransitNetwork
 from utility.root_logger import RootLogger
 from genetic_algorithm.population import Population
+from genetic_algorithm.steady_state import SteadyStatePopulation
 from genetic_algorithm.chromosome import Chromosome
 from genetic_algorithm.fitness_function import evaluate_network_new
 from genetic_algorithm.breeder import breed_networks
 from genetic_algorithm.network_metrics import NetworkMetrics
 from genetic_algorithm.zone_evaluator import ZoneEvaluator
-from genetic_algorithm.params import cutoff_by_round
+from genetic_algorithm.params import cutoff_by_round, STEADY_STATE_BATCH_SIZE, SELECTION
     
 def generate_population(initial_network: TransitNetwork, population_size: int, do_print_metrics: bool = True) -> List[TransitNetwork]:
     RootLogger.log_debug(f'Generating initial population of size {population_size} from {initial_network.id}')
@@ -93,14 +94,21 @@ def generate_metrics(initial_network: TransitNetwork, final_population: List[Tra
 def print_metrics(metrics: Dict[str, float]) -> None:
     pprint.pprint(metrics)
 
-def initiate_population_from_network(network: TransitNetwork, size: int) -> Population:
+def initiate_population_from_network(network: TransitNetwork, size: int, num_workers: int = 1, 
+                                     steady_state: bool = False, batch_size: int = STEADY_STATE_BATCH_SIZE, 
+                                     selection: str = SELECTION) -> Population:
     initial_networks = generate_population(network, size)
     init_network_metrics = NetworkMetrics(network)
     initial_population = [Chromosome(net) for net in initial_networks]
     ZoneEV = ZoneEvaluator(network)
-    return Population(networks= initial_population, 
-                      initial_metrics= init_network_metrics, 
-                      ZoneEvaluator= ZoneEV, 
-                      fitness_function= evaluate_network_new, 
-                      breeding_function= breed_networks, 
-                      elitist_cutoff= cutoff_by_round)
+    population_args = {'networks': initial_population, 
+                       'initial_metrics': init_network_metrics, 
+                       'ZoneEvaluator': ZoneEV, 
+                       'fitness_function': evaluate_network_new, 
+                       'breeding_function': breed_networks, 
+                       'elitist_cutoff': cutoff_by_round, 
+                       'num_workers': num_workers, 
+                       'selection': selection}
+    if steady_state:
+        return SteadyStatePopulation(batch_size=batch_size, **population_args)
+    return Population(**population_args)
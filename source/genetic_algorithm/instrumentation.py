@@ -0,0 +1,76 @@
+from typing import Dict
+from contextlib import contextmanager
+import cProfile
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is left out there.
+    resource = None
+
+from utility.root_logger import RootLogger
+
+PHASES = ['zone_sampling', 'fitness', 'sorting', 'selection', 'breeding']
+
+def phase_header(phase: str) -> str:
+    return f'{phase}_time'
+
+def peak_rss_mb() -> float or None:
+    """Peak resident set size of this process so far, in MB.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+class PhaseTimer:
+    """Accumulates the perf_counter time spent in each named phase until it is collected.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def collect(self) -> Dict[str, float]:
+        # Every phase gets a column, even if it didn't run this generation.
+        timings = dict([(phase_header(name), self.timings.get(name, 0.0)) for name in PHASES])
+        self.timings = {}
+        return timings
+
+class GenerationProfiler:
+    """Runs cProfile and tracemalloc over single generations, writing a profile_{iteration}.prof for each of them.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.profile = None
+
+    def start(self) -> None:
+        tracemalloc.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self, iteration: int) -> Dict[str, float]:
+        self.profile.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        profile_path = os.path.join(self.output_dir, f'profile_{iteration}.prof')
+        self.profile.dump_stats(profile_path)
+        self.profile = None
+        RootLogger.log_info('Wrote profile of iteration %d to %s.', iteration, profile_path)
+        return {'tracemalloc_peak_mb': peak / 2**20}
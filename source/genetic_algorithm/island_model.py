@@ -0,0 +1,206 @@
+from typing import List, Dict, Tuple
+from multiprocessing import Process, Queue
+import os
+import queue
+import random
+import time
+import traceback
+import numpy as np
+
+from transit_network.transit_network import TransitNetwork
+from genetic_algorithm.chromosome import Chromosome
+from genetic_algorithm.population import Population
+from genetic_algorithm.initial_population_generator import initiate_population_from_network
+from genetic_algorithm.worker_pool import get_lambdas, set_lambdas
+import genetic_algorithm.params as params
+from utility.root_logger import RootLogger
+
+TOPOLOGIES = ['ring', 'all']
+
+def migration_targets(island: int, num_islands: int, topology: str) -> List[int]:
+    """Islands that island sends its migrants to.
+    """
+    if topology == 'ring':
+        return [(island + 1) % num_islands] if num_islands > 1 else []
+    return [other for other in range(num_islands) if other != island]
+
+def migration_sources(island: int, num_islands: int, topology: str) -> List[int]:
+    return [other for other in range(num_islands) if island in migration_targets(other, num_islands, topology)]
+
+def select_emigrants(population: Population, num_migrants: int) -> List[TransitNetwork]:
+    scored = sorted([m for m in population.population if m.FitnessObj is not None], key=lambda m: m.FitnessObj.fitness, reverse=True)
+    return [m.obj for m in scored[:num_migrants]]
+
+def take_in_immigrants(population: Population, immigrants: List[TransitNetwork]) -> int:
+    """Put immigrants in place of the population's newest children, which haven't been scored yet, so no elite is lost.
+    Immigrants come in unscored, their fitness was measured against another island's zone sample.
+
+    Returns:
+        int: number of immigrants taken in.
+    """
+    replaceable = [index for index, member in enumerate(population.population) if member.FitnessObj is None]
+    if len(immigrants) > len(replaceable):
+        RootLogger.log_warning(f'Only room for {len(replaceable)} of {len(immigrants)} immigrants, dropping the rest.')
+        immigrants = immigrants[:len(replaceable)]
+    if immigrants == []:
+        return 0
+    for index, network in zip(replaceable[-len(immigrants):], immigrants):
+        population.population[index] = Chromosome(network)
+    return len(immigrants)
+
+class Migration:
+    """Called after each of an island's iterations. Every interval iterations, sends the island's best networks to its
+    targets and waits for those of its sources.
+    """
+
+    def __init__(self, island: int, inboxes: List[Queue], targets: List[int], sources: List[int],
+                       interval: int, num_migrants: int, max_iteration: int):
+        self.island = island
+        self.inboxes = inboxes
+        self.targets = targets
+        self.sources = sources
+        self.interval = interval
+        self.num_migrants = num_migrants
+        self.max_iteration = max_iteration
+        # iteration -> migrant batches received early, from sources that are ahead of this island.
+        self.pending: Dict[int, List[Tuple[int, List[TransitNetwork]]]] = {}
+
+    def receive(self, iteration: int) -> List[Tuple[int, List[TransitNetwork]]]:
+        while len(self.pending.get(iteration, [])) < len(self.sources):
+            try:
+                source, sent_iteration, networks = self.inboxes[self.island].get(timeout=params.MIGRATION_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError(f'Island {self.island} got no migrants for iteration {iteration} in {params.MIGRATION_TIMEOUT}s.')
+            self.pending.setdefault(sent_iteration, []).append((source, networks))
+        return self.pending.pop(iteration)
+
+    def __call__(self, population: Population) -> None:
+        completed = population.iteration_number - 1
+        # No point migrating after the last iteration, nothing would breed with the migrants.
+        if completed % self.interval != 0 or completed >= self.max_iteration:
+            return
+        start_time = time.perf_counter()
+        emigrants = select_emigrants(population, self.num_migrants)
+        for target in self.targets:
+            self.inboxes[target].put((self.island, completed, emigrants))
+
+        immigrants = []
+        for source, networks in sorted(self.receive(completed), key=lambda batch: batch[0]):
+            for network in networks:
+                # Children are named by iteration and number on every island, tag where immigrants came from.
+                network.id = f'{source}>{network.id}'
+            immigrants += networks
+        taken_in = take_in_immigrants(population, immigrants)
+        RootLogger.log_info('Island %d sent %d networks to %s and took in %d.', self.island, len(emigrants), self.targets, taken_in)
+        population.per_round_metrics[-1]['immigrants'] = taken_in
+        population.per_round_metrics[-1]['migration_time'] = time.perf_counter() - start_time
+
+def run_island(island: int, network: TransitNetwork, island_size: int, max_iteration: int, seed: int,
+               lambdas: Tuple[float, float, float, float], migration: Migration, results: Queue,
+               num_workers: int, selection: str, profile_every: int, profile_dir: str) -> None:
+    # Runs in the island's process. Errors are sent back rather than raised, so the parent can stop the other islands.
+    try:
+        set_lambdas(lambdas)
+        random.seed(seed)
+        np.random.seed(seed)
+        Pop = initiate_population_from_network(network, island_size, num_workers=num_workers, selection=selection)
+        Pop.run(max_iteration, profile_every=profile_every, profile_dir=profile_dir, on_iteration=migration)
+        results.put((island, Pop, None))
+    except Exception:
+        results.put((island, None, traceback.format_exc()))
+
+class IslandModel:
+    """Evolves num_islands populations, each with its own ZoneEvaluator, in separate processes. Every migration_interval
+    iterations each island sends copies of its num_migrants best networks to its neighbours on the topology:
+    the next island for 'ring', every other island for 'all'.
+    """
+
+    def __init__(self, network: TransitNetwork,
+                       num_islands: int,
+                       island_size: int,
+                       migration_interval: int,
+                       num_migrants: int,
+                       topology: str = 'ring',
+                       num_workers: int = 1,
+                       selection: str = params.SELECTION):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f'Unknown topology {topology}, expected one of {TOPOLOGIES}.')
+        if migration_interval < 1:
+            raise ValueError(f'Migration interval must be at least 1, got {migration_interval}.')
+        if num_migrants >= island_size:
+            raise ValueError(f'Islands of size {island_size} can not send {num_migrants} migrants.')
+        self.network = network
+        self.num_islands = num_islands
+        self.island_size = island_size
+        self.migration_interval = migration_interval
+        self.num_migrants = num_migrants
+        self.topology = topology
+        self.num_workers = num_workers
+        self.selection = selection
+        self.populations: List[Population] = []
+        self.running_time = 0.0
+
+    def collect_results(self, results: Queue, processes: List[Process]) -> List[Population]:
+        populations = [None] * self.num_islands
+        for _ in range(self.num_islands):
+            while True:
+                try:
+                    island, population, error = results.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    # An island killed outright never reports back, the others would wait on its migrants.
+                    crashed = [i for i, p in enumerate(processes) if p.exitcode not in [None, 0]]
+                    if crashed != []:
+                        raise RuntimeError(f'Island {crashed[0]} exited with code {processes[crashed[0]].exitcode}.')
+            if error is not None:
+                RootLogger.log_error(f'Island {island} failed:\n{error}')
+                raise RuntimeError(f'Island {island} failed.')
+            RootLogger.log_info(f'Island {island} finished.')
+            populations[island] = population
+        return populations
+
+    def run(self, max_iteration: int, profile_every: int = 0, output_dir: str = '.') -> List[Population]:
+        """Run every island until max_iteration.
+
+        Args:
+            max_iteration (int): last iteration to run.
+            profile_every (int, optional): profile every this many iterations on each island, 0 disables it. Defaults to 0.
+            output_dir (str, optional): profiles of island i go in output_dir/island_i. Defaults to '.'.
+
+        Returns:
+            List[Population]: final population of each island.
+        """
+        RootLogger.log_info(f'Running {self.num_islands} islands of size {self.island_size} for {max_iteration} iterations, '
+                            f'migrating {self.num_migrants} networks every {self.migration_interval} iterations on a {self.topology} topology.')
+        start_time = time.time()
+        # Seeds come from the parent's generator, so a seeded run is repeatable.
+        seeds = [random.getrandbits(32) for _ in range(self.num_islands)]
+        inboxes = [Queue() for _ in range(self.num_islands)]
+        results = Queue()
+        processes = []
+        for island in range(self.num_islands):
+            migration = Migration(island, inboxes,
+                                  migration_targets(island, self.num_islands, self.topology),
+                                  migration_sources(island, self.num_islands, self.topology),
+                                  self.migration_interval, self.num_migrants, max_iteration)
+            processes.append(Process(target=run_island, name=f'island-{island}',
+                                     args=(island, self.network, self.island_size, max_iteration, seeds[island], get_lambdas(),
+                                           migration, results, self.num_workers, self.selection, profile_every,
+                                           os.path.join(output_dir, f'island_{island}'))))
+        for process in processes:
+            process.start()
+        try:
+            self.populations = self.collect_results(results, processes)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+        self.running_time = time.time() - start_time
+        RootLogger.log_info(f'Done running islands, took {self.running_time}s.')
+        return self.populations
+
+    def best_island(self) -> int:
+        """Index of the island whose last evaluated iteration has the best fitness.
+        """
+        return max(range(len(self.populations)), key=lambda i: self.populations[i].per_round_metrics[-1]['best_fitness'])
@@ -2,9 +2,22 @@ import argparse
 from utility.root_logger import RootLogger
 
 ##  Breeder
-MAX_RETRY_COUNT = 100
 PROB_MUTATION = 0.01
 DELTA_MUTATION = 2
+# Children share unchanged trips and stops with their first parent instead of copying them. 
+COPY_ON_WRITE = True
+
+##  Population
+# Number of (network, zone sample) fitness results remembered across generations. 
+FITNESS_CACHE_SIZE = 10000
+# Seconds an island waits for migrants from its neighbours before giving up on the run. 
+MIGRATION_TIMEOUT = 600
+# Children bred and scored at a time by the steady state engine. 
+STEADY_STATE_BATCH_SIZE = 2
+# How parents are drawn, one of genetic_algorithm.selection.SELECTION_STRATEGIES. 
+SELECTION = 'roulette'
+# Members drawn for each tournament by tournament selection. 
+TOURNAMENT_SIZE = 3
 
 ##  Fitness Function
 COVERAGE_LAMBDA = 0
@@ -16,6 +29,9 @@ ZONE_RADIUS = 900
 ZONE_EPSILON = 0.5
 DEFAULT_ZONE_DISTANCE = 90
 ZONE_SAMPLE_NUM = 3
+# Bounds on each of the ZoneEvaluator's route distance caches. 
+ZONE_CACHE_MAX_ENTRIES = 500000
+ZONE_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
 MIN_NUM_STOPS = 10
 MAX_NUM_STOPS = 80
@@ -1,20 +1,23 @@
-from typing import List, Tuple
+from typing import List, Tuple, Callable
 import numpy as np
 import pandas as pd
 from statistics import mean, median, stdev
 import time
 import os
+import random
 from copy import deepcopy
 
 from genetic_algorithm.zone_evaluator import ZoneEvaluator
 from genetic_algorithm.chromosome import Chromosome
 from genetic_algorithm.network_metrics import NetworkMetrics
+from genetic_algorithm.worker_pool import WorkerPool, breed_with_seed
+from genetic_algorithm.caching import LRUCache
+from genetic_algorithm.checkpoint import write_checkpoint
+from genetic_algorithm.instrumentation import PhaseTimer, GenerationProfiler, peak_rss_mb
+from genetic_algorithm.selection import ParentSelection, get_selection
+import genetic_algorithm.params as params
 from utility.root_logger import RootLogger
 
-def scale_to_prob_dist(weights: List[float]) -> List[float]:
-    s = sum(weights)
-    return [w / s for w in weights]
-
 class Population:
 
     mutation_rate = 0.1
@@ -24,7 +27,9 @@ class Population:
                        ZoneEvaluator: ZoneEvaluator, 
                        fitness_function, 
                        breeding_function, 
-                       elitist_cutoff):
+                       elitist_cutoff, 
+                       num_workers: int = 1, 
+                       selection: str = params.SELECTION):
         
         self.population = networks
         self.population_size = len(networks)
@@ -40,60 +45,151 @@ class Population:
         self.running_time = 0.0
 
         self.max_iteration = None
+        self.num_workers = num_workers
+        self.worker_pool = None
+        self.selection = selection
+        self._selector = get_selection(selection)
+        # (network fitness key, zone stop sample) -> Fitness, so identical networks are only scored once per sample. 
+        self.fitness_cache = LRUCache(params.FITNESS_CACHE_SIZE)
     
+    def __getstate__(self):
+        # Worker processes can't be pickled, they are restarted on demand. 
+        state = self.__dict__.copy()
+        state['worker_pool'] = None
+        return state
+
     def copy(self) -> object:
         return deepcopy(self)
+
+    @property
+    def timer(self) -> PhaseTimer:
+        # Built lazily, so populations checkpointed before it existed still resume. 
+        if self.__dict__.get('_timer') is None:
+            self._timer = PhaseTimer()
+        return self._timer
+
+    @property
+    def selector(self) -> ParentSelection:
+        # Populations checkpointed before selection was configurable drew parents by roulette. 
+        if self.__dict__.get('_selector') is None:
+            self._selector = get_selection(self.__dict__.get('selection', 'roulette'))
+        return self._selector
     
+    def get_worker_pool(self) -> WorkerPool:
+        if self.worker_pool is None:
+            self.worker_pool = WorkerPool(self.num_workers, self.initial_metrics, self.ZoneEvaluator, 
+                                          self.fitness_function, self.breeding_function)
+        return self.worker_pool
+
+    def close_worker_pool(self) -> None:
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+    
+    def score_members(self, unevaluated: List[Chromosome]) -> Tuple[int, int]:
+        """Set the FitnessObj of each of unevaluated under the current zone sample. 
+
+        Returns:
+            Tuple[int, int]: number of networks scored and number of cached scores reused. 
+        """
+        with self.timer.phase('fitness'):
+            # Networks identical to one scored before under this sample reuse its score, duplicates among them are scored once. 
+            sample_key = self.ZoneEvaluator.stop_sample_key
+            pending = {}
+            cache_hits = 0
+            for member in unevaluated:
+                key = (member.obj.fitness_key, sample_key)
+                if key in pending:
+                    pending[key].append(member)
+                    cache_hits += 1
+                    continue
+                FitnessObj = self.fitness_cache.get(key)
+                if FitnessObj is not None:
+                    member.FitnessObj = FitnessObj
+                    cache_hits += 1
+                else:
+                    pending[key] = [member]
+        
+            to_score = [members[0].obj for members in pending.values()]
+            if self.num_workers > 1:
+                fitness_objs = self.get_worker_pool().evaluate_networks(to_score, self.ZoneEvaluator.get_stop_sample())
+            else:
+                fitness_objs = [self.fitness_function(net, self.initial_metrics, self.ZoneEvaluator) for net in to_score]
+            for (key, members), FitnessObj in zip(pending.items(), fitness_objs):
+                self.fitness_cache.put(key, FitnessObj)
+                for member in members:
+                    member.FitnessObj = FitnessObj
+        RootLogger.log_debug('Scored %d networks, reused %d cached scores.', len(to_score), cache_hits)
+        return len(to_score), cache_hits
+
     def evaluate_population(self):
         RootLogger.log_debug('Evaluating population...')
         self.performance_dict = {}
-        self.ZoneEvaluator.sample_stops()
+        with self.timer.phase('zone_sampling'):
+            self.ZoneEvaluator.sample_stops()
+
+        # Only chromosomes we haven't evaluated yet need scoring, the rest keep their old score. 
+        unevaluated = [member for member in self.population if member.FitnessObj is None]
+        num_scored, cache_hits = self.score_members(unevaluated)
+
         for index, member in enumerate(self.population):
             # Assign the member a unique_id equal to index. 
             member.unique_id = index
 
-            # If we haven't evaluated this chromosome yet, evaluate, otherwise use old score. 
-            if member.FitnessObj is not None: 
-                FitnessObj = member.FitnessObj
-            else:
-                FitnessObj = self.fitness_function(member.obj, self.initial_metrics, self.ZoneEvaluator)
-                member.FitnessObj = FitnessObj
-
             # Check that this is the first time we see this id. 
             if member.unique_id in self.performance_dict:
                 RootLogger.log_warning(f'Population members with duplicate ids found in population. Overwriting fitness.')
-            self.performance_dict[member.unique_id] = FitnessObj
+            self.performance_dict[member.unique_id] = member.FitnessObj
         
         # Update metrics
         self.set_performance_metrics(self.performance_dict)
+        self.per_round_metrics[-1]['evaluations'] = len(unevaluated)
+        self.per_round_metrics[-1]['fitness_cache_hits'] = cache_hits
+        self.per_round_metrics[-1]['fitness_cache_misses'] = num_scored
         RootLogger.log_debug('Done evaluating population!')
     
-    def select_parents(self, pool: List[Chromosome]) -> Tuple[Chromosome, Chromosome]:
-        weights = scale_to_prob_dist([self.performance_dict[m.unique_id].fitness for m in pool])
-        
+    def select_parent_pairs(self, pool: List[Chromosome], num_pairs: int) -> List[Tuple[Chromosome, Chromosome]]:
+        """Draw num_pairs pairs of distinct parents from pool with the population's selection strategy, in one go. 
+        """
         if len(pool) == 0:
             RootLogger.log_error(f'Attempt to sample parent network from empty pool!')
             raise ValueError
-        if len(pool) < 2:
-            [parent_1, parent_2] = [pool[0], pool[0]]
-        else:
-            [parent_1, parent_2] = np.random.choice(pool, size=2, replace=False, p=weights)
-            
-        return parent_1, parent_2
-    
-    def breed_children(self, pool_of_parents: List[Chromosome], child_num: int) -> Chromosome:
-        parent_1, parent_2 = self.select_parents(pool_of_parents)
+        if num_pairs == 0:
+            return []
+        fitness = np.array([self.performance_dict[m.unique_id].fitness for m in pool], dtype=np.float64)
+        pairs = self.selector.draw_pairs(fitness, num_pairs)
+        return [(pool[parent_1], pool[parent_2]) for parent_1, parent_2 in pairs]
 
-        # Tracking number of times they have been parent. 
-        parent_1.num_times_parent += 1
-        parent_2.num_times_parent += 1
-
-        new_id = f'{self.iteration_number}:{child_num}'
+    def select_parents(self, pool: List[Chromosome]) -> Tuple[Chromosome, Chromosome]:
+        return self.select_parent_pairs(pool, 1)[0]
+    
+    def breed_children(self, pool_of_parents: List[Chromosome], num_children: int, id_prefix: str or None = None) -> List[Chromosome]:
+        # Draw every pair of parents first, so the breeding itself can run as one batch. 
+        jobs = []
+        with self.timer.phase('selection'):
+            parent_pairs = self.select_parent_pairs(pool_of_parents, num_children)
+            for child_num, (parent_1, parent_2) in zip(range(num_children, 0, -1), parent_pairs):
+                # Tracking number of times they have been parent. 
+                parent_1.num_times_parent += 1
+                parent_2.num_times_parent += 1
+
+                new_id = f'{self.iteration_number if id_prefix is None else id_prefix}:{child_num}'
+                seed = random.getrandbits(32)
+                jobs.append((parent_1.unique_id, parent_2.unique_id, new_id, seed))
         
         # Extract out the objects from the chromosomes. 
-        new_child = self.breeding_function(parent_1.obj, parent_2.obj, new_id=new_id)
-        new_member = Chromosome(new_child, parent_A_id=parent_1.unique_id, parent_B_id=parent_2.unique_id)
-        return new_member
+        parents = {m.unique_id: m.obj for m in pool_of_parents}
+        with self.timer.phase('breeding'):
+            if self.num_workers > 1:
+                new_children = self.get_worker_pool().breed_networks(parents, jobs)
+            else:
+                new_children = []
+                for parent_A_id, parent_B_id, new_id, seed in jobs:
+                    RootLogger.log_debug('%d more children to go.', num_children - len(new_children))
+                    new_child = breed_with_seed(self.breeding_function, parents[parent_A_id], parents[parent_B_id], new_id, seed)
+                    new_children.append(new_child)
+
+        return [Chromosome(new_child, parent_A_id=job[0], parent_B_id=job[1]) for new_child, job in zip(new_children, jobs)]
     
     def get_member_by_id(self, sel_id: str) -> Chromosome or None:
         matching_members = [m for m in self.population if m.unique_id == sel_id]
@@ -124,7 +220,8 @@ class Population:
         RootLogger.log_debug(f'Performing Elitist Selection on population.')
         percent_cutoff = self.elitist_cutoff(self.iteration_number, self.max_iteration)
         elitist_num = int(percent_cutoff*self.population_size)
-        sorted_by_performance = sorted(self.population, key=lambda mem: self.performance_dict[mem.unique_id].fitness, reverse=True)
+        with self.timer.phase('sorting'):
+            sorted_by_performance = sorted(self.population, key=lambda mem: self.performance_dict[mem.unique_id].fitness, reverse=True)
 
         top_performers = sorted_by_performance[:elitist_num]
         bot_performers = sorted_by_performance[elitist_num:]
@@ -136,11 +233,7 @@ class Population:
         # Compute Children
         children_needed = self.population_size - elitist_num 
         RootLogger.log_info(f'Producing {children_needed} to fill out population.')
-        while children_needed > 0:
-            RootLogger.log_debug(f'{children_needed} more children to go.')
-            new_child =  self.breed_children(top_performers, children_needed)
-            new_population.append(new_child)
-            children_needed -= 1
+        new_population += self.breed_children(top_performers, children_needed)
 
         RootLogger.log_info(f'Done generating next Population...')
         return new_population
@@ -169,21 +262,53 @@ class Population:
 
         return result
 
-    def run(self, max_iteration: int):
+    def run(self, max_iteration: int, checkpoint_path: str or None = None, checkpoint_every: int = 0, 
+            profile_every: int = 0, profile_dir: str = '.', on_iteration: Callable[[object], None] or None = None):
+        """Run the population until max_iteration. 
+
+        Args:
+            max_iteration (int): last iteration to run. 
+            checkpoint_path (str or None, optional): where to write checkpoints. Defaults to None.
+            checkpoint_every (int, optional): write a checkpoint every this many iterations, 0 disables them. Defaults to 0.
+            profile_every (int, optional): run cProfile and tracemalloc over every this many iterations, 0 disables them. Defaults to 0.
+            profile_dir (str, optional): where to write the profiles. Defaults to '.'.
+            on_iteration (Callable[[Population], None] or None, optional): called with the population after each iteration, 
+                before it is checkpointed. Defaults to None.
+        """
         RootLogger.log_info(f'Running population for {max_iteration} iterations.')
         self.max_iteration = max_iteration
-        while self.iteration_number <= max_iteration:
-            start_time = time.time()
-            RootLogger.log_info(f'On iteration {self.iteration_number} of {max_iteration}.')
-            self.update_population()
-            end_time = time.time()
-            # Append time to metrics
-            self.running_time += (end_time - start_time)
-            self.per_round_metrics[-1]['time'] = end_time - start_time
-
-            RootLogger.log_info(f'Iteration complete, took {end_time - start_time}s')
-            time_est = (self.running_time / self.iteration_number) * (max_iteration - self.iteration_number)
-            RootLogger.log_info(f'Estimated {time_est}s remaining for {(max_iteration - self.iteration_number)} rounds.')
+        profiler = GenerationProfiler(profile_dir) if profile_every > 0 else None
+        try:
+            while self.iteration_number <= max_iteration:
+                iteration = self.iteration_number
+                profiling = profiler is not None and iteration % profile_every == 0
+                start_time = time.time()
+                RootLogger.log_info(f'On iteration {self.iteration_number} of {max_iteration}.')
+                if profiling:
+                    profiler.start()
+                self.update_population()
+                profile_metrics = profiler.stop(iteration) if profiling else {}
+                end_time = time.time()
+                # Append time to metrics
+                self.running_time += (end_time - start_time)
+                self.per_round_metrics[-1]['time'] = end_time - start_time
+                # Only networks actually scored count, evaluations also holds cache hits and duplicates within the round. 
+                self.per_round_metrics[-1]['evaluations_per_second'] = self.per_round_metrics[-1]['fitness_cache_misses'] / (end_time - start_time)
+                self.per_round_metrics[-1].update(self.timer.collect())
+                self.per_round_metrics[-1].update(profile_metrics)
+                self.per_round_metrics[-1]['peak_rss_mb'] = peak_rss_mb()
+
+                RootLogger.log_info(f'Iteration complete, took {end_time - start_time}s')
+                time_est = (self.running_time / self.iteration_number) * (max_iteration - self.iteration_number)
+                RootLogger.log_info(f'Estimated {time_est}s remaining for {(max_iteration - self.iteration_number)} rounds.')
+
+                if on_iteration is not None:
+                    on_iteration(self)
+                completed_iterations = self.iteration_number - 1
+                if checkpoint_path is not None and checkpoint_every > 0 and completed_iterations % checkpoint_every == 0:
+                    write_checkpoint(self, checkpoint_path)
+        finally:
+            self.close_worker_pool()
         
         RootLogger.log_info(f'Done running population for {max_iteration} iterations. Returning Metrics.')
         self.done_running = True
@@ -0,0 +1,186 @@
+from typing import List, Dict, Tuple, Iterator
+from multiprocessing import Pool
+import csv
+import io
+import os
+import zipfile
+import pandas as pd
+
+from transit_network.transit_network import TransitNetwork, format_csv_value
+from transit_network.stops import Stop
+from transit_network.trips import SimpleTrip
+from genetic_algorithm.chromosome import Chromosome
+from genetic_algorithm.checkpoint import read_checkpoint, CHECKPOINT_FILENAME
+from genetic_algorithm.worker_pool import split_into_chunks
+from genetic_algorithm.population_store import PopulationSnapshot
+from transit_network.network_store import STORE_EXTENSION
+from utility.pickle import read_object_from_file
+from utility.root_logger import RootLogger
+
+MANIFEST_FILENAME = 'manifest.csv'
+
+def render_csv_rows(rows: Iterator[List]) -> str:
+    # Same formatting as TransitNetwork.write_to_gtfs, so the archives match what it writes.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow([format_csv_value(v) for v in row])
+    return buffer.getvalue()
+
+class SharedGTFSRows:
+    """Rendered stops.txt and shapes.txt rows, cached across the networks exported by one process.
+    Networks of a population share most of their stops and trips, so each stop and trip shape is only rendered once.
+    """
+
+    def __init__(self):
+        self.stop_rows: Dict[str, str] = {}
+        self.shape_rows: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_stop_rows(self, stop: Stop) -> str:
+        if stop.id in self.stop_rows:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.stop_rows[stop.id] = render_csv_rows([stop.to_gtfs_row()])
+        return self.stop_rows[stop.id]
+
+    def get_shape_rows(self, trip: SimpleTrip) -> str:
+        # Trips keep their id only while their shape is unchanged, bred trips get a new one.
+        if trip.id in self.shape_rows:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.shape_rows[trip.id] = render_csv_rows(trip.get_shapes_rows())
+        return self.shape_rows[trip.id]
+
+    def get_table_chunks(self, network: TransitNetwork, filename: str, rows: Iterator[List]) -> Iterator[str]:
+        if filename == 'stops':
+            return (self.get_stop_rows(s) for s in network.stops)
+        if filename == 'shapes':
+            return (self.get_shape_rows(t) for t in network.trips)
+        return (render_csv_rows([row]) for row in rows)
+
+def write_network_archive(network: TransitNetwork, zip_path: str, shared_rows: SharedGTFSRows) -> str:
+    """Write network as a GTFS zip at zip_path, with the same contents as TransitNetwork.write_to_gtfs.
+    """
+    RootLogger.log_debug(f'Writing network {network.id} to {zip_path}.')
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, headers, rows in network.gtfs_tables():
+            with io.TextIOWrapper(archive.open(filename + '.txt', 'w'), encoding='utf-8', newline='') as output:
+                output.write(render_csv_rows([headers]))
+                for chunk in shared_rows.get_table_chunks(network, filename, rows):
+                    output.write(chunk)
+    check_archive(zip_path)
+    return zip_path
+
+def check_archive(zip_path: str) -> None:
+    """Read the feed at zip_path back and check that stop_times.txt only refers to trips of trips.txt and stops of stops.txt.
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        def read_column(filename: str, column: str) -> List[str]:
+            with io.TextIOWrapper(archive.open(filename), encoding='utf-8', newline='') as table:
+                return [row[column] for row in csv.DictReader(table)]
+        trip_ids = set(read_column('trips.txt', 'trip_id'))
+        stop_ids = set(read_column('stops.txt', 'stop_id'))
+        unknown_trips = set(read_column('stop_times.txt', 'trip_id')) - trip_ids
+        unknown_stops = set(read_column('stop_times.txt', 'stop_id')) - stop_ids
+    if unknown_trips or unknown_stops:
+        error_msg = (f'stop_times.txt of {zip_path} refers to {len(unknown_trips)} trips not in trips.txt and '
+                     f'{len(unknown_stops)} stops not in stops.txt.')
+        RootLogger.log_error(error_msg)
+        raise ValueError(error_msg)
+
+def export_chunk(task: Tuple[str, List[Tuple[str, TransitNetwork]]]) -> Tuple[int, int]:
+    # Run in a worker process, the chunk's networks come in one pickle so the objects they share stay shared.
+    output_dir, entries = task
+    shared_rows = SharedGTFSRows()
+    for filename, network in entries:
+        write_network_archive(network, os.path.join(output_dir, filename), shared_rows)
+    return shared_rows.hits, shared_rows.misses
+
+def load_members(population_path: str) -> List[Chromosome]:
+    """Read the members of a population from a checkpoint or a pickled Population.
+    """
+    if os.path.basename(population_path) == CHECKPOINT_FILENAME:
+        return read_checkpoint(population_path)['population'].population
+    return read_object_from_file(population_path).population
+
+def load_ranked_members(population_path: str, top_k: int = 0) -> List[Chromosome]:
+    # Population stores are ranked from their header, so only the exported members' networks are read.
+    if os.path.splitext(population_path)[1] == STORE_EXTENSION:
+        snapshot = PopulationSnapshot(population_path)
+        return [snapshot.get_member(index) for index in snapshot.ranked_indices(top_k)]
+    return rank_members(load_members(population_path), top_k)
+
+def rank_members(members: List[Chromosome], top_k: int = 0) -> List[Chromosome]:
+    """Members sorted by fitness, best first. Members not evaluated yet, such as the last round's children, go last.
+
+    Args:
+        members (List[Chromosome]): population members.
+        top_k (int, optional): number of members to keep, 0 keeps all of them. Defaults to 0.
+
+    Returns:
+        List[Chromosome]: the top_k members.
+    """
+    scored = sorted([m for m in members if m.FitnessObj is not None], key=lambda m: m.FitnessObj.fitness, reverse=True)
+    unscored = [m for m in members if m.FitnessObj is None]
+    ranked = scored + unscored
+    if top_k > 0:
+        if top_k > len(scored):
+            RootLogger.log_warning(f'Only {len(scored)} of the top {top_k} networks have been evaluated.')
+        ranked = ranked[:top_k]
+    return ranked
+
+def manifest_row(rank: int, member: Chromosome, filename: str) -> Dict:
+    network = member.obj
+    row = {'rank': rank,
+           'gtfs': filename,
+           'network_id': network.id,
+           'unique_id': member.unique_id,
+           'content_hash': network.content_hash,
+           'num_routes': network.num_routes,
+           'num_trips': network.num_trips,
+           'num_stops': network.num_stops}
+    if member.FitnessObj is not None:
+        row.update(member.FitnessObj.to_dict())
+    return row
+
+def export_population(population_path: str, output_dir: str, top_k: int = 0, num_workers: int = 1) -> str:
+    """Write the best top_k networks of a population as GTFS zips, along with a manifest of their fitness components.
+
+    Args:
+        population_path (str): path to population.tns, a checkpoint or a pickled population.
+        output_dir (str): directory receiving the zips and manifest.
+        top_k (int, optional): number of networks to export, 0 exports all of them. Defaults to 0.
+        num_workers (int, optional): number of processes writing zips. Defaults to 1.
+
+    Returns:
+        str: path to the manifest.
+    """
+    ranked = load_ranked_members(population_path, top_k)
+    RootLogger.log_info(f'Exporting {len(ranked)} networks from {population_path} to {output_dir}.')
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    width = len(str(len(ranked)))
+    entries = [(f'network_{str(rank).zfill(width)}.zip', member.obj) for rank, member in enumerate(ranked, start=1)]
+    # One chunk per worker, so each worker renders the rows its networks share once.
+    tasks = [(output_dir, chunk) for chunk in split_into_chunks(entries, num_workers)]
+    if num_workers > 1:
+        with Pool(processes=num_workers) as pool:
+            results = pool.map(export_chunk, tasks)
+    else:
+        results = [export_chunk(task) for task in tasks]
+    hits = sum([h for h, _ in results])
+    misses = sum([m for _, m in results])
+    RootLogger.log_debug(f'Rendered {misses} stop and shape blocks, reused {hits}.')
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    df = pd.DataFrame([manifest_row(rank, member, filename) for rank, (member, (filename, _)) in enumerate(zip(ranked, entries), start=1)])
+    # Unevaluated members have no unique_id yet, keep the column integer rather than float. 
+    df['unique_id'] = df['unique_id'].astype('Int64')
+    df.to_csv(manifest_path, index=False)
+    RootLogger.log_info(f'Wrote manifest of {len(ranked)} networks to {manifest_path}.')
+    return manifest_path
@@ -0,0 +1,153 @@
+from typing import List, Dict, Iterator
+import os
+import pandas as pd
+
+from genetic_algorithm.chromosome import Chromosome
+from genetic_algorithm.fitness_function import fitness_from_dict
+from transit_network.network_store import NetworkStore, write_network_store, read_store_header, STORE_EXTENSION
+from transit_network.transit_network import TransitNetwork
+from utility.root_logger import RootLogger
+
+POPULATION_STORE_FILENAME = 'population' + STORE_EXTENSION
+
+def member_metadata(member: Chromosome) -> Dict:
+    return {'unique_id': member.unique_id,
+            'original_id': member.original_id,
+            'parent_A_id': member.parent_A_id,
+            'parent_B_id': member.parent_B_id,
+            'num_times_parent': member.num_times_parent,
+            'fitness': None if member.FitnessObj is None else member.FitnessObj.to_dict()}
+
+def write_population_store(population: object, store_path: str) -> str:
+    """Write the members of a population and its run metrics as a network store. 
+    Unlike a checkpoint this leaves out the evaluator and random states, so the run can't be continued from it. 
+    """
+    metadata = {'iteration_number': population.iteration_number,
+                'population_size': population.population_size,
+                'running_time': population.running_time,
+                'per_round_metrics': population.per_round_metrics}
+    return write_network_store([m.obj for m in population.population], store_path,
+                               network_metadata=[member_metadata(m) for m in population.population],
+                               metadata=metadata)
+
+class PopulationSnapshot:
+    """Read only view of a population store. 
+    Opening one reads only the header, members' ids and fitness come from it and their networks are read out of the 
+    memory-mapped file one at a time when asked for. 
+    """
+
+    def __init__(self, store_path: str):
+        self.path = store_path
+        self.header = read_store_header(store_path)
+        self.store = None
+
+    @property
+    def metadata(self) -> Dict:
+        return self.header['metadata']
+
+    @property
+    def iteration_number(self) -> int:
+        return self.metadata['iteration_number']
+
+    @property
+    def per_round_metrics(self) -> List[Dict]:
+        return self.metadata['per_round_metrics']
+
+    @property
+    def num_members(self) -> int:
+        return len(self.header['networks'])
+
+    def get_member_metadata(self, index: int) -> Dict:
+        return self.header['networks'][index]['metadata']
+
+    @property
+    def member_ids(self) -> List[int or None]:
+        return [self.get_member_metadata(i)['unique_id'] for i in range(self.num_members)]
+
+    def get_fitness(self, index: int) -> float or None:
+        fitness = self.get_member_metadata(index)['fitness']
+        return None if fitness is None else fitness['fitness']
+
+    def members_frame(self) -> pd.DataFrame:
+        """One row per member, in population order, with its ids and fitness components. 
+        """
+        rows = []
+        for index, network in enumerate(self.header['networks']):
+            values = network['metadata']
+            row = {'index': index, 'network_id': network['id'], 'unique_id': values['unique_id']}
+            if values['fitness'] is not None:
+                row.update(values['fitness'])
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        df['unique_id'] = df['unique_id'].astype('Int64')
+        return df
+
+    def ranked_indices(self, top_k: int = 0) -> List[int]:
+        """Member indices sorted by fitness, best first, with unevaluated members last. Same order as rank_members. 
+        """
+        scored = sorted([i for i in range(self.num_members) if self.get_fitness(i) is not None], key=self.get_fitness, reverse=True)
+        ranked = scored + [i for i in range(self.num_members) if self.get_fitness(i) is None]
+        if top_k > 0:
+            ranked = ranked[:top_k]
+        return ranked
+
+    def best_index(self) -> int or None:
+        ranked = self.ranked_indices(1)
+        if ranked == [] or self.get_fitness(ranked[0]) is None:
+            return None
+        return ranked[0]
+
+    def get_store(self) -> NetworkStore:
+        # Mapped on first use, so scanning snapshots never touches their arrays. 
+        if self.store is None:
+            self.store = NetworkStore(self.path, header=self.header)
+        return self.store
+
+    def get_network(self, index: int) -> TransitNetwork:
+        return self.get_store().get_network(index)
+
+    def get_member(self, index: int) -> Chromosome:
+        values = self.get_member_metadata(index)
+        member = Chromosome(self.get_network(index), parent_A_id=values['parent_A_id'], parent_B_id=values['parent_B_id'])
+        member.original_id = values['original_id']
+        member.unique_id = values['unique_id']
+        member.num_times_parent = values['num_times_parent']
+        if values['fitness'] is not None:
+            member.FitnessObj = fitness_from_dict(values['fitness'])
+        return member
+
+    def summary(self) -> Dict:
+        best_index = self.best_index()
+        return {'path': self.path,
+                'iteration_number': self.iteration_number,
+                'population_size': self.metadata['population_size'],
+                'running_time': self.metadata['running_time'],
+                'num_members': self.num_members,
+                'best_index': best_index,
+                'best_fitness': None if best_index is None else self.get_fitness(best_index)}
+
+def read_population_members(store_path: str) -> List[Chromosome]:
+    snapshot = PopulationSnapshot(store_path)
+    RootLogger.log_info(f'Reading {snapshot.num_members} members from {store_path}.')
+    return [snapshot.get_member(index) for index in range(snapshot.num_members)]
+
+def find_snapshots(directory: str) -> Iterator[str]:
+    """Paths of every population store under directory, in sorted order. 
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename == POPULATION_STORE_FILENAME:
+                yield os.path.join(root, filename)
+
+def summarize_snapshots(directory: str) -> pd.DataFrame:
+    """One summary row per population store under directory. Only each file's header is read, one file at a time. 
+    """
+    rows = []
+    for store_path in find_snapshots(directory):
+        try:
+            rows.append(PopulationSnapshot(store_path).summary())
+        except ValueError:
+            RootLogger.log_warning(f'Skipping unreadable population store {store_path}.')
+    RootLogger.log_info(f'Summarized {len(rows)} population stores under {directory}.')
+    return pd.DataFrame(rows)
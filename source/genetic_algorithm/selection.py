@@ -0,0 +1,120 @@
+from typing import Dict
+from abc import ABC, abstractmethod
+import numpy as np
+
+import genetic_algorithm.params as params
+
+class AliasTable:
+    """Walker's alias table over weights, built in O(n) with Vose's method. Each draw then takes one uniform index and
+    one uniform float, however many members there are.
+    """
+
+    def __init__(self, weights: np.ndarray):
+        n = len(weights)
+        scaled = weights * (n / weights.sum())
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small != [] and large != []:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left over is 1 up to rounding, and keeps prob 1.
+
+    def sample(self, size) -> np.ndarray:
+        columns = np.random.randint(len(self.prob), size=size)
+        return np.where(np.random.random_sample(size) < self.prob[columns], columns, self.alias[columns])
+
+class ParentSelection(ABC):
+    """Draws parents from a pool given each member's fitness. Subclasses set up their distribution in prepare and draw
+    indices from it in draw, draw_pairs handles keeping the two parents of a pair distinct.
+    """
+
+    @abstractmethod
+    def prepare(self, fitness: np.ndarray) -> None:
+        pass
+
+    @abstractmethod
+    def draw(self, size) -> np.ndarray:
+        pass
+
+    def draw_pairs(self, fitness: np.ndarray, num_pairs: int) -> np.ndarray:
+        """Draw num_pairs pairs of parents in one go.
+
+        Args:
+            fitness (np.ndarray): fitness of each member of the pool.
+            num_pairs (int): number of pairs to draw.
+
+        Returns:
+            np.ndarray: (num_pairs, 2) indices into the pool. The two parents of a pair differ unless the pool has one member.
+        """
+        if len(fitness) == 0:
+            raise ValueError('Attempt to sample parents from an empty pool.')
+        if len(fitness) == 1:
+            return np.zeros((num_pairs, 2), dtype=np.int64)
+        self.prepare(np.asarray(fitness, dtype=np.float64))
+        pairs = self.draw((num_pairs, 2))
+        # Redrawing the second parent until it differs gives it the distribution of drawing without replacement.
+        clashes = np.flatnonzero(pairs[:, 0] == pairs[:, 1])
+        while len(clashes) > 0:
+            pairs[clashes, 1] = self.draw(len(clashes))
+            clashes = clashes[pairs[clashes, 0] == pairs[clashes, 1]]
+        return pairs
+
+class RouletteSelection(ParentSelection):
+    """Chance of selection proportional to fitness, the same distribution as np.random.choice with the fitness as p.
+    """
+
+    def prepare(self, fitness: np.ndarray) -> None:
+        if (fitness < 0).any():
+            raise ValueError('Roulette selection needs non-negative fitness.')
+        if np.count_nonzero(fitness) < 2:
+            raise ValueError('Roulette selection needs at least two members with positive fitness.')
+        self.table = AliasTable(fitness)
+
+    def draw(self, size) -> np.ndarray:
+        return self.table.sample(size)
+
+class RankSelection(ParentSelection):
+    """Chance of selection proportional to rank, the worst member has rank 1 and the best len(pool).
+    Keeps selection pressure the same however close together the fitness values are.
+    """
+
+    def prepare(self, fitness: np.ndarray) -> None:
+        ranks = np.empty(len(fitness), dtype=np.float64)
+        ranks[np.argsort(fitness, kind='stable')] = np.arange(1, len(fitness) + 1)
+        self.table = AliasTable(ranks)
+
+    def draw(self, size) -> np.ndarray:
+        return self.table.sample(size)
+
+class TournamentSelection(ParentSelection):
+    """Each parent is the fittest of tournament_size members drawn uniformly, with replacement.
+    """
+
+    def __init__(self, tournament_size: int = params.TOURNAMENT_SIZE):
+        self.tournament_size = tournament_size
+
+    def prepare(self, fitness: np.ndarray) -> None:
+        self.fitness = fitness
+
+    def draw(self, size) -> np.ndarray:
+        size = size if isinstance(size, tuple) else (size,)
+        entrants = np.random.randint(len(self.fitness), size=size + (self.tournament_size,))
+        winners = np.argmax(self.fitness[entrants], axis=-1)
+        return np.take_along_axis(entrants, winners[..., np.newaxis], axis=-1)[..., 0]
+
+SELECTION_STRATEGIES: Dict[str, type] = {'roulette': RouletteSelection,
+                                         'rank': RankSelection,
+                                         'tournament': TournamentSelection}
+
+def get_selection(name: str) -> ParentSelection:
+    if name not in SELECTION_STRATEGIES:
+        raise ValueError(f'Unknown selection strategy {name}, expected one of {list(SELECTION_STRATEGIES.keys())}.')
+    return SELECTION_STRATEGIES[name]()
@@ -0,0 +1,99 @@
+from typing import List, Tuple
+import heapq
+
+from genetic_algorithm.chromosome import Chromosome
+from genetic_algorithm.population import Population
+import genetic_algorithm.params as params
+from utility.root_logger import RootLogger
+
+class SteadyStatePopulation(Population):
+    """Population that breeds batch_size children at a time, scores only those, and has each of them replace the
+    worst member if it scores higher. Members live in a min-heap on fitness, so finding the worst one doesn't sort.
+
+    An iteration is an epoch of population_size evaluations, the same number the generational Population makes, so
+    runs of either engine with the same number of iterations do the same amount of work. The zone sample is redrawn
+    at the start of each epoch, and members keep their scores across samples as elites do in the generational engine.
+    """
+
+    def __init__(self, *args, batch_size: int = params.STEADY_STATE_BATCH_SIZE, **kwargs):
+        Population.__init__(self, *args, **kwargs)
+        if batch_size < 1:
+            raise ValueError(f'Batch size must be at least 1, got {batch_size}.')
+        self.batch_size = batch_size
+
+    def build_heap(self) -> List[Tuple[float, int, Chromosome]]:
+        # (fitness, unique_id, member), ids are unique within an epoch so members are never compared.
+        heap = [(m.FitnessObj.fitness, m.unique_id, m) for m in self.population]
+        heapq.heapify(heap)
+        return heap
+
+    def insert_children(self, heap: List[Tuple[float, int, Chromosome]], children: List[Chromosome]) -> int:
+        """Replace the worst member with each child that scores higher than it.
+
+        Returns:
+            int: number of children that made it into the population.
+        """
+        replacements = 0
+        for child in children:
+            if child.FitnessObj.fitness > heap[0][0]:
+                _, _, worst = heapq.heapreplace(heap, (child.FitnessObj.fitness, child.unique_id, child))
+                del self.performance_dict[worst.unique_id]
+                self.performance_dict[child.unique_id] = child.FitnessObj
+                replacements += 1
+        return replacements
+
+    def update_population(self):
+        RootLogger.log_info(f'Running steady state epoch {self.iteration_number}...')
+        with self.timer.phase('zone_sampling'):
+            self.ZoneEvaluator.sample_stops()
+
+        for index, member in enumerate(self.population):
+            member.unique_id = index
+
+        # Members not scored yet, such as the initial population, are scored first and count towards the epoch.
+        unevaluated = [member for member in self.population if member.FitnessObj is None]
+        num_scored, cache_hits = self.score_members(unevaluated)
+        evaluations = len(unevaluated)
+
+        with self.timer.phase('sorting'):
+            heap = self.build_heap()
+            self.performance_dict = dict([(m.unique_id, m.FitnessObj) for _, _, m in heap])
+        # Children get ids past the members', they are relabelled with the rest at the end of the epoch.
+        next_id = len(self.population)
+
+        replacements = 0
+        batch_number = 0
+        while evaluations < self.population_size:
+            num_children = min(self.batch_size, self.population_size - evaluations)
+            members = [m for _, _, m in heap]
+            children = self.breed_children(members, num_children, id_prefix=f'{self.iteration_number}.{batch_number}')
+            for child in children:
+                child.unique_id = next_id
+                next_id += 1
+            batch_scored, batch_hits = self.score_members(children)
+            num_scored += batch_scored
+            cache_hits += batch_hits
+            with self.timer.phase('sorting'):
+                replacements += self.insert_children(heap, children)
+            evaluations += num_children
+            batch_number += 1
+
+        self.population = self.relabel_members(heap)
+        self.set_performance_metrics(self.performance_dict)
+        self.per_round_metrics[-1]['evaluations'] = evaluations
+        self.per_round_metrics[-1]['replacements'] = replacements
+        self.per_round_metrics[-1]['fitness_cache_hits'] = cache_hits
+        self.per_round_metrics[-1]['fitness_cache_misses'] = num_scored
+        RootLogger.log_info(f'Done with epoch, {replacements} of {evaluations - len(unevaluated)} children replaced a member.')
+        self.iteration_number += 1
+
+    def relabel_members(self, heap: List[Tuple[float, int, Chromosome]]) -> List[Chromosome]:
+        # Best first with unique_id equal to index, as the generational engine leaves them, so results and stores
+        # written from this population read the same way.
+        with self.timer.phase('sorting'):
+            members = [m for _, _, m in sorted(heap, key=lambda entry: (-entry[0], entry[1]))]
+        self.performance_dict = {}
+        for index, member in enumerate(members):
+            member.unique_id = index
+            self.performance_dict[index] = member.FitnessObj
+        return members
@@ -0,0 +1,118 @@
+from typing import List, Dict, Tuple
+from multiprocessing import Pool
+import random
+
+from transit_network.transit_network import TransitNetwork
+from genetic_algorithm.network_metrics import NetworkMetrics
+from genetic_algorithm.zone_evaluator import ZoneEvaluator
+import genetic_algorithm.params as params
+from utility.root_logger import RootLogger
+
+# State owned by each worker process, set once by init_worker.
+_worker_state = {}
+
+def get_lambdas() -> Tuple[float, float, float, float]:
+    return (params.COVERAGE_LAMBDA, params.RIDERSHIP_DENSITY_LAMBDA, params.ZONE_LAMBDA, params.EXTREME_TRIP_LAMBDA)
+
+def set_lambdas(lambdas: Tuple[float, float, float, float]) -> None:
+    params.COVERAGE_LAMBDA, params.RIDERSHIP_DENSITY_LAMBDA, params.ZONE_LAMBDA, params.EXTREME_TRIP_LAMBDA = lambdas
+
+def init_worker(initial_metrics: NetworkMetrics, ZoneEV: ZoneEvaluator, fitness_function, breeding_function, 
+                lambdas: Tuple[float, float, float, float]) -> None:
+    # Lambdas may have been overwritten from the command line, so they don't come with the module.
+    set_lambdas(lambdas)
+    _worker_state['initial_metrics'] = initial_metrics
+    _worker_state['ZoneEvaluator'] = ZoneEV
+    _worker_state['fitness_function'] = fitness_function
+    _worker_state['breeding_function'] = breeding_function
+
+def breed_with_seed(breeding_function, parent_A: TransitNetwork, parent_B: TransitNetwork, new_id: str, seed: int) -> TransitNetwork:
+    """Breed two networks with the random module seeded by seed, restoring its previous state afterwards. 
+    This makes a child depend only on its parents and seed, not on which process bred it or in what order. 
+    """
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        return breeding_function(parent_A, parent_B, new_id=new_id)
+    finally:
+        random.setstate(state)
+
+def evaluate_chunk(task: Tuple[Dict, List[TransitNetwork]]) -> List[object]:
+    stop_sample, networks = task
+    ZoneEV = _worker_state['ZoneEvaluator']
+    ZoneEV.set_stop_sample(stop_sample)
+    fitness_function = _worker_state['fitness_function']
+    initial_metrics = _worker_state['initial_metrics']
+    return [fitness_function(net, initial_metrics, ZoneEV) for net in networks]
+
+def breed_chunk(task: Tuple[Dict[int, TransitNetwork], List[Tuple[int, int, str, int]]]) -> List[TransitNetwork]:
+    parents, jobs = task
+    breeding_function = _worker_state['breeding_function']
+    return [breed_with_seed(breeding_function, parents[parent_A], parents[parent_B], new_id, seed) for parent_A, parent_B, new_id, seed in jobs]
+
+def split_into_chunks(items: List[object], num_chunks: int) -> List[List[object]]:
+    """Split items into at most num_chunks contiguous chunks, preserving order.
+    """
+    num_chunks = max(1, min(num_chunks, len(items)))
+    chunk_size, remainder = divmod(len(items), num_chunks)
+    chunks = []
+    start = 0
+    for index in range(num_chunks):
+        end = start + chunk_size + (1 if index < remainder else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+class WorkerPool:
+    """Process pool holding a snapshot of the ZoneEvaluator and NetworkMetrics in every worker, used for evaluation and breeding.
+    The current stop sample is sent along with every batch, so workers always score against the same sample as the parent.
+    """
+    chunks_per_worker = 4
+
+    def __init__(self, num_workers: int,
+                       initial_metrics: NetworkMetrics,
+                       ZoneEV: ZoneEvaluator,
+                       fitness_function, 
+                       breeding_function):
+        RootLogger.log_info(f'Starting worker pool with {num_workers} processes.')
+        self.num_workers = num_workers
+        self.pool = Pool(processes=num_workers,
+                         initializer=init_worker,
+                         initargs=(initial_metrics, ZoneEV, fitness_function, breeding_function, get_lambdas()))
+
+    def evaluate_networks(self, networks: List[TransitNetwork], stop_sample: Dict) -> List[object]:
+        """Evaluate networks across the pool, returning fitness objects in the same order as networks.
+        """
+        if networks == []:
+            return []
+        chunks = split_into_chunks(networks, self.num_workers * self.chunks_per_worker)
+        RootLogger.log_debug('Evaluating %d networks in %d chunks across %d processes.', len(networks), len(chunks), self.num_workers)
+        results = self.pool.map(evaluate_chunk, [(stop_sample, chunk) for chunk in chunks])
+        return [fitness for chunk_result in results for fitness in chunk_result]
+
+    def breed_networks(self, parents: Dict[int, TransitNetwork], jobs: List[Tuple[int, int, str, int]]) -> List[TransitNetwork]:
+        """Breed children across the pool, returning them in the same order as jobs. 
+
+        Args:
+            parents (Dict[int, TransitNetwork]): parent networks keyed by their chromosome's unique_id. 
+            jobs (List[Tuple[int, int, str, int]]): (parent_A_id, parent_B_id, new_id, seed) for each child. 
+
+        Returns:
+            List[TransitNetwork]: child networks. 
+        """
+        if jobs == []:
+            return []
+        # One chunk per worker, so each parent is shipped to a worker at most once. 
+        chunks = split_into_chunks(jobs, self.num_workers)
+        tasks = []
+        for chunk in chunks:
+            needed_ids = set([job[0] for job in chunk] + [job[1] for job in chunk])
+            tasks.append(({parent_id: parents[parent_id] for parent_id in needed_ids}, chunk))
+        RootLogger.log_debug('Breeding %d children in %d chunks across %d processes.', len(jobs), len(chunks), self.num_workers)
+        results = self.pool.map(breed_chunk, tasks)
+        return [child for chunk_result in results for child in chunk_result]
+
+    def close(self) -> None:
+        RootLogger.log_info(f'Shutting down worker pool.')
+        self.pool.close()
+        self.pool.join()
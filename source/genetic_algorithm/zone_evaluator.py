@@ -5,9 +5,10 @@ from transit_network.trips import SimpleTrip
 from transit_network.shapes import Coords
 import genetic_algorithm.params as params
 from utility.root_logger import RootLogger
-from genetic_algorithm.caching import RouteDistanceToZoneKey, AllRouteDistancesToZoneKey
+from genetic_algorithm.caching import RouteDistanceToZoneKey, AllRouteDistancesToZoneKey, LRUCache
 
 import csv
+import numpy as np
 
 import random 
 from typing import List, Tuple, Dict
@@ -75,6 +76,22 @@ ZONES = parse_zone_file(params.ZONE_FILE)
 DOWNTOWN_ZONE = find_zones_with_tag(ZONES, 'downtown')[0]
 SUBURB_ZONES = [z for z in ZONES if z != DOWNTOWN_ZONE]
 
+def hop_distances(membership: np.ndarray) -> np.ndarray:
+    """For every position of a trip, the number of hops to the nearest position in each zone. 
+
+    Args:
+        membership (np.ndarray): (positions x zones) bool matrix, True where the stop at that position is in the zone. 
+
+    Returns:
+        np.ndarray: (positions x zones) float32 distances, inf where the trip never enters the zone. 
+    """
+    num_positions = membership.shape[0]
+    positions = np.arange(num_positions, dtype=np.float64)[:, None]
+    # Nearest member at or before each position, then at or after it. 
+    last_seen = np.maximum.accumulate(np.where(membership, positions, -np.inf), axis=0)
+    next_seen = np.minimum.accumulate(np.where(membership, positions, np.inf)[::-1], axis=0)[::-1]
+    return np.minimum(positions - last_seen, next_seen - positions).astype(np.float32)
+
 class ZoneEvaluator:
 
     zone_paths = [p for p in create_paths_to_downtown(DOWNTOWN_ZONE, SUBURB_ZONES, 1.0)] + [p for p in fully_connect_zones(SUBURB_ZONES, 0.5)]
@@ -82,17 +99,31 @@ class ZoneEvaluator:
     def __init__(self, initial_network: TransitNetwork):
         self.initial_network = initial_network
         self.pool_of_stops = initial_network.stops 
-        self.zone_keys = dict([(z, i) for i, z in enumerate(ZONES)])
+        # Keyed by name, Zone objects are recreated when an evaluator is unpickled in another process. 
+        self.zone_keys = dict([(z.name, i) for i, z in enumerate(ZONES)])
         self.stops_in_zone = [self.determine_stops_in_range(z) for z in ZONES]
+        self.stop_zone_mask = self.build_stop_zone_mask()
         self.current_stop_choices = {}
         self.initial_zone_score = 0
 
-        self.known_route_distances: Dict[RouteDistanceToZoneKey, int] = {}
-        self.known_all_route_distances: Dict[AllRouteDistancesToZoneKey, int] = {}
+        # Distances only depend on the source stop, the routes' trips and the target zone, so entries hold across networks. 
+        self.known_route_distances = LRUCache(params.ZONE_CACHE_MAX_ENTRIES, params.ZONE_CACHE_MAX_BYTES)
+        self.known_all_route_distances = LRUCache(params.ZONE_CACHE_MAX_ENTRIES, params.ZONE_CACHE_MAX_BYTES)
+        # Trip id -> hop_distances of the trip. Trips keep their stops for life, so this holds for every sample and network. 
+        self.known_trip_distances = LRUCache(params.ZONE_CACHE_MAX_ENTRIES, params.ZONE_CACHE_MAX_BYTES)
 
         self.sample_stops()
-        self.log_choices()
+        if RootLogger.debug_enabled:
+            self.log_choices()
         
+    def __getstate__(self):
+        # Cached distances can be recomputed, so they are left behind when shipped to workers or checkpointed. 
+        state = self.__dict__.copy()
+        for cache_name in ['known_route_distances', 'known_all_route_distances', 'known_trip_distances']:
+            cache = state[cache_name]
+            state[cache_name] = LRUCache(cache.max_entries, cache.max_bytes, cache.sizeof)
+        return state
+
     def log_choices(self) -> None:
         result_str = '*\n'
         for zone in ZONES:
@@ -105,7 +136,7 @@ class ZoneEvaluator:
         RootLogger.log_debug(result_str)
 
     def get_zone_key(self, zone: Zone) -> int:
-        return self.zone_keys[zone]
+        return self.zone_keys[zone.name]
     
     def get_zone_stops(self, zone: Zone) -> List[Stop]:
         zone_key = self.get_zone_key(zone)
@@ -116,9 +147,28 @@ class ZoneEvaluator:
         if stops == []:
             RootLogger.log_error(f'Failed to find stops within range {params.ZONE_RADIUS} of {zone.get_coords()}')
         else:
-            RootLogger.log_debug(f'Found {len(stops)} stops within range {params.ZONE_RADIUS} of {zone.get_coords()}')
+            RootLogger.log_debug('Found %d stops within range %s of %s', len(stops), params.ZONE_RADIUS, zone.get_coords())
         return stops
     
+    def build_stop_zone_mask(self) -> Dict[str, np.ndarray]:
+        # stop_id -> bool row over zones, stops outside of every zone are left out. 
+        mask = {}
+        for z_key, stop_ids in enumerate(self.stops_in_zone):
+            for stop_id in stop_ids:
+                if stop_id not in mask:
+                    mask[stop_id] = np.zeros(len(ZONES), dtype=bool)
+                mask[stop_id][z_key] = True
+        return mask
+
+    def get_trip_distances(self, trip: SimpleTrip) -> np.ndarray:
+        distances = self.known_trip_distances.get(trip.id)
+        if distances is None:
+            outside = np.zeros(len(ZONES), dtype=bool)
+            membership = np.array([self.stop_zone_mask.get(s.id, outside) for s in trip.stops], dtype=bool).reshape(len(trip.stops), len(ZONES))
+            distances = hop_distances(membership)
+            self.known_trip_distances.put(trip.id, distances)
+        return distances
+
     def sample_stop_for_zone(self, zone: Zone): 
         stop_options = self.get_zone_stops(zone)
         # TODO: Could sample here by population weight, or by ridership weight. 
@@ -129,29 +179,45 @@ class ZoneEvaluator:
         for z in ZONES:
             z_key = self.get_zone_key(z) 
             self.current_stop_choices[z_key] = [self.sample_stop_for_zone(z) for i in range(params.ZONE_SAMPLE_NUM)]
+        self.invalidate_unsampled_stops()
         # Update initial_zone_score with new sample
         self.initial_zone_score = self.evaluate_total_zone_distance(self.initial_network)
-    
-    def trip_distance_to_zone(self, trip: SimpleTrip, stop_index: int, target_zone: Zone) -> int:
-        trip_length = len(trip.stops)
-        cur_index_inc = stop_index
-        cur_index_dec = stop_index
-        target_stops = self.get_zone_stops(target_zone)
-        # Basically a BFS on a list. Find nearest stop in that group by branching out left and right. 
-        distance = 0 
-        while cur_index_inc < trip_length or cur_index_dec >= 0:
-            if cur_index_inc < trip_length and trip.stops[cur_index_inc].id in target_stops:
-                return distance
-            
-            if cur_index_dec >= 0 and trip.stops[cur_index_dec].id in target_stops:
-                return distance
-            
-            cur_index_inc += 1
-            cur_index_dec -= 1
 
-            distance += 1
-        
-        return float('inf')
+    def get_stop_sample(self) -> Dict:
+        return {
+            'stop_choices': {z_key: list(choices) for z_key, choices in self.current_stop_choices.items()},
+            'initial_zone_score': self.initial_zone_score
+        }
+
+    @property
+    def stop_sample_key(self) -> Tuple:
+        return tuple(sorted([(z_key, tuple(choices)) for z_key, choices in self.current_stop_choices.items()]))
+
+    def set_stop_sample(self, stop_sample: Dict) -> None:
+        """Adopt a sample drawn elsewhere, without redrawing or rescoring the initial network.
+        """
+        self.current_stop_choices = {z_key: list(choices) for z_key, choices in stop_sample['stop_choices'].items()}
+        self.initial_zone_score = stop_sample['initial_zone_score']
+        self.invalidate_unsampled_stops()
+
+    def invalidate_unsampled_stops(self) -> None:
+        """Drop cached distances from stops that are no longer sampled, they won't be asked for again until redrawn. 
+        """
+        sampled_stops = set([stop_id for choices in self.current_stop_choices.values() for stop_id in choices])
+        dropped = 0
+        for cache in [self.known_route_distances, self.known_all_route_distances]:
+            dropped += cache.invalidate(lambda key: key[0] not in sampled_stops)
+        if RootLogger.debug_enabled:
+            RootLogger.log_debug('Dropped %d cached zone distances for unsampled stops, caches at %s', dropped, self.cache_stats())
+
+    def cache_stats(self) -> Dict[str, Dict]:
+        return {'route_distances': self.known_route_distances.stats(), 
+                'all_route_distances': self.known_all_route_distances.stats(), 
+                'trip_distances': self.known_trip_distances.stats()}
+
+    def trip_distance_to_zone(self, trip: SimpleTrip, stop_index: int, target_zone: Zone) -> int:
+        distance = self.get_trip_distances(trip)[stop_index, self.get_zone_key(target_zone)]
+        return int(distance) if distance != np.inf else float('inf')
 
     def route_distance_to_zone(self, route: SimpleRoute, source_stop: Stop, target_zone: Zone) -> int:
         trip_distances = []
@@ -169,20 +235,23 @@ class ZoneEvaluator:
     
     def all_routes_distances_to_zone(self, target_network: TransitNetwork, route_options: List[str], source_stop: str, target_zone: str) -> List[int]:
 
-        AllRouteKey = str(AllRouteDistancesToZoneKey(route_options, source_stop, target_zone))
-        if AllRouteKey in self.known_all_route_distances:
-            return self.known_all_route_distances[AllRouteKey]
+        routes = [target_network.lookup_route_by_id(route_id) for route_id in route_options]
+        route_signatures = [route.trip_signature for route in routes]
+
+        AllRouteKey = AllRouteDistancesToZoneKey(route_signatures, source_stop, target_zone.name).as_tuple()
+        known_distances = self.known_all_route_distances.get(AllRouteKey)
+        if known_distances is not None:
+            return known_distances
         
         # Compute Distance
         routes_dist = []
-        for route_id in route_options:
+        for route, route_signature in zip(routes, route_signatures):
             # Check if we are already computed this distance. 
-            RouteKey = str(RouteDistanceToZoneKey(route_id, source_stop, target_zone.name))
-            if RouteKey in self.known_route_distances:
-                    routes_dist.append(self.known_route_distances[RouteKey])
+            RouteKey = RouteDistanceToZoneKey(route_signature, source_stop, target_zone.name).as_tuple()
+            known_distance = self.known_route_distances.get(RouteKey)
+            if known_distance is not None:
+                routes_dist.append(known_distance)
             else:
-                route = target_network.lookup_route_by_id(route_id)
-
                 # Handle the case where stop transfers are not updated properly. 
                 # TODO: simplify this since error shouldn't happen anymore. 
                 try:
@@ -192,10 +261,10 @@ class ZoneEvaluator:
                     RootLogger.log_error(error_msg)
                     raise TypeError(error_msg)
 
-                self.known_route_distances[RouteKey] = route_dist
+                self.known_route_distances.put(RouteKey, route_dist)
                 routes_dist.append(route_dist)
 
-        self.known_all_route_distances[AllRouteKey] = routes_dist
+        self.known_all_route_distances.put(AllRouteKey, routes_dist)
         return routes_dist
 
     def evaluate_zone_distance(self, target_network: TransitNetwork, source_zone: Zone, target_zone: Zone) -> float:
@@ -247,8 +316,9 @@ class ZoneEvaluator:
 
 
         if routes_dist == [] or min(routes_dist) == float('inf'):
-            RootLogger.log_debug(f'Unable to find route from {source_zone} to {target_zone}, giving distance of {params.DEFAULT_ZONE_DISTANCE}')
-            RootLogger.log_debug(f'None of {all_route_options} reach {target_zone}!')
+            if RootLogger.debug_enabled:
+                RootLogger.log_debug('Unable to find route from %s to %s, giving distance of %s', source_zone, target_zone, params.DEFAULT_ZONE_DISTANCE)
+                RootLogger.log_debug('None of %s reach %s!', all_route_options, target_zone)
             return params.DEFAULT_ZONE_DISTANCE
 
         return min(routes_dist)
@@ -266,7 +336,7 @@ class ZoneEvaluator:
         return total_zone_distance
     
     def evaluate_network(self, target_network: TransitNetwork):
-        RootLogger.log_info(f'Evaluating network {target_network.id} in ZoneEvaluator...')
+        RootLogger.log_info('Evaluating network %s in ZoneEvaluator...', target_network.id)
         raw_zone_dist = self.evaluate_total_zone_distance(target_network)
         if raw_zone_dist == 0:
             RootLogger.log_warning(f'Initial network achieved score of 0, setting to {params.ZONE_EPSILON}.')
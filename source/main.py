@@ -1,7 +1,10 @@
-from utility.pickle import read_object_from_file
+from transit_network.network_store import read_network_from_file
 from utility.args_parser import model_run_args
 from genetic_algorithm.initial_population_generator import initiate_population_from_network 
 from genetic_algorithm.population import Population
+from genetic_algorithm.island_model import IslandModel
+from genetic_algorithm.checkpoint import resume_from_checkpoint, CHECKPOINT_FILENAME
+from genetic_algorithm.population_store import PopulationSnapshot, POPULATION_STORE_FILENAME, summarize_snapshots
 from visuals.graph_metrics import graph_all_metrics
 from visuals.graph_gtfs import generate_diagram
 from utility.root_logger import RootLogger
@@ -12,35 +15,63 @@ import pandas as pd
 import logging
 
 
+def get_run_output_dir(output_dir: str or None, num_generations: int, population_size: int) -> str:
+    if output_dir is None:
+        return f'./output/{num_generations}i{population_size}p'
+    return f'{output_dir}/{num_generations}i{population_size}p'
+
 def run_from_network(num_generations: int, 
                      population_size: int, 
                      initial_network_path: str or None = None, 
                      output_dir: str or None = None, 
-                     do_output: bool=True) -> Population:
+                     do_output: bool=True, 
+                     num_workers: int = 1, 
+                     checkpoint_every: int = 0, 
+                     resume: bool = False, 
+                     profile_every: int = 0, 
+                     steady_state: bool = False, 
+                     batch_size: int = 2, 
+                     selection: str = 'roulette') -> Population:
     """Generate network and run for specified number of iterations
 
     Args:
         num_generations (int): num generations to run model
         population_size (int): how many networks to generate
-        initial_network_path (strorNone, optional): path to initial network pickle file. Defaults to 'data/new_initial_net/new_initial_net.pkl'.
+        initial_network_path (strorNone, optional): path to initial network pickle or network store file. Defaults to 'data/new_initial_net/new_initial_net.pkl'.
         output_dir (strorNone, optional): where to dump metrics. Defaults to './output/{num_generations}i{population_size}p'.
+        num_workers (int, optional): number of processes used to evaluate the population. Defaults to 1.
+        checkpoint_every (int, optional): write a checkpoint to output_dir every this many generations, 0 disables them. Defaults to 0.
+        resume (bool, optional): continue from the checkpoint in output_dir if there is one. Defaults to False.
+        profile_every (int, optional): write a cProfile of every this many generations to output_dir, 0 disables them. Defaults to 0.
+        steady_state (bool, optional): run the steady state engine, where a generation is an epoch of population_size evaluations. Defaults to False.
+        batch_size (int, optional): children bred at a time by the steady state engine. Defaults to 2.
+        selection (str, optional): parent selection strategy, one of genetic_algorithm.selection.SELECTION_STRATEGIES. Defaults to 'roulette'.
 
     Returns:
         Population: Final population of the run. 
     """
-    if output_dir is None:
-        output_dir = f'./output/{num_generations}i{population_size}p'
-    else:
-        output_dir = f'{output_dir}/{num_generations}i{population_size}p'
+    output_dir = get_run_output_dir(output_dir, num_generations, population_size)
 
     if initial_network_path is None:
         initial_network_path = 'data/new_initial_net/new_initial_net.pkl'
 
     RootLogger.log_info(f'Running network {initial_network_path} for {num_generations} with size {population_size}. Sending results to {output_dir}.')
 
-    Network = read_object_from_file(initial_network_path)
-    Pop = initiate_population_from_network(Network, population_size)
-    res = Pop.run(num_generations)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILENAME)
+    if checkpoint_every > 0 and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if resume and os.path.exists(checkpoint_path):
+        Pop = resume_from_checkpoint(checkpoint_path)
+        Pop.num_workers = num_workers
+    else:
+        if resume:
+            RootLogger.log_warning(f'No checkpoint found at {checkpoint_path}, starting a new run.')
+        Network = read_network_from_file(initial_network_path)
+        Pop = initiate_population_from_network(Network, population_size, num_workers=num_workers, 
+                                               steady_state=steady_state, batch_size=batch_size, selection=selection)
+    res = Pop.run(num_generations, checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every, 
+                  profile_every=profile_every, profile_dir=output_dir)
     if do_output:
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -48,9 +79,45 @@ def run_from_network(num_generations: int,
         graph_all_metrics(Population=Pop, results_csv=results_filename, output_folder=output_dir)
     return Pop
 
+def run_islands(num_generations: int, 
+                population_size: int, 
+                num_islands: int, 
+                migration_interval: int, 
+                num_migrants: int, 
+                topology: str = 'ring', 
+                initial_network_path: str = 'data/new_initial_net/new_initial_net.pkl', 
+                output_dir: str or None = None, 
+                num_workers: int = 1, 
+                profile_every: int = 0, 
+                selection: str = 'roulette') -> IslandModel:
+    """Run an island model of num_islands populations of population_size, writing each island's metrics, graphs and 
+    population to island_{i} in the output directory, along with a summary.csv of all of them. 
+
+    Returns:
+        IslandModel: the finished model, holding each island's final population. 
+    """
+    output_dir = get_run_output_dir(output_dir, num_generations, population_size)
+    RootLogger.log_info(f'Running {num_islands} islands of network {initial_network_path} for {num_generations} with size {population_size}. Sending results to {output_dir}.')
+
+    Network = read_network_from_file(initial_network_path)
+    Model = IslandModel(Network, num_islands, population_size, migration_interval, num_migrants, 
+                        topology=topology, num_workers=num_workers, selection=selection)
+    populations = Model.run(num_generations, profile_every=profile_every, output_dir=output_dir)
+    for island, Pop in enumerate(populations):
+        island_dir = os.path.join(output_dir, f'island_{island}')
+        if not os.path.exists(island_dir):
+            os.makedirs(island_dir)
+        results_filename = Pop.export_metrics(output_directory=island_dir)
+        graph_all_metrics(Population=Pop, results_csv=results_filename, output_folder=island_dir)
+
+    summary_path = os.path.join(output_dir, 'summary.csv')
+    summarize_snapshots(output_dir).to_csv(summary_path, index=False)
+    RootLogger.log_info(f'Wrote summary of islands to {summary_path}.')
+    return Model
+
 def examine_best_performer(output_dir: str):
     RootLogger.log_info(f'Examining best performer...')
-    population_path = os.path.join(output_dir, 'population.pkl')
+    population_path = os.path.join(output_dir, POPULATION_STORE_FILENAME)
     results_path = os.path.join(output_dir, 'results.csv')
     gtfs_dir = os.path.join(output_dir, 'gtfs/')
 
@@ -58,8 +125,8 @@ def examine_best_performer(output_dir: str):
     id = df['best_performer'].iloc[-1]
 
     RootLogger.log_info(f'Exporting best performer...')
-    pop = read_object_from_file(population_path)
-    best_performer = pop.population[id].obj
+    # Only the best performer is read out of the store. 
+    best_performer = PopulationSnapshot(population_path).get_network(id)
     best_performer.write_to_gtfs(gtfs_dir)
     zip_path = os.path.join(output_dir, 'gtfs.zip')
 
@@ -76,18 +143,45 @@ def main(args) -> None:
         from statistics import mean 
 
         RootLogger.log_info(f'Producing time estimate of running {args.num_generations} of {args.population_size} networks based on {args.time_estimate} runs.')
-        FinalPop = run_from_network(args.time_estimate+1, args.population_size, initial_network_path=args.initial_network, do_output=False)
+        FinalPop = run_from_network(args.time_estimate+1, args.population_size, initial_network_path=args.initial_network, do_output=False, 
+                                    num_workers=args.num_workers, steady_state=args.steady_state, batch_size=args.batch_size, 
+                                    selection=args.selection)
        
         avg_time = mean([x['time'] for x in FinalPop.per_round_metrics[1:]])
         estimate = avg_time * args.num_generations
         RootLogger.log_info(f'Time estimate complete with time of {estimate}.')
+        run_dir = f'{args.output}{args.num_generations}i{args.population_size}p'
+    elif args.num_islands > 1:
+        if args.checkpoint_every > 0 or args.resume:
+            RootLogger.log_warning('Checkpoints are not supported for island runs, ignoring them.')
+        if args.steady_state:
+            RootLogger.log_warning('The steady state engine is not supported for island runs, running generational islands.')
+        Model = run_islands(args.num_generations, args.population_size, args.num_islands, 
+                            args.migration_interval, args.num_migrants, 
+                            topology=args.topology, 
+                            initial_network_path=args.initial_network, 
+                            output_dir=args.output, 
+                            num_workers=args.num_workers, 
+                            profile_every=args.profile_every, 
+                            selection=args.selection)
+        best_island = Model.best_island()
+        RootLogger.log_info(f'Run Complete with time of {Model.running_time}, best network found on island {best_island}.')
+        run_dir = os.path.join(f'{args.output}{args.num_generations}i{args.population_size}p', f'island_{best_island}')
     else:
         FinalPop = run_from_network(args.num_generations, args.population_size, 
                                     initial_network_path=args.initial_network, 
-                                    output_dir=args.output)
+                                    output_dir=args.output, 
+                                    num_workers=args.num_workers, 
+                                    checkpoint_every=args.checkpoint_every, 
+                                    resume=args.resume, 
+                                    profile_every=args.profile_every, 
+                                    steady_state=args.steady_state, 
+                                    batch_size=args.batch_size, 
+                                    selection=args.selection)
         RootLogger.log_info(f'Run Complete with time of {FinalPop.running_time}.')
+        run_dir = f'{args.output}{args.num_generations}i{args.population_size}p'
     if args.best_performer:
-        examine_best_performer(f'{args.output}{args.num_generations}i{args.population_size}p')
+        examine_best_performer(run_dir)
 
 if __name__ == '__main__':
    args = model_run_args()
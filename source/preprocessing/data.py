@@ -1,4 +1,10 @@
+from typing import List, Dict
 from pathlib import Path
+import pandas as pd
+
+def dataframe_records(df: pd.DataFrame) -> List[Dict]:
+    # Like df.to_dict('records'), but keeps values as iterrows would give them, missing values stay NA instead of None. 
+    return [dict(zip(df.columns, row)) for row in df.itertuples(index=False, name=None)]
 
 class DataBase:
     """
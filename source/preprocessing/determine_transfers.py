@@ -1,9 +1,11 @@
 from typing import List 
+import numpy as np
 
 from transit_network.routes import GTFSRoute
 from transit_network.stops import Stop
 from utility.root_logger import RootLogger
-from preprocessing.params import STOP_TRANSFER_THRESHOLD
+from preprocessing.params import STOP_TRANSFER_THRESHOLD, STOP_TRANSFER_MARGIN
+from preprocessing.spatial_index import StopGridIndex
 
 def flatten(lst: List[List[any]]) -> List[any]:
     return [item for sublist in lst for item in sublist]
@@ -22,24 +24,51 @@ def should_merge(stopA: Stop, stopB: Stop) -> bool:
     return False
 
 def merge_stops(stops: List[Stop]) -> List[Stop]:
+    """Greedily merge stops, in order: the first remaining stop absorbs every later stop that should_merge with it, 
+    as it grows, then is set aside. 
+    
+    Only stops the grid index places near the current stop, or that share its id, can merge with it, 
+    so those are the only ones checked with should_merge. 
+    """
+    # Haversine and geodesic distances disagree slightly, so the index over-selects and should_merge decides. 
+    Index = StopGridIndex(stops, STOP_TRANSFER_THRESHOLD * (1.0 + STOP_TRANSFER_MARGIN))
+    stops_by_id = {}
+    for index, stop in enumerate(stops):
+        stops_by_id.setdefault(stop.get_id(), []).append(index)
+    stops_by_id = {stop_id: np.array(indices, dtype=np.int64) for stop_id, indices in stops_by_id.items()}
+    no_stops = np.array([], dtype=np.int64)
 
-    def merge_stop_step(cur_stop: Stop, other_stops: List[Stop]):
-        remaining_stops = []
-        for stop in other_stops:
-            if should_merge(cur_stop, stop):
-                cur_stop = cur_stop.merge_with(stop)
-            else:
-                remaining_stops.append(stop)
-        return cur_stop, remaining_stops
-
-    cur_stops = [s for s in stops]
+    remaining = np.ones(len(stops), dtype=bool)
+    num_remaining = len(stops)
     new_stops = []
-    while cur_stops != []:
-        RootLogger.log_debug(f'Merging stops with {len(cur_stops)} remaining.')
-        cur_stop = cur_stops[0]
-        new_stop, other_stops = merge_stop_step(cur_stop, cur_stops[1:])
-        new_stops.append(new_stop)
-        cur_stops = other_stops
+    for cur_index in range(len(stops)):
+        if not remaining[cur_index]:
+            continue
+        RootLogger.log_debug(f'Merging stops with {num_remaining} remaining.')
+        remaining[cur_index] = False
+        num_remaining -= 1
+        cur_stop = stops[cur_index]
+
+        # Walk forward through candidates, any stop between them would not have merged with cur_stop. 
+        # Merging moves and may rename cur_stop, so candidates are looked up again after each merge. 
+        last_index = cur_index
+        merged = True
+        while merged:
+            merged = False
+            candidates = np.union1d(Index.query(cur_stop.location_lat, cur_stop.location_lon), 
+                                    stops_by_id.get(cur_stop.get_id(), no_stops))
+            candidates = candidates[candidates > last_index]
+            candidates = candidates[remaining[candidates]]
+            for other_index in candidates:
+                if should_merge(cur_stop, stops[other_index]):
+                    cur_stop = cur_stop.merge_with(stops[other_index])
+                    remaining[other_index] = False
+                    num_remaining -= 1
+                    last_index = other_index
+                    merged = True
+                    break
+        new_stops.append(cur_stop)
+
     RootLogger.log_info(f'Finished merging stops, went from {len(stops)} to {len(new_stops)}.')
     return new_stops
 
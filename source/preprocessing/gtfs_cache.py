@@ -0,0 +1,137 @@
+from typing import Dict, List
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import gtfs_kit as gk
+
+from utility.root_logger import RootLogger
+
+CACHE_FORMAT_VERSION = 1
+CACHED_TABLES = ['routes', 'trips', 'stop_times', 'stops', 'shapes']
+MANIFEST_FILENAME = 'manifest.json'
+
+def hash_file(filepath: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def is_text_column(column: pd.Series) -> bool:
+    if not (pd.api.types.is_string_dtype(column.dtype) or column.dtype == object):
+        return False
+    return all([isinstance(v, str) for v in column.dropna()])
+
+def write_column(column: pd.Series, path_prefix: str) -> Dict:
+    """Save column as .npy files starting with path_prefix, returning how to read it back. 
+    """
+    dtype_name = str(column.dtype)
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf':
+        np.save(path_prefix + '.npy', column.to_numpy())
+        return {'kind': 'array', 'dtype': dtype_name}
+    
+    mask = column.isna().to_numpy()
+    if pd.api.types.is_extension_array_dtype(column.dtype) and pd.api.types.is_numeric_dtype(column.dtype):
+        # Nullable numbers (Int32 ids and sequences), values with a separate mask of missing entries. 
+        values = column.to_numpy(dtype=column.dtype.numpy_dtype, na_value=0)
+        kind = 'masked'
+    elif is_text_column(column):
+        # Fixed width unicode, so the column can be memory mapped back. 
+        values = column.to_numpy(dtype=object, na_value='').astype(str)
+        kind = 'text'
+    else:
+        values = column.to_numpy(dtype=object)
+        kind = 'pickled'
+    np.save(path_prefix + '.npy', values, allow_pickle=(kind == 'pickled'))
+    np.save(path_prefix + '.mask.npy', mask)
+    return {'kind': kind, 'dtype': dtype_name}
+
+def read_column(column_info: Dict, path_prefix: str) -> pd.Series:
+    kind = column_info['kind']
+    values = np.load(path_prefix + '.npy', mmap_mode=None if kind == 'pickled' else 'r', allow_pickle=(kind == 'pickled'))
+    if kind == 'array':
+        return pd.Series(values, dtype=column_info['dtype'])
+    
+    mask = np.load(path_prefix + '.mask.npy')
+    if kind == 'masked':
+        return pd.Series(values).astype(column_info['dtype']).mask(mask)
+    values = values.astype(object)
+    values[mask] = None
+    return pd.Series(values, dtype=column_info['dtype'])
+
+def write_table(df: pd.DataFrame, table_dir: str) -> List[Dict]:
+    os.makedirs(table_dir)
+    columns = []
+    for index, name in enumerate(df.columns):
+        column_info = write_column(df[name], os.path.join(table_dir, str(index)))
+        column_info['name'] = name
+        columns.append(column_info)
+    return columns
+
+def read_table(columns: List[Dict], table_dir: str) -> pd.DataFrame:
+    return pd.DataFrame(dict([(c['name'], read_column(c, os.path.join(table_dir, str(index)))) for index, c in enumerate(columns)]))
+
+class GTFSCache:
+    """Columnar copy of a feed's tables on disk, one directory per zip keyed by the sha256 of the zip. 
+    A cache entry is valid once its manifest is written, entries are built in a temporary directory and renamed into place. 
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def get_entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key: str, dist_units: str) -> gk.Feed or None:
+        manifest_path = os.path.join(self.get_entry_dir(key), MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get('version') != CACHE_FORMAT_VERSION or manifest.get('dist_units') != dist_units:
+            RootLogger.log_info(f'Ignoring outdated GTFS cache entry {key}.')
+            return None
+        
+        tables = {}
+        for table_name, columns in manifest['tables'].items():
+            tables[table_name] = None if columns is None else read_table(columns, os.path.join(self.get_entry_dir(key), table_name))
+        return gk.Feed(dist_units=dist_units, **tables)
+
+    def store(self, key: str, feed: gk.Feed) -> None:
+        entry_dir = self.get_entry_dir(key)
+        temp_dir = f'{entry_dir}.tmp-{os.getpid()}'
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+        
+        manifest = {'version': CACHE_FORMAT_VERSION, 'dist_units': feed.dist_units, 'tables': {}}
+        for table_name in CACHED_TABLES:
+            df = getattr(feed, table_name)
+            manifest['tables'][table_name] = None if df is None else write_table(df, os.path.join(temp_dir, table_name))
+        with open(os.path.join(temp_dir, MANIFEST_FILENAME), 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.replace(temp_dir, entry_dir)
+        RootLogger.log_info(f'Stored GTFS cache entry {key} in {self.cache_dir}.')
+
+def read_feed_cached(filepath: str, dist_units: str, cache_dir: str) -> gk.Feed:
+    """gk.read_feed, but through a columnar cache in cache_dir so a feed is only parsed from csv once. 
+    Only the tables in CACHED_TABLES come back from the cache. 
+    """
+    key = hash_file(filepath)
+    Cache = GTFSCache(cache_dir)
+    feed = Cache.load(key, dist_units)
+    if feed is not None:
+        RootLogger.log_info(f'Loaded {filepath} from GTFS cache entry {key}.')
+        return feed
+    
+    RootLogger.log_info(f'No GTFS cache entry for {filepath}, parsing it.')
+    feed = gk.read_feed(filepath, dist_units=dist_units)
+    os.makedirs(cache_dir, exist_ok=True)
+    Cache.store(key, feed)
+    return feed
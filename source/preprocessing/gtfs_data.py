@@ -1,9 +1,12 @@
-from typing import List
+from typing import List, Dict, Tuple
 import gtfs_kit as gk
+import pandas as pd
 from pathlib import Path
 
 from utility.root_logger import RootLogger
-from preprocessing.data import DataBase
+from preprocessing.data import DataBase, dataframe_records
+from preprocessing.gtfs_cache import read_feed_cached
+from preprocessing.params import GTFS_CACHE_DIR
 from transit_network.routes import GTFSRoute
 
 ROUTE_FILE_HEADERS = ['route_id' ,'route_short_name', 'route_long_name', 'route_type']
@@ -12,12 +15,21 @@ STOP_TIMES_FILE_HEADERS = ['trip_id', 'arrival_time', 'departure_time', 'stop_id
 STOP_FILE_HEADERS = ['stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'parent_station']
 SHAPES_FILE_HEADERS = ['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence']
 
+def build_stop_lookup(stops_df: pd.DataFrame) -> Dict[str, Tuple[Dict, int]]:
+    # stop_id -> (first row with that id, number of rows with that id)
+    counts = stops_df['stop_id'].value_counts()
+    first_rows = stops_df.drop_duplicates(subset='stop_id', keep='first')
+    return dict([(row['stop_id'], (row, counts[row['stop_id']])) for row in dataframe_records(first_rows)])
+
 class GTFSData(DataBase):
 
-    def __init__(self, filepath, city_name):
+    def __init__(self, filepath, city_name, cache_dir: str or None = GTFS_CACHE_DIR):
         DataBase.__init__(self, filepath, city_name)
         path = Path(filepath)
-        self.feed = gk.read_feed(path, dist_units='mi')
+        if cache_dir is None:
+            self.feed = gk.read_feed(path, dist_units='mi')
+        else:
+            self.feed = read_feed_cached(path, dist_units='mi', cache_dir=cache_dir)
 
     def read_data(self):
         return self.feed
@@ -33,8 +45,24 @@ class GTFSData(DataBase):
         trips_df = self.read_data().trips 
         stop_times_df = self.read_data().stop_times
         stops_df = self.read_data().stops
+
+        # Group every table once up front, instead of filtering them for each route, trip and stop. 
+        RootLogger.log_debug(f'Grouping {len(trips_df.index)} trips and {len(stop_times_df.index)} stop times...')
+        trip_records = dataframe_records(trips_df)
+        trips_by_route = trips_df.groupby('route_id', sort=False).indices
+        stop_time_rows = list(zip(stop_times_df['stop_id'].tolist(), stop_times_df['stop_sequence'].tolist()))
+        stop_times_by_trip = stop_times_df.groupby('trip_id', sort=False).indices
+        stop_lookup = build_stop_lookup(stops_df)
+
         for route in routes:
-            route.get_trips_for_route(trips_df, stop_times_df, stops_df)
+            RootLogger.log_debug(f'Getting trips for route {route.id}...')
+            trip_objects = route.match_trips([trip_records[i] for i in trips_by_route.get(route.id, [])])
+            for trip in trip_objects:
+                trip.match_stops([stop_time_rows[i] for i in stop_times_by_trip.get(trip.id, [])], stop_lookup)
+
+            # Currently use heuristic to just take longest trips in each direction and assign them to route. 
+            route.trips += route.get_longest_trips(trip_objects, stop_times_df, stops_df)
+
     @property
     def num_stops(self):
         return len(self.read_data().stops.index)
@@ -1,3 +1,9 @@
 
 ## Determining Transfers
-STOP_TRANSFER_THRESHOLD = 100.0
\ No newline at end of file
+STOP_TRANSFER_THRESHOLD = 100.0
+# Relative slack on the threshold when pre-selecting nearby stops by haversine distance, which is only approximately geodesic. 
+STOP_TRANSFER_MARGIN = 0.01
+
+## GTFS Cache
+# Parsed feeds are cached here, keyed by the hash of their zip. 
+GTFS_CACHE_DIR = '../data/gtfs_cache/'
@@ -1,10 +1,14 @@
-from typing import List 
+from typing import List, Tuple
+import numpy as np
 
 from transit_network.shapes import ShapePoint
-from transit_network.stops import Stop 
+from transit_network.stops import Stop, haversine_distances, sphere_distance
 
 from utility.root_logger import RootLogger
 
+# Bound on the relative difference between haversine and geodesic distances, with some slack. 
+HAVERSINE_ERROR = 0.01
+
 def closest_shape_point_index(cur_stop: Stop, shape_points: List[ShapePoint]) -> int: 
 
     min_index = -1 
@@ -17,25 +21,64 @@ def closest_shape_point_index(cur_stop: Stop, shape_points: List[ShapePoint]) ->
     
     return min_index
 
-def partition_shape_points(shape_points: List[ShapePoint], stops: List[Stop]) -> List[List[ShapePoint]]:
-    partition = []
-    cur_shape_points = [pt for pt in shape_points]
-    num_stops = len(stops)
-    for stop_index, stop in enumerate(stops):
-        if cur_shape_points == []:
-            RootLogger.log_error(f'Ran out of shapes to assign. On stop {stop_index} of {num_stops}.')
-        closest_index = closest_shape_point_index(stop, cur_shape_points)
-        cur_partition = cur_shape_points[:closest_index]
-        cur_shape_points = cur_shape_points[closest_index:]
-        partition_len = len(cur_partition)
-        
-        RootLogger.log_debug(f'Assigning {partition_len} shapes points to stop {stop.id}, {len(cur_shape_points)} left to assign.')
-        partition.append(cur_partition)
-    
-    if cur_shape_points != []:
-        RootLogger.log_warning(f'Failed to assign all shape points, {len(cur_shape_points)} remaining.')
-        partition[-1] += cur_shape_points
+def closest_shape_point_index_in(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> int:
+    """Same result as closest_shape_point_index for a stop at (lat, lon) over the points given as arrays. 
+
+    Haversine distances pick out the few points that can be closest, only those are measured with sphere_distance. 
+    """
+    if len(lats) == 0:
+        return -1
+    approx_distances = haversine_distances(lat, lon, lats, lons)
+    # Each haversine distance is within HAVERSINE_ERROR of the true one, so nothing outside this bound can be the minimum. 
+    bound = approx_distances.min() * (1.0 + HAVERSINE_ERROR) / (1.0 - HAVERSINE_ERROR)
+    candidates = np.flatnonzero(approx_distances <= bound)
+    if len(candidates) == 1:
+        return int(candidates[0])
+
+    # Ties go to the earliest point, as in closest_shape_point_index. 
+    min_index = -1 
+    min_distance = float('inf')
+    for index in candidates:
+        cur_dist = sphere_distance([lat, lon], [lats[index], lons[index]])
+        if cur_dist < min_distance:
+            min_index = int(index)
+            min_distance = cur_dist 
+    return min_index
 
+def partition_offsets(lats: np.ndarray, lons: np.ndarray, stop_lats: List[float], stop_lons: List[float]) -> List[int]:
+    """Where each stop's partition of the shape starts, stop i gets points offsets[i]:offsets[i+1] and the last stop 
+    also gets whatever is left after offsets[-1]. 
+    """
+    # Stops only ever claim points from the front of what is left, so the remainder is [start:]. 
+    start = 0
+    offsets = [start]
+    num_points = len(lats)
+    num_stops = len(stop_lats)
+    for stop_index, (stop_lat, stop_lon) in enumerate(zip(stop_lats, stop_lons)):
+        if start == num_points:
+            RootLogger.log_error('Ran out of shapes to assign. On stop %d of %d.', stop_index, num_stops)
+        else:
+            start += closest_shape_point_index_in(stop_lat, stop_lon, lats[start:], lons[start:])
+        if RootLogger.debug_enabled:
+            RootLogger.log_debug('Assigning %d shapes points to stop %d, %d left to assign.', start - offsets[-1], stop_index, num_points - start)
+        offsets.append(start)
+    
+    if start != num_points:
+        RootLogger.log_warning(f'Failed to assign all shape points, {num_points - start} remaining.')
+    return offsets
+
+def partition_trip_shapes(tasks: List[Tuple[np.ndarray, np.ndarray, List[float], List[float]]]) -> List[List[int]]:
+    # partition_offsets over a batch of (lats, lons, stop_lats, stop_lons), for running in a worker process. 
+    return [partition_offsets(*task) for task in tasks]
+
+def partition_shape_points(shape_points: List[ShapePoint], stops: List[Stop], offsets: List[int] or None = None) -> List[List[ShapePoint]]:
+    if offsets is None:
+        lats = np.array([pt.lat for pt in shape_points], dtype=np.float64)
+        lons = np.array([pt.lon for pt in shape_points], dtype=np.float64)
+        offsets = partition_offsets(lats, lons, [s.location_lat for s in stops], [s.location_lon for s in stops])
+
+    partition = [shape_points[offsets[i]:offsets[i+1]] for i in range(len(stops))]
+    partition[-1] += shape_points[offsets[-1]:]
     return partition
 
 
@@ -0,0 +1,41 @@
+from typing import List, Dict, Tuple
+from math import cos, radians, floor
+import numpy as np
+
+from transit_network.stops import Stop, haversine_distances
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+class StopGridIndex:
+    """Uniform lat/lon grid over a fixed list of stops, for finding every stop within radius meters of a point. 
+    Cells are at least radius wide everywhere in the data, so a query only visits the 3x3 block around the point. 
+    """
+
+    def __init__(self, stops: List[Stop], radius: float):
+        self.radius = radius
+        self.lats = np.array([s.location_lat for s in stops], dtype=np.float64)
+        self.lons = np.array([s.location_lon for s in stops], dtype=np.float64)
+
+        # A degree of longitude is shortest furthest from the equator, size cells for there. 
+        max_abs_lat = float(np.max(np.abs(self.lats))) if len(stops) > 0 else 0.0
+        self.cell_lat = radius / METERS_PER_DEGREE_LAT
+        self.cell_lon = radius / (METERS_PER_DEGREE_LAT * max(cos(radians(min(max_abs_lat, 89.0))), 1e-6))
+
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for index, (lat, lon) in enumerate(zip(self.lats, self.lons)):
+            self.cells.setdefault(self.get_cell(lat, lon), []).append(index)
+        self.cells = {cell: np.array(indices, dtype=np.int64) for cell, indices in self.cells.items()}
+    
+    def get_cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (floor(lat / self.cell_lat), floor(lon / self.cell_lon))
+    
+    def query(self, lat: float, lon: float) -> np.ndarray:
+        """Indices of stops within radius meters of (lat, lon) by haversine distance, in increasing order. 
+        """
+        row, col = self.get_cell(lat, lon)
+        blocks = [self.cells[(r, c)] for r in range(row - 1, row + 2) for c in range(col - 1, col + 2) if (r, c) in self.cells]
+        if blocks == []:
+            return np.array([], dtype=np.int64)
+        candidates = np.concatenate(blocks)
+        distances = haversine_distances(lat, lon, self.lats[candidates], self.lons[candidates])
+        return np.sort(candidates[distances <= self.radius])
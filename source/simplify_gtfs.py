@@ -3,7 +3,9 @@ from preprocessing.gtfs_data import GTFSData
 from transit_network.transit_network import create_network_from_GTFSRoutes, TransitNetwork
 from utility.args_parser import simplify_network_args
 from utility.pickle import pickle_object
+from transit_network.network_store import write_network_store, STORE_EXTENSION
 from utility.root_logger import RootLogger
+from preprocessing.params import GTFS_CACHE_DIR
 
 
 def generate_compression_metrics(Gtfs: GTFSData, SimplifiedNetwork: TransitNetwork) -> str:
@@ -19,11 +21,14 @@ def generate_compression_metrics(Gtfs: GTFSData, SimplifiedNetwork: TransitNetwo
              Reduced number of trips from {original_num_trips} to {new_num_trips}, \n \
              Reduced number of stops from {original_num_stops} to {new_num_stops}. '
 
-def create_simplified_gtfs_SFMTA(ridership_source: str, gtfs_source: str, export_file='initial_network') -> str:
+def create_simplified_gtfs_SFMTA(ridership_source: str, gtfs_source: str, export_file='initial_network', use_cache: bool = True, 
+                                 num_workers: int = 1) -> str:
     """Full end-to-end generation of the network from ridership and GTFS data. 
 
     Args:
         export_file (str, optional):  Defaults to 'initial_network'.
+        use_cache (bool, optional): load the parsed feed from the GTFS cache when possible. Defaults to True.
+        num_workers (int, optional): number of processes used to partition trip shapes. Defaults to 1.
 
     Returns:
         str: compression metrics report
@@ -33,18 +38,20 @@ def create_simplified_gtfs_SFMTA(ridership_source: str, gtfs_source: str, export
     RD = RidershipData(RRD)
     #RD.export_data('../SFMTA_ridership.csv')
 
-    SF_GTFS = GTFSData(gtfs_source, 'SF')
+    SF_GTFS = GTFSData(gtfs_source, 'SF', cache_dir=GTFS_CACHE_DIR if use_cache else None)
 
     matched_routes = RD.get_matched_ids_from_gtfs(SF_GTFS)
     SF_GTFS.set_trips_for_all_routes(matched_routes)
 
-    Network = create_network_from_GTFSRoutes(matched_routes, SF_GTFS.read_data().shapes)
+    Network = create_network_from_GTFSRoutes(matched_routes, SF_GTFS.read_data().shapes, num_workers=num_workers)
     compression_metrics_str = generate_compression_metrics(SF_GTFS, Network)
     pickle_object(Network, export_file)
+    write_network_store([Network], export_file + STORE_EXTENSION)
     Network.write_to_gtfs(export_file)
     return compression_metrics_str
 
 if __name__ == '__main__':
     args = simplify_network_args()
     RootLogger.initialize('.', args.verbosity, args.file_verbosity)
-    create_simplified_gtfs_SFMTA(args.ridership_source, args.gtfs_source, args.name)
+    create_simplified_gtfs_SFMTA(args.ridership_source, args.gtfs_source, args.name, use_cache=not args.no_cache, 
+                                 num_workers=args.num_workers)
@@ -0,0 +1,248 @@
+from typing import List, Dict
+import numpy as np
+
+from transit_network.transit_network import TransitNetwork
+from transit_network.routes import SimpleRoute
+from transit_network.trips import SimpleTrip
+from transit_network.stops import Stop
+from transit_network.shapes import ShapePoint
+from utility.root_logger import RootLogger
+
+INDEX_DTYPE = np.int32
+
+def to_offsets(lengths: List[int]) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+class CompactNetwork:
+    """Array-backed, integer indexed representation of a TransitNetwork.
+
+    Stops live in one table of NumPy columns, trips are CSR style (trip_offsets into trip_stop_indices),
+    and routes are ranges of consecutive trips (route_offsets into the trip arrays).
+    Shape points are stored the same way, one partition per stop position of every trip.
+    """
+
+    def __init__(self, id: str,
+                       stop_ids: List[str], stop_names: List[str], stop_parent_ids: List[str or None],
+                       stop_lat: np.ndarray, stop_lon: np.ndarray, stop_ridership: np.ndarray,
+                       trip_ids: List[str], trip_route_ids: List[str], trip_messages: List[str], trip_directions: np.ndarray,
+                       trip_offsets: np.ndarray, trip_stop_indices: np.ndarray,
+                       route_ids: List[str], route_names: List[str], route_offsets: np.ndarray,
+                       trip_partition_offsets: np.ndarray, partition_offsets: np.ndarray,
+                       shape_lat: np.ndarray, shape_lon: np.ndarray, shape_sequence: np.ndarray,
+                       shape_id_indices: np.ndarray, shape_id_table: List[str],
+                       shared_stops: bool):
+        self.id = id
+
+        # Stop table
+        self.stop_ids = stop_ids
+        self.stop_names = stop_names
+        self.stop_parent_ids = stop_parent_ids
+        self.stop_lat = stop_lat
+        self.stop_lon = stop_lon
+        self.stop_ridership = stop_ridership
+        self.stop_keys = dict([(stop_id, i) for i, stop_id in enumerate(stop_ids)])
+
+        # Trips, trip t visits stops trip_stop_indices[trip_offsets[t]:trip_offsets[t+1]]
+        self.trip_ids = trip_ids
+        self.trip_route_ids = trip_route_ids
+        self.trip_messages = trip_messages
+        self.trip_directions = trip_directions
+        self.trip_offsets = trip_offsets
+        self.trip_stop_indices = trip_stop_indices
+
+        # Routes, route r owns trips route_offsets[r]:route_offsets[r+1]
+        self.route_ids = route_ids
+        self.route_names = route_names
+        self.route_offsets = route_offsets
+        self.route_keys = dict([(route_id, i) for i, route_id in enumerate(route_ids)])
+
+        # Shapes, trip t owns partitions trip_partition_offsets[t]:trip_partition_offsets[t+1],
+        # partition p owns points partition_offsets[p]:partition_offsets[p+1]
+        self.trip_partition_offsets = trip_partition_offsets
+        self.partition_offsets = partition_offsets
+        self.shape_lat = shape_lat
+        self.shape_lon = shape_lon
+        self.shape_sequence = shape_sequence
+        self.shape_id_indices = shape_id_indices
+        self.shape_id_table = shape_id_table
+
+        # Whether trips of the source network shared one Stop object per stop id, which decides how transfers are rebuilt.
+        self.shared_stops = shared_stops
+
+    @property
+    def num_stops(self) -> int:
+        return len(self.stop_ids)
+
+    @property
+    def num_trips(self) -> int:
+        return len(self.trip_ids)
+
+    @property
+    def num_routes(self) -> int:
+        return len(self.route_ids)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.stop_lat, self.stop_lon, self.stop_ridership, self.trip_directions, self.trip_offsets,
+                  self.trip_stop_indices, self.route_offsets, self.trip_partition_offsets, self.partition_offsets,
+                  self.shape_lat, self.shape_lon, self.shape_sequence, self.shape_id_indices]
+        return sum([a.nbytes for a in arrays])
+
+    def has_stop(self, stop_id: str) -> bool:
+        return stop_id in self.stop_keys
+
+    def get_stop_index(self, stop_id: str) -> int:
+        return self.stop_keys[stop_id]
+
+    def get_trip_stops(self, trip_index: int) -> np.ndarray:
+        return self.trip_stop_indices[self.trip_offsets[trip_index]:self.trip_offsets[trip_index+1]]
+
+    def get_route_trips(self, route_index: int) -> range:
+        return range(self.route_offsets[route_index], self.route_offsets[route_index+1])
+
+    def lookup_route_index(self, route_id: str) -> int or None:
+        if route_id not in self.route_keys:
+            RootLogger.log_error(f'Unable to find route with id {route_id} in network {self.id}.')
+            return None
+        return self.route_keys[route_id]
+
+    def get_stop_transfers(self, stop_id: str) -> List[str]:
+        """Route ids of every trip stopping at stop_id, in trip order.
+        """
+        stop_index = self.get_stop_index(stop_id)
+        trip_lengths = np.diff(self.trip_offsets)
+        trip_of_position = np.repeat(np.arange(self.num_trips), trip_lengths)
+        matching_trips = np.unique(trip_of_position[self.trip_stop_indices == stop_index])
+        route_ids = []
+        for trip_index in matching_trips:
+            route_id = self.trip_route_ids[trip_index]
+            if route_id not in route_ids:
+                route_ids.append(route_id)
+        return route_ids
+
+    def to_transit_network(self) -> TransitNetwork:
+        """Rebuild the object representation. Transfer points and trip sequences are recomputed from the trips.
+        """
+        shared_stop_objs = [self.build_stop(i) for i in range(self.num_stops)] if self.shared_stops else None
+
+        routes = []
+        for route_index, route_id in enumerate(self.route_ids):
+            route = SimpleRoute(route_id, self.route_names[route_index])
+            trips = []
+            for trip_index in self.get_route_trips(route_index):
+                stop_indices = self.get_trip_stops(trip_index)
+                if shared_stop_objs is not None:
+                    stops = [shared_stop_objs[i] for i in stop_indices]
+                else:
+                    stops = [self.build_stop(i) for i in stop_indices]
+
+                new_trip = SimpleTrip(trip_id=self.trip_ids[trip_index],
+                                      route_id=self.trip_route_ids[trip_index],
+                                      message=self.trip_messages[trip_index],
+                                      direction=int(self.trip_directions[trip_index]),
+                                      shape_points=self.build_shape_partitions(trip_index),
+                                      stops=stops)
+                trips.append(new_trip)
+            route.add_trips(trips)
+            routes.append(route)
+
+        return TransitNetwork(routes, self.id)
+
+    def build_stop(self, stop_index: int) -> Stop:
+        new_stop = Stop(id=self.stop_ids[stop_index],
+                        name=self.stop_names[stop_index],
+                        location=(float(self.stop_lat[stop_index]), float(self.stop_lon[stop_index])),
+                        parent_id=self.stop_parent_ids[stop_index],
+                        routes=[])
+        new_stop.ridership = float(self.stop_ridership[stop_index])
+        return new_stop
+
+    def build_shape_partitions(self, trip_index: int) -> List[List[ShapePoint]]:
+        partitions = []
+        for p in range(self.trip_partition_offsets[trip_index], self.trip_partition_offsets[trip_index+1]):
+            points = []
+            for i in range(self.partition_offsets[p], self.partition_offsets[p+1]):
+                points.append(ShapePoint(shape_id=self.shape_id_table[self.shape_id_indices[i]],
+                                         lat=float(self.shape_lat[i]),
+                                         lon=float(self.shape_lon[i]),
+                                         sequence_num=int(self.shape_sequence[i])))
+            partitions.append(points)
+        return partitions
+
+    def __str__(self):
+        return f'(CompactNetwork[routes: {self.num_routes}, trips: {self.num_trips}, stops: {self.num_stops}, bytes: {self.nbytes}])'
+
+def compact_network(network: TransitNetwork) -> CompactNetwork:
+    """Convert a TransitNetwork into its array-backed form.
+
+    Args:
+        network (TransitNetwork): source network, left unmodified.
+
+    Returns:
+        CompactNetwork: compact copy of network.
+    """
+    stop_keys: Dict[str, int] = {}
+    stop_objs: List[Stop] = []
+    for stop in network.stops:
+        if stop.id not in stop_keys:
+            stop_keys[stop.id] = len(stop_objs)
+            stop_objs.append(stop)
+
+    route_ids = []
+    route_names = []
+    route_lengths = []
+    trips: List[SimpleTrip] = []
+    for route in network.routes:
+        route_ids.append(route.id)
+        route_names.append(route.name)
+        route_lengths.append(len(route.trips))
+        trips += route.trips
+
+    trip_stop_indices = [stop_keys[s.id] for t in trips for s in t.stops]
+
+    # Count distinct objects per stop id, the initial network shares them across trips while bred networks copy them.
+    distinct_objs = set([id(s) for t in trips for s in t.stops])
+    shared_stops = len(distinct_objs) == len(stop_keys)
+
+    shape_id_keys: Dict[str, int] = {}
+    partition_lengths = []
+    trip_partition_lengths = []
+    shape_lat, shape_lon, shape_sequence, shape_id_indices = [], [], [], []
+    for trip in trips:
+        trip_partition_lengths.append(len(trip.shape_points))
+        for partition in trip.shape_points:
+            partition_lengths.append(len(partition))
+            for point in partition:
+                if point.shape_id not in shape_id_keys:
+                    shape_id_keys[point.shape_id] = len(shape_id_keys)
+                shape_id_indices.append(shape_id_keys[point.shape_id])
+                shape_lat.append(point.lat)
+                shape_lon.append(point.lon)
+                shape_sequence.append(point.sequence_num)
+
+    return CompactNetwork(id=network.id,
+                          stop_ids=[s.id for s in stop_objs],
+                          stop_names=[s.name for s in stop_objs],
+                          stop_parent_ids=[s.parent_id for s in stop_objs],
+                          stop_lat=np.array([s.location_lat for s in stop_objs], dtype=np.float64),
+                          stop_lon=np.array([s.location_lon for s in stop_objs], dtype=np.float64),
+                          stop_ridership=np.array([s.ridership for s in stop_objs], dtype=np.float64),
+                          trip_ids=[t.id for t in trips],
+                          trip_route_ids=[t.route_id for t in trips],
+                          trip_messages=[t.message for t in trips],
+                          trip_directions=np.array([t.direction for t in trips], dtype=np.int8),
+                          trip_offsets=to_offsets([len(t.stops) for t in trips]),
+                          trip_stop_indices=np.array(trip_stop_indices, dtype=INDEX_DTYPE),
+                          route_ids=route_ids,
+                          route_names=route_names,
+                          route_offsets=to_offsets(route_lengths),
+                          trip_partition_offsets=to_offsets(trip_partition_lengths),
+                          partition_offsets=to_offsets(partition_lengths),
+                          shape_lat=np.array(shape_lat, dtype=np.float64),
+                          shape_lon=np.array(shape_lon, dtype=np.float64),
+                          shape_sequence=np.array(shape_sequence, dtype=np.int32),
+                          shape_id_indices=np.array(shape_id_indices, dtype=INDEX_DTYPE),
+                          shape_id_table=list(shape_id_keys.keys()),
+                          shared_stops=shared_stops)
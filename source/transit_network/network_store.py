@@ -0,0 +1,314 @@
+from typing import List, Dict, Tuple
+from pathlib import Path
+import json
+import os
+import numpy as np
+
+from transit_network.transit_network import TransitNetwork
+from transit_network.compact_network import CompactNetwork, to_offsets, INDEX_DTYPE
+from utility.pickle import read_object_from_file
+from utility.root_logger import RootLogger
+
+STORE_MAGIC = b'TNSTORE\x00'
+STORE_VERSION = 1
+STORE_EXTENSION = '.tns'
+# Arrays start on multiples of this, so every dtype can be viewed in place.
+STORE_ALIGNMENT = 16
+# Scores a TransitNetwork computes once in __init__. Stops' transfers and trip sequences can change after that, so 
+# recomputing them on load could give different values, the stored ones are restored instead. 
+STORED_SCORES = ['ridership', 'coverage', 'ridership_density_score']
+
+def align(position: int) -> int:
+    return -(-position // STORE_ALIGNMENT) * STORE_ALIGNMENT
+
+def json_default(value: object) -> object:
+    # Metrics and ids often come out of NumPy as scalars, which json can't write.
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def encode_strings(values: List[str or None]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Strings are stored as one utf-8 blob with offsets, None is marked in a separate mask.
+    encoded = [b'' if v is None else str(v).encode('utf-8') for v in values]
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, to_offsets([len(e) for e in encoded]), np.array([v is None for v in values], dtype=np.uint8)
+
+def gather_ranges(offsets: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate the CSR ranges offsets[i]:offsets[i+1] of every i in indices.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: offsets of the ranges in the result, positions making up the result.
+    """
+    starts = offsets[indices]
+    lengths = offsets[indices + 1] - starts
+    new_offsets = to_offsets(lengths)
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return new_offsets, positions
+
+class StringTable:
+    """Read only view of strings written by encode_strings, decoded on access.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, nulls: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def __getitem__(self, index: int) -> str or None:
+        if self.nulls[index]:
+            return None
+        return self.blob[self.offsets[index]:self.offsets[index+1]].tobytes().decode('utf-8')
+
+    def take(self, indices: np.ndarray) -> List[str or None]:
+        return [self[i] for i in indices]
+
+class StoreBuilder:
+    """Interns the stops, shape partitions and trips of many networks into shared tables.
+    Objects are matched by content, the id() memos only skip recomputing keys for objects networks share.
+    """
+
+    def __init__(self):
+        self.stop_keys: Dict[tuple, int] = {}
+        self.stop_memo: Dict[int, int] = {}
+        self.stops = []
+
+        self.partition_keys: Dict[tuple, int] = {}
+        self.partition_memo: Dict[int, int] = {}
+        self.partitions = []
+
+        self.trip_keys: Dict[tuple, int] = {}
+        self.trip_memo: Dict[int, int] = {}
+        self.trips = []
+
+        self.route_ids, self.route_names, self.route_trips = [], [], []
+        self.network_num_routes = []
+
+    def intern(self, obj: object, memo: Dict[int, int], keys: Dict[tuple, int], rows: List, make_key) -> int:
+        obj_id = id(obj)
+        if obj_id not in memo:
+            key = make_key(obj)
+            if key not in keys:
+                keys[key] = len(rows)
+                rows.append(key)
+            memo[obj_id] = keys[key]
+        return memo[obj_id]
+
+    def stop_index(self, stop) -> int:
+        return self.intern(stop, self.stop_memo, self.stop_keys, self.stops,
+                           lambda s: (s.id, s.name, float(s.location_lat), float(s.location_lon), s.parent_id, float(s.ridership)))
+
+    def partition_index(self, partition) -> int:
+        return self.intern(partition, self.partition_memo, self.partition_keys, self.partitions,
+                           lambda p: tuple([(pt.shape_id, float(pt.lat), float(pt.lon), int(pt.sequence_num)) for pt in p]))
+
+    def trip_index(self, trip) -> int:
+        return self.intern(trip, self.trip_memo, self.trip_keys, self.trips,
+                           lambda t: (t.id, t.route_id, t.message, int(t.direction),
+                                      tuple([self.stop_index(s) for s in t.stops]),
+                                      tuple([self.partition_index(p) for p in t.shape_points])))
+
+    def add_network(self, network: TransitNetwork) -> None:
+        self.network_num_routes.append(len(network.routes))
+        for route in network.routes:
+            self.route_ids.append(route.id)
+            self.route_names.append(route.name)
+            self.route_trips.append([self.trip_index(t) for t in route.trips])
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        points = [pt for partition in self.partitions for pt in partition]
+        shape_id_keys: Dict[str, int] = {}
+        for shape_id, _, _, _ in points:
+            shape_id_keys.setdefault(shape_id, len(shape_id_keys))
+
+        arrays = {
+            'stop_lat': np.array([s[2] for s in self.stops], dtype=np.float64),
+            'stop_lon': np.array([s[3] for s in self.stops], dtype=np.float64),
+            'stop_ridership': np.array([s[5] for s in self.stops], dtype=np.float64),
+            'partition_offsets': to_offsets([len(p) for p in self.partitions]),
+            'shape_lat': np.array([pt[1] for pt in points], dtype=np.float64),
+            'shape_lon': np.array([pt[2] for pt in points], dtype=np.float64),
+            'shape_sequence': np.array([pt[3] for pt in points], dtype=np.int32),
+            'shape_id_indices': np.array([shape_id_keys[pt[0]] for pt in points], dtype=INDEX_DTYPE),
+            'trip_directions': np.array([t[3] for t in self.trips], dtype=np.int8),
+            'trip_offsets': to_offsets([len(t[4]) for t in self.trips]),
+            'trip_stop_indices': np.array([i for t in self.trips for i in t[4]], dtype=INDEX_DTYPE),
+            'trip_partition_offsets': to_offsets([len(t[5]) for t in self.trips]),
+            'trip_partition_indices': np.array([i for t in self.trips for i in t[5]], dtype=INDEX_DTYPE),
+            'route_trip_offsets': to_offsets([len(r) for r in self.route_trips]),
+            'route_trip_indices': np.array([i for r in self.route_trips for i in r], dtype=INDEX_DTYPE),
+            'network_route_offsets': to_offsets(self.network_num_routes),
+        }
+        strings = {
+            'stop_ids': [s[0] for s in self.stops],
+            'stop_names': [s[1] for s in self.stops],
+            'stop_parent_ids': [s[4] for s in self.stops],
+            'shape_ids': list(shape_id_keys.keys()),
+            'trip_ids': [t[0] for t in self.trips],
+            'trip_route_ids': [t[1] for t in self.trips],
+            'trip_messages': [t[2] for t in self.trips],
+            'route_ids': self.route_ids,
+            'route_names': self.route_names,
+        }
+        for name, values in strings.items():
+            arrays[f'{name}_blob'], arrays[f'{name}_offsets'], arrays[f'{name}_nulls'] = encode_strings(values)
+        return arrays
+
+def write_network_store(networks: List[TransitNetwork], store_path: str,
+                        network_metadata: List[Dict] or None = None, metadata: Dict or None = None) -> str:
+    """Write networks to a versioned binary file: a JSON header followed by the raw arrays of their interned tables.
+    Stops, trips and shape partitions shared between networks are written once.
+
+    Args:
+        networks (List[TransitNetwork]): networks to write.
+        store_path (str): path of the file.
+        network_metadata (List[Dict] or None, optional): JSON serializable values kept alongside each network. Defaults to None.
+        metadata (Dict or None, optional): JSON serializable values kept for the whole file. Defaults to None.
+
+    Returns:
+        str: store_path
+    """
+    if network_metadata is None:
+        network_metadata = [{} for _ in networks]
+
+    builder = StoreBuilder()
+    for network in networks:
+        builder.add_network(network)
+    arrays = builder.arrays()
+
+    array_entries = {}
+    position = 0
+    for name, array in arrays.items():
+        position = align(position)
+        array_entries[name] = [array.dtype.str, int(array.size), position]
+        position += array.nbytes
+
+    header = {
+        'version': STORE_VERSION,
+        'arrays': array_entries,
+        'networks': [{'id': network.id,
+                      'shared_stops': len(set([id(s) for t in network.trips for s in t.stops])) == len(network.stops),
+                      'scores': dict([(name, getattr(network, name)) for name in STORED_SCORES]),
+                      'metadata': network_metadata[index]} for index, network in enumerate(networks)],
+        'metadata': {} if metadata is None else metadata,
+    }
+    header_bytes = json.dumps(header, default=json_default).encode('utf-8')
+    data_start = align(len(STORE_MAGIC) + 8 + len(header_bytes))
+
+    # Write next to the old file and swap, as checkpoints do.
+    temp_path = store_path + '.tmp'
+    with open(temp_path, 'wb') as output:
+        output.write(STORE_MAGIC)
+        output.write(np.uint64(len(header_bytes)).tobytes())
+        output.write(header_bytes)
+        for name, array in arrays.items():
+            output.write(b'\x00' * (data_start + array_entries[name][2] - output.tell()))
+            output.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temp_path, store_path)
+    RootLogger.log_info(f'Wrote {len(networks)} networks with {len(builder.trips)} distinct trips to {store_path}.')
+    return store_path
+
+def read_store_header(store_path: str) -> Dict:
+    """Read only the JSON header of a store, without touching its arrays.
+    """
+    with open(store_path, 'rb') as input_file:
+        magic = input_file.read(len(STORE_MAGIC))
+        if magic != STORE_MAGIC:
+            error_msg = f'{store_path} is not a network store.'
+            RootLogger.log_error(error_msg)
+            raise ValueError(error_msg)
+        header_length = int(np.frombuffer(input_file.read(8), dtype=np.uint64)[0])
+        header = json.loads(input_file.read(header_length).decode('utf-8'))
+    if header.get('version') != STORE_VERSION:
+        error_msg = f'Network store {store_path} has version {header.get("version")}, expected {STORE_VERSION}.'
+        RootLogger.log_error(error_msg)
+        raise ValueError(error_msg)
+    header['data_start'] = align(len(STORE_MAGIC) + 8 + header_length)
+    return header
+
+class NetworkStore:
+    """Memory-mapped reader of a file written by write_network_store.
+    Only the header is parsed on open, a network's rows are read from the file when it is materialized.
+    """
+
+    def __init__(self, store_path: str, header: Dict or None = None):
+        self.path = store_path
+        if header is None:
+            header = read_store_header(store_path)
+        self.networks = header['networks']
+        self.metadata = header['metadata']
+
+        buffer = np.memmap(store_path, dtype=np.uint8, mode='r')
+        self.arrays = {}
+        for name, (dtype, count, offset) in header['arrays'].items():
+            self.arrays[name] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=header['data_start'] + offset)
+
+    @property
+    def num_networks(self) -> int:
+        return len(self.networks)
+
+    @property
+    def network_ids(self) -> List[str]:
+        return [n['id'] for n in self.networks]
+
+    def get_network_metadata(self, index: int) -> Dict:
+        return self.networks[index]['metadata']
+
+    def strings(self, name: str) -> StringTable:
+        return StringTable(self.arrays[f'{name}_blob'], self.arrays[f'{name}_offsets'], self.arrays[f'{name}_nulls'])
+
+    def get_compact_network(self, index: int) -> CompactNetwork:
+        """Gather network index out of the shared tables into its own CompactNetwork.
+        """
+        a = self.arrays
+        routes = np.arange(a['network_route_offsets'][index], a['network_route_offsets'][index+1])
+        route_offsets, trip_positions = gather_ranges(a['route_trip_offsets'], routes)
+        trips = a['route_trip_indices'][trip_positions].astype(np.int64)
+
+        trip_offsets, stop_positions = gather_ranges(a['trip_offsets'], trips)
+        stops, trip_stop_indices = np.unique(a['trip_stop_indices'][stop_positions], return_inverse=True)
+
+        trip_partition_offsets, partition_positions = gather_ranges(a['trip_partition_offsets'], trips)
+        partitions = a['trip_partition_indices'][partition_positions].astype(np.int64)
+        partition_offsets, point_positions = gather_ranges(a['partition_offsets'], partitions)
+        shape_ids, shape_id_indices = np.unique(a['shape_id_indices'][point_positions], return_inverse=True)
+
+        return CompactNetwork(id=self.networks[index]['id'],
+                              stop_ids=self.strings('stop_ids').take(stops),
+                              stop_names=self.strings('stop_names').take(stops),
+                              stop_parent_ids=self.strings('stop_parent_ids').take(stops),
+                              stop_lat=a['stop_lat'][stops],
+                              stop_lon=a['stop_lon'][stops],
+                              stop_ridership=a['stop_ridership'][stops],
+                              trip_ids=self.strings('trip_ids').take(trips),
+                              trip_route_ids=self.strings('trip_route_ids').take(trips),
+                              trip_messages=self.strings('trip_messages').take(trips),
+                              trip_directions=a['trip_directions'][trips],
+                              trip_offsets=trip_offsets,
+                              trip_stop_indices=trip_stop_indices.astype(INDEX_DTYPE),
+                              route_ids=self.strings('route_ids').take(routes),
+                              route_names=self.strings('route_names').take(routes),
+                              route_offsets=route_offsets,
+                              trip_partition_offsets=trip_partition_offsets,
+                              partition_offsets=partition_offsets,
+                              shape_lat=a['shape_lat'][point_positions],
+                              shape_lon=a['shape_lon'][point_positions],
+                              shape_sequence=a['shape_sequence'][point_positions],
+                              shape_id_indices=shape_id_indices.astype(INDEX_DTYPE),
+                              shape_id_table=self.strings('shape_ids').take(shape_ids),
+                              shared_stops=self.networks[index]['shared_stops'])
+
+    def get_network(self, index: int) -> TransitNetwork:
+        network = self.get_compact_network(index).to_transit_network()
+        for name, value in self.networks[index]['scores'].items():
+            setattr(network, name, value)
+        return network
+
+def read_network_from_file(filename: str) -> TransitNetwork:
+    """Read a single network, from a network store if it has the store extension and from a pickle otherwise.
+    """
+    if Path(filename).suffix == STORE_EXTENSION:
+        return NetworkStore(filename).get_network(0)
+    return read_object_from_file(filename)
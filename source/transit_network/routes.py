@@ -1,8 +1,9 @@
-from typing import List
+from typing import List, Dict
 import pandas as pd 
 
 from transit_network.trips import GTFSTrip, SimpleTrip
 from transit_network.stops import Stop 
+from preprocessing.data import dataframe_records
 
 from utility.root_logger import RootLogger
 
@@ -20,6 +21,11 @@ class BaseRoute:
             for stop in trip.stops:
                 stop.add_transfer_routes([self.id])
     
+    @property
+    def trip_signature(self) -> str:
+        # Trip ids determine trip contents, so this identifies the route's contents across networks. 
+        return f'{self.id}|{"|".join([t.id for t in self.trips])}'
+
     def display_trips(self):
         return ''.join([f'{t}\n' for t in self.trips])
     
@@ -49,11 +55,20 @@ class GTFSRoute(BaseRoute):
             stops_df (pd.DataFrame): source stop df, (GTFS format)
         """
 
-        RootLogger.log_debug(f'Getting trips for route {self.id}...')
+        RootLogger.log_debug('Getting trips for route %s...', self.id)
         trip_id_for_route= trips_df.loc[(trips_df['route_id'] == self.id)]
-            
+        trip_objects = self.match_trips(dataframe_records(trip_id_for_route))
+
+        # Currently use heuristic to just take longest trips in each direction and assign them to route. 
+        longest_trips = self.get_longest_trips(trip_objects, stop_times_df, stops_df)
+
+        self.trips += longest_trips
+    
+    def match_trips(self, trip_rows: List[Dict]) -> List[GTFSTrip]:
+        """Build a trip for each row of this route's trips (GTFS format) with a shape_id we haven't seen yet. 
+        """
         trip_objects = []
-        for index, row in trip_id_for_route.iterrows():
+        for row in trip_rows:
             shape_id = row['shape_id']
             direction_id = row['direction_id']
 
@@ -65,18 +80,14 @@ class GTFSRoute(BaseRoute):
                                 direction= direction_id)
                 trip_objects.append(new_trip)
                 self.shapes_covered[shape_id] = True 
-                RootLogger.log_debug(f'Matched shape_id {shape_id} with direction {direction_id} to route {self.id}')
+                RootLogger.log_debug('Matched shape_id %s with direction %s to route %s', shape_id, direction_id, self.id)
 
 
         if trip_objects == []:
             RootLogger.log_warning(f'No trips found for id {self.id}')
         else:
             RootLogger.log_info(f'Successfully matched {len(trip_objects)} unique trips to route {self.id}')
-
-        # Currently use heuristic to just take longest trips in each direction and assign them to route. 
-        longest_trips = self.get_longest_trips(trip_objects, stop_times_df, stops_df)
-
-        self.trips += longest_trips
+        return trip_objects
     
     def get_all_stops(self) -> List[Stop]:
         all_stops = []
@@ -99,7 +110,7 @@ class GTFSRoute(BaseRoute):
             (direction_0_max, direction_1_max): where direction_0_max is longest trip in direction 0 
             and direction_1_max is the longest trip is direction 1
         """
-        RootLogger.log_debug(f'Computing longest trips for route {self.id}...')
+        RootLogger.log_debug('Computing longest trips for route %s...', self.id)
 
         max_len = [0, 0]
         max_trips = [None, None]
@@ -1,5 +1,6 @@
 import pandas as pd 
-from typing import List
+import numpy as np
+from typing import List, Dict
 
 class Coords:
 
@@ -32,4 +33,42 @@ def get_shapes_from_df(df: pd.DataFrame) -> List[ShapePoint]:
         
         shapes.append(new_point)
     
-    return shapes
\ No newline at end of file
+    return shapes
+
+class ShapeArrays:
+    """Points of a single shape, sorted by sequence number and kept as arrays. 
+    ShapePoint objects are only built if to_shape_points is called. 
+    """
+
+    def __init__(self, shape_id: str, lats: np.ndarray, lons: np.ndarray, sequence_nums: np.ndarray):
+        self.shape_id = shape_id
+        self.lats = lats
+        self.lons = lons
+        self.sequence_nums = sequence_nums
+    
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def to_shape_points(self) -> List[ShapePoint]:
+        return [ShapePoint(shape_id=self.shape_id, lat=float(lat), lon=float(lon), sequence_num=int(seq)) 
+                for lat, lon, seq in zip(self.lats, self.lons, self.sequence_nums)]
+
+def group_shapes(df: pd.DataFrame) -> Dict[str, ShapeArrays]:
+    """Split a shapes df (GTFS format) into each shape's points in sequence order, with one sort over the whole df. 
+    """
+    sorted_df = df.sort_values(by=['shape_id', 'shape_pt_sequence'], kind='stable')
+    shape_ids = sorted_df['shape_id'].to_numpy()
+    lats = sorted_df['shape_pt_lat'].to_numpy(dtype=np.float64)
+    lons = sorted_df['shape_pt_lon'].to_numpy(dtype=np.float64)
+    sequence_nums = sorted_df['shape_pt_sequence'].to_numpy()
+
+    if len(shape_ids) == 0:
+        return {}
+
+    # Rows of a shape are now contiguous, so each shape is a slice between consecutive boundaries. 
+    boundaries = np.flatnonzero(shape_ids[1:] != shape_ids[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(shape_ids)]])
+
+    return dict([(shape_ids[start], ShapeArrays(shape_ids[start], lats[start:end], lons[start:end], sequence_nums[start:end])) 
+                 for start, end in zip(starts, ends)])
@@ -3,6 +3,9 @@ from typing import List, Dict, Tuple
 from utility.root_logger import RootLogger
 from transit_network.shapes import Coords
 import geopy.distance
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
 
 def stop_from_stop_row_data(row, route_id):
     id = row['stop_id']
@@ -22,6 +25,15 @@ def sphere_distance(coords_1: Tuple[float, float], coords_2: Tuple[float, float]
     km_dist = geopy.distance.geodesic(coords_1, coords_2).km 
     return km_dist * 1000
 
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great circle distance in meters from (lat, lon) to every point of lats, lons. 
+    Within about 0.5% of sphere_distance, which measures on the ellipsoid. 
+    """
+    lat_1, lon_1 = np.radians(lat), np.radians(lon)
+    lat_2, lon_2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat_2 - lat_1) / 2.0)**2 + np.cos(lat_1) * np.cos(lat_2) * np.sin((lon_2 - lon_1) / 2.0)**2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
 class Stop:
 
     def __init__(self, id: str, name: str, location: tuple, parent_id: str, routes: List[str]):
@@ -35,12 +47,14 @@ class Stop:
         self.location = location
     
     def copy(self):
+        # The copy gets its own transfers and trip sequences, trips built on it write to them and must not reach the 
+        # stops of other networks. 
         new_stop = Stop(id = self.id, 
                         name=self.name, 
                         location=self.location, 
                         parent_id=self.parent_id, 
-                        routes=self.routes)
-        new_stop.trip_sequences = self.trip_sequences
+                        routes=list(self.routes))
+        new_stop.trip_sequences = dict(self.trip_sequences)
         new_stop.ridership = self.ridership
         return new_stop 
         
@@ -1,19 +1,32 @@
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Iterator
 import pandas as pd 
 import os
-import shutil
+import csv
+import io
+import zipfile
+from contextlib import ExitStack
+import hashlib
 from copy import deepcopy
+from multiprocessing import Pool
+import numpy as np
 from statistics import mean
 
 from transit_network.routes import SimpleRoute, GTFSRoute, simplify_route
 from transit_network.stops import Stop, map_ids_to_obj
-from transit_network.trips import GTFSTrip, simplify_trip, SimpleTrip
-from transit_network.shapes import get_shapes_from_df
+from transit_network.trips import GTFSTrip, simplify_trip, SimpleTrip, build_stop_trip_index
+from transit_network.shapes import group_shapes
 from genetic_algorithm.family import Family
 from preprocessing.determine_transfers import new_determine_transfers
+from preprocessing.partition_shape_points import partition_trip_shapes
 import preprocessing.gtfs_data as GTFS
 from utility.root_logger import RootLogger
 
+def format_csv_value(value: object) -> object:
+    # Missing values are left empty, as DataFrame.to_csv writes them. 
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return ''
+    return value
+
 class TransitNetwork:
 
     def __init__(self, routes: List[SimpleRoute], id : str = '0'):
@@ -96,21 +109,72 @@ class TransitNetwork:
         
         return None, None
     
+    @property
+    def stop_lookup(self) -> Dict[str, Stop]:
+        # Built lazily rather than in __init__, so networks pickled before it existed still work. 
+        if self.__dict__.get('_stop_lookup') is None:
+            lookup = {}
+            for s in self.stops:
+                if s.id in lookup:
+                    RootLogger.log_warning(f'Found multiple stops of same id {s.id} in network {self.id}, keeping first one.')
+                else:
+                    lookup[s.id] = s
+            self._stop_lookup = lookup
+        return self._stop_lookup
+
+    @property
+    def route_lookup(self) -> Dict[str, SimpleRoute]:
+        if self.__dict__.get('_route_lookup') is None:
+            lookup = {}
+            for r in self.routes:
+                if r.id in lookup:
+                    RootLogger.log_warning(f'Found duplicate routes with id {r.id} in network {self.id}. Keeping first one. ')
+                else:
+                    lookup[r.id] = r
+            self._route_lookup = lookup
+        return self._route_lookup
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of the network's contents, the trips' stop sequences and directions grouped by route. 
+        Ids are left out, so a child rebuilding an existing network hashes the same as it. 
+        """
+        if self.__dict__.get('_content_hash') is None:
+            canonical_routes = sorted([sorted([(int(t.direction), tuple([s.id for s in t.stops])) for t in r.trips]) for r in self.routes])
+            self._content_hash = hashlib.blake2b(repr(canonical_routes).encode(), digest_size=16).hexdigest()
+        return self._content_hash
+
+    @property
+    def fitness_key(self) -> str:
+        """Hash of everything the fitness function reads from the network: its contents, the routes each stop transfers
+        to and its coverage and ridership density scores. Stops carry transfers and trip sequences over from the networks
+        they were bred from, so networks with the same content_hash can still score differently.
+        """
+        if self.__dict__.get('_fitness_key') is None:
+            route_contents = dict([(r.id, tuple(sorted([(int(t.direction), tuple([s.id for s in t.stops])) for t in r.trips]))) for r in self.routes])
+            # Transfers name routes by their place among the sorted route contents, as ids differ between equal networks.
+            route_keys = dict([(content, index) for index, content in enumerate(sorted(route_contents.values()))])
+            transfers = sorted([(s.id, tuple(sorted([route_keys[route_contents[r]] if r in route_contents else -1 for r in s.routes]))) for s in self.stops])
+            inputs = (self.content_hash, transfers, self.coverage, self.ridership_density_score)
+            self._fitness_key = hashlib.blake2b(repr(inputs).encode(), digest_size=16).hexdigest()
+        return self._fitness_key
+
+    @property
+    def stop_trip_index(self) -> Dict[str, List[Tuple[SimpleTrip, int, int]]]:
+        # stop_id -> [(trip, index in trip, direction)], used by the breeder to find crossover points. 
+        if self.__dict__.get('_stop_trip_index') is None:
+            self._stop_trip_index = build_stop_trip_index(self.trips)
+        return self._stop_trip_index
+
     def get_stop_transfers(self, target_stop_id: str) -> List[str]:
-        stop_matches = [s for s in self.stops if s.id == target_stop_id]
-        num_matches = len(stop_matches)
-        if num_matches == 0:
+        if target_stop_id not in self.stop_lookup:
             RootLogger.log_error(f'Failed to find stop of id {target_stop_id} in network {self.id}!')
             raise KeyError
-        
-        if num_matches > 1:
-            RootLogger.log_warning(f'Found multiple stops of same id {target_stop_id} in network {self.id}, returning first one.')
 
-        return stop_matches[0].routes
+        return self.stop_lookup[target_stop_id].routes
 
     def has_stop(self, stop_id: str) -> bool:
-        all_stops_id = [s.id for s in self.get_stops()]
-        return stop_id in all_stops_id
+        return stop_id in self.stop_lookup
 
     def set_transfer_points(self) -> None:
         # Reset all transfer routes. 
@@ -122,14 +186,11 @@ class TransitNetwork:
                 stop.add_transfer_routes([cur_trip.route_id])
 
     def lookup_route_by_id(self, id: str) -> SimpleRoute or None:
-        matches = [r for r in self.routes if r.id == id]
-        if len(matches) == 0:
+        if id not in self.route_lookup:
             RootLogger.log_error(f'Unable to find route with id {id} in network {self.id}.')
             return None
-        if len(matches) > 1:
-            RootLogger.log_warning(f'Found duplicate routes with id {id} in network {self.id}. Returning first one. ')
             
-        return matches[0]
+        return self.route_lookup[id]
 
     def __str__(self):
         num_routes = len(self.routes)
@@ -140,89 +201,128 @@ class TransitNetwork:
         report_str = f'(TransitNetwork[routes: {num_routes}, trips: {num_trips}, stops: {num_stops}, ridership: {self.ridership}])'
         return report_str
 
-    def write_to_gtfs(self, folder: str):
-
-        def rows_to_file(rows, headers, filename):
-            df = pd.DataFrame(rows, columns=headers)
-            raw_csv_text = df.to_csv(index=False)
-            text_file = os.path.join(folder, filename+'.txt')
-
-            RootLogger.log_debug(f'Outputting gtfs file to {text_file} in directory {folder}.')
-
-            with open(text_file, 'w') as output:
-                output.write(raw_csv_text)
-        if not os.path.exists(folder):
+    def gtfs_tables(self) -> Iterator[Tuple[str, List[str], Iterator[List]]]:
+        """The network's GTFS files as (filename, headers, rows), with rows generated lazily. 
+        """
+        yield 'routes', GTFS.ROUTE_FILE_HEADERS, (r.to_gtfs_row() for r in self.routes)
+        yield 'trips', GTFS.TRIPS_FILE_HEADERS, (t.to_gtfs_row() for t in self.trips)
+        yield 'shapes', GTFS.SHAPES_FILE_HEADERS, (row for t in self.trips for row in t.get_shapes_rows())
+        yield 'stop_times', GTFS.STOP_TIMES_FILE_HEADERS, (row for t in self.trips for row in t.get_stop_times_rows())
+        yield 'stops', GTFS.STOP_FILE_HEADERS, (s.to_gtfs_row() for s in self.stops)
+
+    def write_to_gtfs(self, folder: str, write_directory: bool = True) -> str:
+        """Write the network as a GTFS zip at folder.zip, streaming rows straight into the archive. 
+
+        Args:
+            folder (str): path of the feed, without extension. 
+            write_directory (bool, optional): also write the loose .txt files into folder. Defaults to True.
+
+        Returns:
+            str: path to the zip. 
+        """
+        zip_path = os.path.normpath(folder) + '.zip'
+        if write_directory and not os.path.exists(folder):
             os.makedirs(folder)
-
-        route_rows = [r.to_gtfs_row() for r in self.routes]
-        rows_to_file(route_rows, GTFS.ROUTE_FILE_HEADERS, 'routes')
-
-        trip_rows = [t.to_gtfs_row() for t in self.trips]
-        rows_to_file(trip_rows, GTFS.TRIPS_FILE_HEADERS, 'trips')
-
-        shapes_rows = []
-        for trip in self.trips:
-            shapes_rows += trip.get_shapes_rows()
-        rows_to_file(shapes_rows, GTFS.SHAPES_FILE_HEADERS, 'shapes')
-
-        stop_times_rows = []
-        for s in self.stops:
-            stop_times_rows += s.to_stop_time_gtfs_rows()
-        rows_to_file(stop_times_rows, GTFS.STOP_TIMES_FILE_HEADERS, 'stop_times')
-
-        stop_rows = [s.to_gtfs_row() for s in self.stops]
-        rows_to_file(stop_rows, GTFS.STOP_FILE_HEADERS, 'stops')
-        RootLogger.log_info(f'Constructed GTFS files, now zipping into {folder}.zip')
-        shutil.make_archive(folder, 'zip', folder)
-
-def create_network_from_GTFSRoutes(routes: List[GTFSRoute], shapes_df: pd.DataFrame) -> TransitNetwork:
-
+        
+        RootLogger.log_info(f'Writing GTFS files into {zip_path}')
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for filename, headers, rows in self.gtfs_tables():
+                text_filename = filename + '.txt'
+                RootLogger.log_debug(f'Outputting gtfs file {text_filename} to {zip_path}.')
+                with ExitStack() as outputs:
+                    writers = [csv.writer(outputs.enter_context(io.TextIOWrapper(archive.open(text_filename, 'w'), encoding='utf-8', newline='')), lineterminator='\n')]
+                    if write_directory:
+                        writers.append(csv.writer(outputs.enter_context(open(os.path.join(folder, text_filename), 'w', newline='')), lineterminator='\n'))
+                    
+                    for writer in writers:
+                        writer.writerow(headers)
+                    for row in rows:
+                        row = [format_csv_value(v) for v in row]
+                        for writer in writers:
+                            writer.writerow(row)
+        return zip_path
+
+def simplify_trip_stops(trip: GTFSTrip, id_to_obj_map: Dict[str, Stop]) -> List[Stop]:
+    new_stops = [] 
+
+    for stop in trip.stops:
+        stop_id = stop[0].get_id()
+        cur_stop = id_to_obj_map[stop_id]
+        if cur_stop.is_transfer(): 
+            RootLogger.log_debug('Identified transfer stop %s with %d transfers.', cur_stop.id, len(cur_stop.routes))
+            new_stops.append(cur_stop)
+    
+    # We want to add endpoint to the trips
+    first_stop = trip.stops[0][0]
+    first_stop_id = first_stop.get_id()
+    last_stop = trip.stops[-1][0]
+    last_stop_id = last_stop.get_id()
+
+    # We check if the id is in the stops because id accounts for parent stops
+    if first_stop_id not in id_to_obj_map:
+        new_stops = [first_stop] + new_stops
+    
+    if last_stop_id not in id_to_obj_map:
+        new_stops += [last_stop]
+
+    # Debugging Information
+    num_stops = len(trip.stops)
+    num_new_stops = len(new_stops)
+
+    if num_new_stops > num_stops:
+        RootLogger.log_warning(f'Simplifying trip {trip.id} increased # of stops from {num_stops} to {num_new_stops}')
+    else:
+        RootLogger.log_info(f'Trip {trip.id} reduced number of stops from {num_stops} to {num_new_stops}')
+    return new_stops
+
+def create_network_from_GTFSRoutes(routes: List[GTFSRoute], shapes_df: pd.DataFrame, num_workers: int = 1) -> TransitNetwork:
+    """Simplify routes into a network, matching each trip's stops to merged transfer stops and partitioning its shape between them. 
+
+    Args:
+        routes (List[GTFSRoute]): routes with their trips set. 
+        shapes_df (pd.DataFrame): shapes of the feed (GTFS format). 
+        num_workers (int, optional): number of processes partitioning shapes. Defaults to 1.
+
+    Returns:
+        TransitNetwork: simplified network. 
+    """
     transfer_stops_obj = new_determine_transfers(routes)
     id_to_obj_map = map_ids_to_obj(transfer_stops_obj)
-    # Update stop objects so that they all have transfer points set. 
-    simple_routes = []
+    shapes_by_id = group_shapes(shapes_df)
+
+    # Stops are shared between routes, so they're matched here and only the shape partitioning is farmed out. 
+    route_stops = []
+    route_tasks = []
     for route in routes:
         RootLogger.log_info(f'Simplifying trips for route {route.id}')
-        new_trips = []
+        trip_stops = []
+        tasks = []
         for trip in route.trips:
-            new_stops = [] 
-
-            for stop in trip.stops:
-                stop_id = stop[0].get_id()
-                cur_stop = id_to_obj_map[stop_id]
-                if cur_stop.is_transfer(): 
-                    RootLogger.log_debug(f'Identified transfer stop {cur_stop.id} with {len(cur_stop.routes)} transfers.')
-                    new_stops.append(cur_stop)
-            
-            # We want to add endpoint to the trips
-            first_stop = trip.stops[0][0]
-            first_stop_id = first_stop.get_id()
-            last_stop = trip.stops[-1][0]
-            last_stop_id = last_stop.get_id()
-
-            # We check if the id is in the stops because id accounts for parent stops
-            if first_stop_id not in id_to_obj_map:
-                new_stops = [first_stop] + new_stops
-            
-            if last_stop_id not in id_to_obj_map:
-                new_stops += [last_stop]
-
-            # Debugging Information
-            num_stops = len(trip.stops)
-            num_new_stops = len(new_stops)
-
-            if num_new_stops > num_stops:
-                RootLogger.log_warning(f'Simplifying trip {trip.id} increased # of stops from {num_stops} to {num_new_stops}')
-            else:
-                RootLogger.log_info(f'Trip {trip.id} reduced number of stops from {num_stops} to {num_new_stops}')
+            new_stops = simplify_trip_stops(trip, id_to_obj_map)
+            trip_stops.append(new_stops)
 
             # Shape Information for each trip. 
-            shape_id = trip.shape_id
-            shape_points = get_shapes_from_df(shapes_df.loc[shapes_df['shape_id'] == shape_id])
-            
-            RootLogger.log_info(f'Identified {len(shape_points)} shape points for trip {trip.id}.')
-
-            new_trip = simplify_trip(trip, new_stops, route.ridership, shape_points)
+            shape = shapes_by_id.get(trip.shape_id)
+            lats, lons = (shape.lats, shape.lons) if shape is not None else (np.array([]), np.array([]))
+            RootLogger.log_info(f'Identified {len(lats)} shape points for trip {trip.id}.')
+            tasks.append((lats, lons, [s.location_lat for s in new_stops], [s.location_lon for s in new_stops]))
+        route_stops.append(trip_stops)
+        route_tasks.append(tasks)
+
+    if num_workers > 1:
+        RootLogger.log_info(f'Partitioning shapes of {len(routes)} routes across {num_workers} processes.')
+        with Pool(processes=num_workers) as pool:
+            route_offsets = pool.map(partition_trip_shapes, route_tasks)
+    else:
+        route_offsets = [partition_trip_shapes(tasks) for tasks in route_tasks]
+
+    # Ridership and transfers are added to the shared stops here, in route order. 
+    simple_routes = []
+    for route, trip_stops, trip_offsets in zip(routes, route_stops, route_offsets):
+        new_trips = []
+        for trip, new_stops, offsets in zip(route.trips, trip_stops, trip_offsets):
+            shape_points = shapes_by_id[trip.shape_id].to_shape_points() if trip.shape_id in shapes_by_id else []
+            new_trip = simplify_trip(trip, new_stops, route.ridership, shape_points, shape_offsets=offsets)
             new_trips.append(new_trip)
 
         simple_route = simplify_route(route, new_trips)
@@ -230,7 +330,15 @@ def create_network_from_GTFSRoutes(routes: List[GTFSRoute], shapes_df: pd.DataFr
 
     return TransitNetwork(simple_routes, id='-1') 
 
-def create_network_from_trips(trips: List[SimpleTrip], id: str):
+def create_network_from_trips(trips: List[SimpleTrip], id: str, reset_transfers: bool = True):
+    """Group trips into routes and build a network from them. 
+
+    Args:
+        trips (List[SimpleTrip]): trips of the new network. 
+        id (str): id of the new network. 
+        reset_transfers (bool, optional): recompute the transfer routes of every stop. Pass False when stops 
+        are shared with another network and already carry the right transfers. Defaults to True.
+    """
     routes_dict = {} # maps route-ids to the trips referencing them
 
     for trip in trips:
@@ -240,8 +348,9 @@ def create_network_from_trips(trips: List[SimpleTrip], id: str):
         else:
             routes_dict[route_id] = [trip]
         
-        for stop in trip.stops:
-            stop.routes = [] # Reset transfer points to none
+        if reset_transfers:
+            for stop in trip.stops:
+                stop.routes = [] # Reset transfer points to none
     
     new_routes = []
     for route_id in routes_dict:
@@ -249,8 +358,9 @@ def create_network_from_trips(trips: List[SimpleTrip], id: str):
         route_trips = routes_dict[route_id]
 
         # Set transfer points
-        for trip in route_trips:
-            trip.set_stop_transfer_points()
+        if reset_transfers:
+            for trip in route_trips:
+                trip.set_stop_transfer_points()
 
         new_route.add_trips(routes_dict[route_id])
         new_routes.append(new_route)
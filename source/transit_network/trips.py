@@ -1,6 +1,6 @@
 #from preprocessing.gtfs_data import GTFSData
 
-from typing import List
+from typing import List, Dict, Tuple
 import pandas as pd 
 
 from transit_network.stops import Stop, stop_from_stop_row_data
@@ -108,6 +108,11 @@ class SimpleTrip(BaseTrip):
         # We make shape_id to the same as trip_id with 00 on the end. 
         return [self.route_id, 0, self.id, self.direction, self.custom_shape_id, self.message]
     
+    def get_stop_times_rows(self):
+        # Sequences come from the trip itself, stops' trip_sequences can also hold trips of other networks. 
+        # Arrival and departure are 0, since we don't care about time. 
+        return [[self.id, 0, 0, stop.id, index + 1] for index, stop in enumerate(self.stops)]
+
     def get_shapes_rows(self):
         rows = []
         for index, shape in enumerate(self.flattened_shape_points):
@@ -131,6 +136,7 @@ class GTFSTrip(BaseTrip):
         BaseTrip.__init__(self, trip_id, route_id, message, direction)
         self.shape_id = shape_id 
         self.stops = [] # In Tuple format: (Stop, seq in trip)
+        self.stops_matched = False
 
     def set_stops(self, stops: List[Stop], shapes_df: pd.DataFrame):
         self.stops = stops
@@ -144,7 +150,7 @@ class GTFSTrip(BaseTrip):
         """
 
         # If already computed...
-        if self.stops != []:
+        if self.stops != [] or self.stops_matched:
             return self.stops 
 
         resulting_stops = stop_times_df.loc[(stop_times_df['trip_id'] == self.id)]
@@ -160,8 +166,8 @@ class GTFSTrip(BaseTrip):
 
             if len(stop_data.index) > 1:
                 RootLogger.log_warning(f'Matched multiple stop with id {stop_id} on trip {self.id} from route {self.route_id}, dropping rest of them.')
-            else:
-                RootLogger.log_debug(f'Successfully matched stop with id {stop_id} to trip {self.id}')
+            elif RootLogger.debug_enabled:
+                RootLogger.log_debug('Successfully matched stop with id %s to trip %s', stop_id, self.id)
             stop_row = stop_data.iloc[0]
             stop_obj = stop_from_stop_row_data(stop_row, self.route_id)
             stations.append((stop_obj, trip_sequence))
@@ -169,6 +175,27 @@ class GTFSTrip(BaseTrip):
         self.stops = stations
         return stations
 
+    def match_stops(self, stop_time_rows: List[Tuple[str, int]], stop_lookup: Dict[str, Tuple[Dict, int]]) -> List[Stop]:
+        """Same as get_stops, but from this trip's pre-grouped (stop_id, stop_sequence) rows and a stop_id -> (stop row, matches) lookup. 
+
+        Returns:
+            List[str]: stop_ids
+        """
+        stations = []
+        for stop_id, trip_sequence in stop_time_rows:
+            if stop_id not in stop_lookup:
+                RootLogger.log_warning(f'Failed to find stop with id {stop_id} on trip {self.id} from route {self.route_id}, dropping it.')
+                continue
+
+            stop_row, num_matches = stop_lookup[stop_id]
+            if num_matches > 1:
+                RootLogger.log_warning(f'Matched multiple stop with id {stop_id} on trip {self.id} from route {self.route_id}, dropping rest of them.')
+            stations.append((stop_from_stop_row_data(stop_row, self.route_id), trip_sequence))
+
+        self.stops = stations
+        self.stops_matched = True
+        return stations
+
     def __str__(self):
         return f'(trip_id: {self.id}, \
         route_id: {self.route_id}, \
@@ -177,9 +204,10 @@ class GTFSTrip(BaseTrip):
         direction: {self.direction}, \
         ridership: {self.ridership}'
 
-def simplify_trip(original_trip: GTFSTrip, new_stops: List[Stop], route_ridership: int, shape_points: List[ShapePoint]) -> SimpleTrip:
+def simplify_trip(original_trip: GTFSTrip, new_stops: List[Stop], route_ridership: int, shape_points: List[ShapePoint], 
+                  shape_offsets: List[int] or None = None) -> SimpleTrip:
 
-    seperated_shape_points = partition_shape_points(shape_points, new_stops)
+    seperated_shape_points = partition_shape_points(shape_points, new_stops, shape_offsets)
     trip_ridership = route_ridership / 2.0
 
     # Move ridership data to the stops
@@ -201,6 +229,25 @@ def assign_ridership_to_stops(StopList: List[Stop], trip_ridership: int):
     for stop in StopList:
         stop.ridership += trip_ridership / num_of_stops
 
+def build_stop_trip_index(trips: List[SimpleTrip]) -> Dict[str, List[Tuple[SimpleTrip, int, int]]]:
+    """Map every stop id to the trips visiting it. 
+
+    Args:
+        trips (List[SimpleTrip]): trips to index. 
+
+    Returns:
+        Dict[str, List[Tuple[SimpleTrip, int, int]]]: stop_id -> [(trip, index of first visit in trip, trip direction)]
+    """
+    index = {}
+    for trip in trips:
+        seen = set()
+        for stop_index, stop in enumerate(trip.stops):
+            if stop.id in seen:
+                continue
+            seen.add(stop.id)
+            index.setdefault(stop.id, []).append((trip, stop_index, trip.direction))
+    return index
+
 def common_transfer_point(trip_A: SimpleTrip, trip_B: SimpleTrip) -> str or None:
     # Trips must be the same direction
     if trip_A.direction != trip_B.direction:
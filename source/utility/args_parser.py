@@ -28,6 +28,9 @@ def add_model_arguments(parser: argparse.ArgumentParser, batch: bool =False) ->
                 action='store_true',
                 help="include to enable graphing the best performer after finishing.")
 
+    model_parameters.add_argument("-w", "--num_workers", type=int, default=1,
+                   help="number of worker processes used to evaluate the population (default: %(default)s)")
+
 def add_logging_arguments(parser: argparse.ArgumentParser) -> None:
     logging_options = parser.add_argument_group('logging options')
     logging_options.add_argument("-v", "--verbosity", type=int, choices=[0,1,2,3], default=0,
@@ -58,6 +61,40 @@ def model_run_args() -> Namespace:
                    type=int,
                    default=0, 
                    help='get an estimate of running with these parameters. Integer passed in serves as number of test runs to estimate. ')
+
+    options.add_argument("-ce", "--checkpoint_every", type=int, default=0,
+                   help="write a checkpoint to the output directory every this many generations, 0 disables checkpoints (default: %(default)s)")
+
+    options.add_argument("-r", "--resume",
+                action='store_true',
+                help="include to continue from the checkpoint in the output directory, if there is one.")
+
+    options.add_argument("-pe", "--profile_every", type=int, default=0,
+                   help="profile every this many generations with cProfile and tracemalloc, writing profile_{iteration}.prof to the output directory, 0 disables profiling (default: %(default)s)")
+    
+    options.add_argument("-ss", "--steady_state",
+                action='store_true',
+                help="include to breed and score a few children at a time, each replacing the worst member if it scores higher, instead of whole generations.")
+
+    options.add_argument("-bs", "--batch_size", type=int, default=2,
+                   help="children bred at a time by the steady state engine (default: %(default)s)")
+
+    options.add_argument("-sel", "--selection", type=str, choices=['roulette', 'rank', 'tournament'], default='roulette',
+                   help="how parents are drawn: in proportion to fitness (roulette), to rank (rank), or as the best of a few random members (tournament) (default: %(default)s)")
+
+    islands = parser.add_argument_group('island model')
+
+    islands.add_argument("-is", "--num_islands", type=int, default=1,
+                   help="number of populations of the given size evolved in parallel processes, 1 runs a single population (default: %(default)s)")
+
+    islands.add_argument("-mi", "--migration_interval", type=int, default=5,
+                   help="generations between migrations (default: %(default)s)")
+
+    islands.add_argument("-mm", "--num_migrants", type=int, default=2,
+                   help="number of best networks each island sends to each of its neighbours (default: %(default)s)")
+
+    islands.add_argument("-tp", "--topology", type=str, choices=['ring', 'all'], default='ring',
+                   help="islands send migrants to the next island (ring) or to every other island (all) (default: %(default)s)")
     
     add_logging_arguments(parser)
 
@@ -90,7 +127,32 @@ def simplify_network_args() -> Namespace:
     p.add_argument("-g", "--gtfs_source", type=str, 
                    help="path to gtfs source data (.zip)", 
                    default="../data/gtfs_data/SFMTA.zip")
+
+    p.add_argument("-nc", "--no_cache", action='store_true',
+                   help="include to parse the gtfs source without reading or writing the parsed feed cache.")
+
+    p.add_argument("-w", "--num_workers", type=int, default=1,
+                   help="number of worker processes used to partition trip shapes (default: %(default)s)")
+    
+    add_logging_arguments(p)
+    
+    return (p.parse_args())
+def export_networks_args() -> Namespace:
+    p = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    
+    p.add_argument("-i", "--input", type=str, required=True,
+                   help="path to a run's population.tns or checkpoint.pkl")
+    
+    p.add_argument("-o", "--output", type=str, default=None,
+                   help="directory to write the networks to, defaults to a networks/ folder next to the input")
+    
+    p.add_argument("-k", "--top_k", type=int, default=10,
+                   help="number of best networks to export, 0 exports the whole population (default: %(default)s)")
+    
+    p.add_argument("-w", "--num_workers", type=int, default=1,
+                   help="number of worker processes writing networks (default: %(default)s)")
     
     add_logging_arguments(p)
     
-    return (p.parse_args())
\ No newline at end of file
+    return (p.parse_args())
@@ -12,6 +12,9 @@ class RootLogger:
         2: logging.INFO, 
         3: logging.DEBUG,
     }
+
+    # Whether debug messages go anywhere, set by initialize. Hot loops check it before building a message at all. 
+    debug_enabled = False
     
     def initialize(path: str, verbosity: int, file_verbosity: int):
 
@@ -29,21 +32,29 @@ class RootLogger:
         outputHandler.setFormatter(logging.Formatter('%(asctime)s, %(name)s %(levelname)s %(message)s'))
         outputHandler.setLevel(level=RootLogger.verbosity_to_level[verbosity])
 
+        # The root level is the lowest handler level, so logging drops messages no handler would take before formatting them. 
+        min_level = min(fileHandler.level, outputHandler.level)
         logging.basicConfig(handlers = [fileHandler, outputHandler],
                     format='%(asctime)s, %(name)s %(levelname)s %(message)s', 
-                    level=logging.NOTSET)
+                    level=min_level)
+        RootLogger.debug_enabled = min_level <= logging.DEBUG
     
-    def log_info(msg):
-        logging.info(f'{Fore.BLUE}{msg}{Style.RESET_ALL}')
+    # Messages take %-style args, which are only formatted if the level is enabled. 
+    def log_info(msg, *args):
+        if logging.root.isEnabledFor(logging.INFO):
+            logging.info(f'{Fore.BLUE}{msg}{Style.RESET_ALL}', *args)
     
-    def log_warning(msg):
-        logging.warning(f'{Fore.YELLOW}{msg}{Style.RESET_ALL}')
+    def log_warning(msg, *args):
+        if logging.root.isEnabledFor(logging.WARNING):
+            logging.warning(f'{Fore.YELLOW}{msg}{Style.RESET_ALL}', *args)
     
-    def log_debug(msg):
-        logging.debug(f'{Fore.GREEN}{msg}{Style.RESET_ALL}')
+    def log_debug(msg, *args):
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(f'{Fore.GREEN}{msg}{Style.RESET_ALL}', *args)
     
-    def log_error(msg):
-        logging.error(f'{Fore.RED}{msg}{Style.RESET_ALL}')
+    def log_error(msg, *args):
+        if logging.root.isEnabledFor(logging.ERROR):
+            logging.error(f'{Fore.RED}{msg}{Style.RESET_ALL}', *args)
 
 
 # logging.basicConfig(filename='log.txt',
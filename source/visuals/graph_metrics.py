@@ -2,13 +2,15 @@ import matplotlib.pyplot as plt
 import pandas as pd 
 import os 
 
-from utility.pickle import pickle_object
+from genetic_algorithm.population_store import write_population_store, POPULATION_STORE_FILENAME
 from genetic_algorithm.population import Population
 from utility.root_logger import RootLogger
+from genetic_algorithm.instrumentation import PHASES, phase_header
 
 INTERATION_HEADER = 'iteration'
 FITNESS_HEADER = 'fitness'
 TIME_HEADER = 'time'
+THROUGHPUT_HEADER = 'evaluations_per_second'
 
 NUM_ROUTES_HEADER = 'routes_val'
 COVERAGE_HEADER = 'coverage_val'
@@ -32,9 +34,11 @@ def graph_all_metrics(Population: Population, results_csv: str, output_folder: s
     plot_all_fitness_metrics(results_csv, os.path.join(output_folder, 'fitness_breakdown.png'))
     plot_time(results_csv, os.path.join(output_folder, 'time.png'))
     plot_stddev(results_csv, os.path.join(output_folder, 'stddev.png'))
+    plot_phase_times(results_csv, os.path.join(output_folder, 'phase_times.png'))
+    plot_throughput(results_csv, os.path.join(output_folder, 'throughput.png'))
     RootLogger.log_debug(f'Done graphing all metrics.')
 
-    pickle_object(Population, os.path.join(output_folder, 'population.pkl'))
+    write_population_store(Population, os.path.join(output_folder, POPULATION_STORE_FILENAME))
 
 def get_header(base: str, add_on: str):
     return add_on + '_' + base
@@ -117,4 +121,34 @@ def plot_time(filename, output_file='time.png'):
     plt.scatter(df[INTERATION_HEADER], df[TIME_HEADER], marker="o", s= SINGLE_DOT_SIZE, alpha=ALPHA_VALUE)
     plt.savefig(output_file)
     plt.clf()
-    RootLogger.log_debug(f'Done graphing runtime per round metrics.')
\ No newline at end of file
+    RootLogger.log_debug(f'Done graphing runtime per round metrics.')
+
+def plot_phase_times(filename, output_file='phase_times.png'):
+    RootLogger.log_debug(f'Graphing per phase runtime for {filename}, exporting to {output_file}...')
+    df = pd.read_csv(filename)
+    phases = [phase for phase in PHASES if phase_header(phase) in df.columns]
+    if phases == []:
+        RootLogger.log_warning(f'No per phase timings in {filename}, skipping phase time plot.')
+        return
+    plt.stackplot(df[INTERATION_HEADER], [df[phase_header(phase)] for phase in phases], labels=phases, alpha=ALPHA_VALUE)
+    plt.legend(loc='upper left')
+    plt.xlabel("Iteration #")
+    plt.ylabel("Time to compute (s)")
+    plt.title("Computation Time per Phase per Round")
+    plt.savefig(output_file)
+    plt.clf()
+    RootLogger.log_debug(f'Done graphing per phase runtime.')
+
+def plot_throughput(filename, output_file='throughput.png'):
+    RootLogger.log_debug(f'Graphing evaluations per second for {filename}, exporting to {output_file}...')
+    df = pd.read_csv(filename)
+    if THROUGHPUT_HEADER not in df.columns:
+        RootLogger.log_warning(f'No evaluation counts in {filename}, skipping throughput plot.')
+        return
+    plt.scatter(df[INTERATION_HEADER], df[THROUGHPUT_HEADER], marker="o", s= SINGLE_DOT_SIZE, alpha=ALPHA_VALUE)
+    plt.xlabel("Iteration #")
+    plt.ylabel("Evaluations per second")
+    plt.title("Throughput per Round")
+    plt.savefig(output_file)
+    plt.clf()
+    RootLogger.log_debug(f'Done graphing evaluations per second.')